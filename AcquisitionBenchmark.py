@@ -0,0 +1,159 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import socket
+import time
+
+from Procedure.GPSReader import GPSReader
+from Procedure.SharedRing import ProcessReader
+
+def _nmea_lines(count):
+    """產生 count 組 RMC + GGA 句子 (含正確 checksum)，座標逐筆微幅移動"""
+    lines = []
+    for i in range(count):
+        lat = 2503.0 + (i % 600) * 0.001
+        lon = 12130.0 + (i % 600) * 0.001
+        hhmmss = f"{(i // 3600) % 24:02d}{(i // 60) % 60:02d}{i % 60:02d}"
+        for body in (f"GPRMC,{hhmmss}.00,A,{lat:.4f},N,{lon:.4f},E,0.5,0.0,060126,,,A",
+                     f"GPGGA,{hhmmss}.00,{lat:.4f},N,{lon:.4f},E,1,08,0.9,{20 + i % 10:.1f},M,,M,,"):
+            checksum = 0
+            for ch in body:
+                checksum ^= ord(ch)
+            lines.append(f"${body}*{checksum:02X}")
+    return lines
+
+def _serve_nmea(port_queue, stop_event, sent):
+    """
+    子行程：模擬 GPS2IP 的 TCP 輸出，以最快速度重複送出 NMEA，讓讀取器持續滿載解析
+    sent 累計已送出的句子數 (TCP 有背壓，約等於讀取器已解析的數量)
+    """
+    lines = _nmea_lines(600)
+    blob = ("\r\n".join(lines) + "\r\n").encode()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    server.settimeout(0.2)
+    port_queue.put(server.getsockname()[1])
+    while not stop_event.is_set():
+        try:
+            conn, _ = server.accept()
+        except socket.timeout:
+            continue
+        with conn:
+            try:
+                while not stop_event.is_set():
+                    conn.sendall(blob)
+                    with sent.get_lock():
+                        sent.value += len(lines)
+            except OSError:
+                pass
+    server.close()
+
+def _consume(records, work, source=None):
+    """
+    消費端：模擬合併 / 上傳前的 CPU 工作 (距離計算與 JSON 序列化)，共處理 records 筆
+    同時取出讀取器送來的紀錄，回傳取得的筆數
+    """
+    received, prev = 0, None
+    for i in range(records):
+        data = {"timestamp": f"2026-01-06 12:{i // 60 % 60:02d}:{i % 60:02d}", "lat": 25.03 + (i % 600) * 1e-5,
+                "lon": 121.5 + (i % 600) * 1e-5, "alt": 20.0, "status": "A", "conc": float(i), "conc_unit": "ppm"}
+        for _ in range(work):
+            if prev:
+                math.hypot(data['lat'] - prev['lat'], (data['lon'] - prev['lon']) * math.cos(math.radians(data['lat'])))
+            json.dumps(data)
+        prev = data
+        if source is not None:
+            while True:
+                try:
+                    received += source.get_nowait() is not None
+                except queue.Empty:
+                    break
+    return received
+
+def _start_reader(mode, port, capacity):
+    """以 RunProcess 相同的方式建立讀取器：thread 為 GPSReader 執行緒，process 為 ProcessReader 子行程"""
+    if mode == 'thread':
+        reader = GPSReader()
+        reader.ip, reader.port = "127.0.0.1", port
+        reader.gps_queue = queue.Queue()
+    else:
+        reader = ProcessReader('gps', capacity=capacity, ip="127.0.0.1", port=port)
+    reader.run()
+    return reader
+
+def _first_record(reader, timeout=10.0):
+    """等待讀取器送出第一筆 (已連線並開始解析)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if reader.gps_queue.get_nowait() is not None:
+                return True
+        except queue.Empty:
+            time.sleep(0.01)
+    return False
+
+def _stop_reader(reader):
+    reader.stop()
+    if isinstance(reader, GPSReader) and reader.thread:
+        reader.thread.join(timeout=6)
+
+def run_benchmark(mode, records=20000, work=20, capacity=4096):
+    """
+    讀取器以真實路徑解析 NMEA 串流時，量測主行程 (合併 / 上傳端) 的處理速度
+    mode='none'：不啟動讀取器 (基準)
+    mode='thread'：GPSReader 執行緒 + queue.Queue (現行架構)
+    mode='process'：ProcessReader 子行程 (_reader_worker) + SharedRing
+    讀取器一秒最多輸出一筆，兩種模式送達的紀錄數相同；差別在於解析是否與合併爭用同一個 GIL / 核心
+    回傳 {'mode', 'records', 'seconds', 'rate', 'gps_records', 'nmea_rate'}
+    """
+    port_queue, stop_event = multiprocessing.Queue(), multiprocessing.Event()
+    sent = multiprocessing.Value('q', 0)
+    server = multiprocessing.Process(target=_serve_nmea, args=(port_queue, stop_event, sent), daemon=True)
+    server.start()
+    reader = None
+    try:
+        port = port_queue.get(timeout=10)
+        gps_records = 0
+        if mode != 'none':
+            reader = _start_reader(mode, port, capacity)
+            if not _first_record(reader):
+                raise RuntimeError(f"{mode} 讀取器未送出資料")
+            gps_records = 1
+        sent_before = sent.value
+        start = time.perf_counter()
+        gps_records += _consume(records, work, reader.gps_queue if reader else None)
+        seconds = time.perf_counter() - start
+        nmea_lines = sent.value - sent_before
+    finally:
+        if reader:
+            _stop_reader(reader)
+        stop_event.set()
+        server.join(timeout=5)
+        if server.is_alive():
+            server.terminate()
+    return {"mode": mode, "records": records, "seconds": round(seconds, 3),
+            "rate": round(records / max(seconds, 1e-9), 1), "gps_records": gps_records,
+            "nmea_rate": round(nmea_lines / max(seconds, 1e-9), 1) if mode != 'none' else 0.0}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比較讀取器執行緒模式與子行程 + 共享記憶體模式下合併端的處理速度")
+    parser.add_argument("--records", type=int, default=20000, help="合併端處理的紀錄數")
+    parser.add_argument("--work", type=int, default=20, help="合併端每筆紀錄的模擬運算量")
+    parser.add_argument("--capacity", type=int, default=4096, help="環狀緩衝容量")
+    args = parser.parse_args(argv)
+
+    print(f"CPU 核心數: {os.cpu_count()}")
+    results = [run_benchmark(mode, args.records, args.work, args.capacity) for mode in ('none', 'thread', 'process')]
+    for r in results:
+        print(f"{r['mode']:>8}: {r['records']} 筆 / {r['seconds']} 秒 = {r['rate']} 筆/秒 | "
+              f"讀取器解析 {r['nmea_rate']} 句/秒, 送達 {r['gps_records']} 筆")
+    print(f"process / thread = {results[2]['rate'] / max(results[1]['rate'], 1e-9):.2f}x")
+    return results
+
+if __name__ == "__main__":
+    main()
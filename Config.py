@@ -1,3 +1,4 @@
+import copy
 import json
 import queue
 
@@ -39,6 +40,90 @@ class Config:
         self.PROJECT_NAME = stg.get("project_name")
         self.IS_PUSH = stg.get("is_push")
         self.MAP_URL = stg.get("map_url")
+        # 讀取模式：thread (預設) | process (選用)
+        # process 模式在子行程解析 NMEA；讀取器一秒最多輸出一筆，送達的資料量與 thread 模式相同，
+        # 只影響解析與合併是否爭用同一個 GIL。單核心機器上以滿載 NMEA 串流實測，合併端只有 thread 模式的
+        # 0.66-0.72 倍速度，僅在多核心機器上以 AcquisitionBenchmark.py 量測確有改善後再開啟
+        self.ACQUISITION_MODE = stg.get("acquisition_mode", "thread")
+
+        # --- Logging 分類 (log 輪替與逐筆紀錄彙總) ---
+        lg = data.get("logging", {})
+        self.LOG_MAX_BYTES = int(lg.get("max_bytes", 5 * 1024 * 1024))
+        self.LOG_BACKUP_COUNT = int(lg.get("backup_count", 5))
+        self.LOG_ROTATE_WHEN = lg.get("when")
+        self.LOG_SUMMARY_INTERVAL = float(lg.get("summary_interval", 10))
+
+        # --- Transport 分類 (admin: firebase_admin 預設, rest: keep-alive REST 連線池) ---
+        tp = data.get("transport", {})
+        self.TRANSPORT_TYPE = tp.get("type", "admin")
+        self.TRANSPORT_POOL_SIZE = int(tp.get("pool_size", 4))
+        self.TRANSPORT_TIMEOUTS = {k.upper(): float(v) for k, v in tp.get("timeouts", {}).items()}
+        self.TRANSPORT_GZIP = tp.get("gzip", True)
+
+        # --- Upload Filter 分類 (上傳前死區壓縮，本地備份仍保留全部紀錄) ---
+        uf = data.get("upload_filter", {})
+        self.UPLOAD_FILTER_ENABLED = uf.get("enabled", False)
+        self.UPLOAD_MIN_DISTANCE_M = float(uf.get("min_distance_m", 3.0))
+        self.UPLOAD_MIN_CONC_DELTA = float(uf.get("min_conc_delta", 1.0))
+        self.UPLOAD_HEARTBEAT_SEC = float(uf.get("heartbeat_sec", 30))
+
+        # --- Recent 分類 (最近 N 筆的固定大小環狀區，供即時畫面使用；預設 0 停用，停用時會清除舊的 recent) ---
+        rc = data.get("recent", {})
+        self.RECENT_SIZE = int(rc.get("size", 0))
+        self.RECENT_WINDOW_MINUTES = rc.get("window_minutes")
+
+        # --- Alerts 分類 (後端閾值警報，寫入 {project}/alerts) ---
+        al = data.get("alerts", {})
+        self.ALERTS_ENABLED = al.get("enabled", False)
+        self.ALERTS_FLUSH_INTERVAL = float(al.get("flush_interval", 5))
+
+        # --- Supervisor 分類 (工作者異常結束時自動重啟；停止時先送完佇列再關閉) ---
+        sv = data.get("supervisor", {})
+        self.SUPERVISOR_MAX_RESTARTS = int(sv.get("max_restarts", 5))
+        self.SUPERVISOR_BACKOFF_MAX = float(sv.get("backoff_max", 30))
+        self.DRAIN_TIMEOUT = float(sv.get("drain_timeout", 10))
+
+        # --- Local Store 分類 (本地 SQLite 紀錄庫，含時間與空間索引，供離線查詢) ---
+        ls = data.get("local_store", {})
+        self.LOCAL_STORE_ENABLED = ls.get("enabled", False)
+        self.LOCAL_STORE_PATH = ls.get("path", "local_store.sqlite3")
+
+        # --- History Cache 分類 (history 的本地增量快取，供匯出、分析與啟動復原共用) ---
+        hc = data.get("history_cache", {})
+        self.HISTORY_CACHE_ENABLED = hc.get("enabled", False)
+        self.HISTORY_CACHE_PATH = hc.get("path", "history_cache.sqlite3")
+
+        # --- Recovery 分類 (啟動時比對本地備份並補傳 history 缺漏；需 history 的 ".indexOn": "timestamp" 規則，預設停用) ---
+        rv = data.get("recovery", {})
+        self.RECOVERY_ENABLED = rv.get("enabled", False)
+        self.RECOVERY_LOOKBACK_HOURS = float(rv.get("lookback_hours", 48))
+
+        # --- Retention 分類 (未設定 max_age_days 則不封存) ---
+        ret = data.get("retention", {})
+        self.RETENTION_DAYS = ret.get("max_age_days")
+        self.RETENTION_INTERVAL_HOURS = float(ret.get("interval_hours", 6))
+        self.ARCHIVE_DIR = ret.get("archive_dir", "archives")
+
+        # --- Live Feed 分類 (未設定 port 則不啟動區網即時伺服器) ---
+        live = data.get("live_feed", {})
+        self.LIVE_FEED_HOST = live.get("host", "0.0.0.0")
+        self.LIVE_FEED_PORT = live.get("port")
+        self.LIVE_FEED_BUFFER = int(live.get("buffer_size", 256))
+        self.LIVE_FEED_TRACK_SIZE = int(live.get("track_size", 20000))
+
+        # --- Tile Proxy 分類 (本機地圖圖磚快取代理，離線時仍可顯示已快取的地圖) ---
+        tile = data.get("tile_proxy", {})
+        self.TILE_PROXY_ENABLED = tile.get("enabled", False)
+        self.TILE_PROXY_HOST = tile.get("host", "127.0.0.1")
+        self.TILE_PROXY_PORT = int(tile.get("port", 8090))
+        self.TILE_UPSTREAM = tile.get("upstream", "https://tile.openstreetmap.org/{z}/{x}/{y}.png")
+        self.TILE_CACHE_DIR = tile.get("cache_dir", "tiles")
+        self.TILE_CACHE_MAX_MB = float(tile.get("max_mb", 500))
+        self.TILE_PREFETCH_ZOOMS = [int(z) for z in tile.get("prefetch_zooms", [15, 16, 17])]
+        self.TILE_PREFETCH_MARGIN = int(tile.get("prefetch_margin", 1))
+
+        # --- Projects 分類 (多專案模式，每個專案可覆寫 settings / gps / conc) ---
+        self.PROJECTS = data.get("projects", [])
 
         # --- 衍生變數 (自動生成) ---
         self._generate_urls()
@@ -46,7 +131,22 @@ class Config:
         # --- 固定參數 ---
         self.GPS_QUEUE = queue.Queue()      # 接收 GPS 數據
         self.CONC_QUEUE = queue.Queue()     # 接收 CONC 數據
-        self.SHARED_QUEUE = queue.Queue()   # 合併 GPS 和 CONC 數據，以上傳至 firebase
+        self.SHARED_QUEUE = queue.Queue(maxsize=10000)   # 合併 GPS 和 CONC 數據，以上傳至 firebase (有上限，滿時由 FirebaseSink 丟棄並計數)
+
+    def project_configs(self):
+        """依 projects 清單產生各專案的 Config (共用 Firebase 設定，各自擁有 Queue)"""
+        configs = []
+        for p in self.PROJECTS:
+            cfg = copy.copy(self)
+            cfg.PROJECT_NAME = p.get("project_name", self.PROJECT_NAME)
+            cfg.GPS_IP = p.get("gps", {}).get("ip", self.GPS_IP)
+            cfg.GPS_PORT = int(p.get("gps", {}).get("port", self.GPS_PORT))
+            cfg.CONC_UNIT = p.get("conc", {}).get("unit", self.CONC_UNIT)
+            cfg.GPS_QUEUE = queue.Queue()
+            cfg.CONC_QUEUE = queue.Queue()
+            cfg.SHARED_QUEUE = queue.Queue(maxsize=10000)
+            configs.append(cfg)
+        return configs
 
     def _generate_urls(self):
         if not self.DB_URL:
@@ -5,42 +5,61 @@ import firebase_admin
 import webbrowser
 import json
 import os
+import urllib.parse
 
-from firebase_admin import credentials, db, exceptions
+from collections import deque
+from firebase_admin import credentials, exceptions
 from Config import Config
 from Process import RunProcess
+from Procedure.BackupManager import backup_files
+from Procedure.HistoryArchiver import HistoryArchiver, read_records
+from Procedure.RecoveryManager import RecoveryManager
+from Procedure.HistoryCache import HistoryCache
+from Procedure.UploadFilter import DeadbandFilter
+from Procedure.AlertEngine import DEFAULT_THRESHOLDS
+from Procedure.LiveFeedServer import LiveFeedServer
+from Procedure.TileProxy import TileProxy
+from Procedure.FirebaseTransport import create_transport
+from Procedure.LogPipeline import setup_logging, stop_logging
+from Procedure.Profiler import DiagnosticsRunner, parse_profile_command
 
 class SystemController:
     def __init__(self, config_file="config.json"):
         self.config_file = config_file
+        self.log_file = "execution.log"
+        self.log_listener = None
         self.logger = self._setup_logger()
         self.process = None
         self.process_thread = None
         
         self.cmd_listener = None
         self.config_listener = None
+        self.archiver = None
+        self.live_feed = None
+        self.tile_proxy = None
+        self.stop_timeout = 5.0         # stop_process 等待程序執行緒結束的上限秒數
+        self.switch_settle_sec = 1.0    # 專案切換時等待舊連線釋放的秒數
 
         try:
             self.cfg = Config(self.config_file)
         except Exception as e:
             self.logger.error(f"❌ 設定檔讀取失敗: {e}")
+            stop_logging(self.log_listener)
             raise
 
+        # 依設定檔重新套用 log 輪替參數
+        self.logger = self._setup_logger(self.cfg)
         self._init_firebase()
-
-    def _setup_logger(self):
-        log_filename = "execution.log" 
-        handlers = [
-            logging.StreamHandler(),
-            logging.FileHandler(log_filename, encoding='utf-8', mode='w') 
-        ]
-        logging.basicConfig(
-            level=logging.INFO,
-            format='[%(asctime)s] %(message)s',
-            datefmt='%y/%m/%d %H:%M:%S',
-            handlers=handlers,
-            force=True  
-        )
+        self.transport = create_transport(self.cfg)
+        # 遠端分析 (profile:30s / memprofile)，報告與 execution.log 放在同一資料夾
+        self.diagnostics = DiagnosticsRunner(self.transport, output_dir=os.path.dirname(os.path.abspath(self.log_file)))
+
+    def _setup_logger(self, cfg=None):
+        stop_logging(self.log_listener)
+        options = {}
+        if cfg is not None:
+            options = {'max_bytes': cfg.LOG_MAX_BYTES, 'backup_count': cfg.LOG_BACKUP_COUNT, 'when': cfg.LOG_ROTATE_WHEN}
+        self.log_listener = setup_logging(self.log_file, **options)
         return logging.getLogger("Controller")
 
     def _init_firebase(self):
@@ -61,7 +80,7 @@ class SystemController:
                 "gps_port": self.cfg.GPS_PORT,
                 "conc_unit": self.cfg.CONC_UNIT
             }
-            db.reference(f'{self.cfg.PROJECT_NAME}/settings/current_config').set(data)
+            self.transport.reference(f'{self.cfg.PROJECT_NAME}/settings/current_config').set(data)
             self.logger.info(f"📤 已同步設定至專案: {self.cfg.PROJECT_NAME}")
         except Exception as e:
             self.logger.warning(f"同步參數失敗: {e}")
@@ -77,12 +96,12 @@ class SystemController:
         for attempt in range(max_retries):
             try:
                 # 監聽指令
-                cmd_ref = db.reference(f'{self.cfg.PROJECT_NAME}/control/command')
+                cmd_ref = self.transport.reference(f'{self.cfg.PROJECT_NAME}/control/command')
                 cmd_ref.set("") 
                 self.cmd_listener = cmd_ref.listen(self._command_handler)
 
                 # 監聽參數修改
-                config_ref = db.reference(f'{self.cfg.PROJECT_NAME}/control/config_update')
+                config_ref = self.transport.reference(f'{self.cfg.PROJECT_NAME}/control/config_update')
                 config_ref.delete()
                 self.config_listener = config_ref.listen(self._handle_config_update)
                 
@@ -108,6 +127,66 @@ class SystemController:
         except Exception as e:
             self.logger.warning(f"關閉監聽器時發生錯誤 (可忽略): {e}")
 
+    def _start_archiver(self):
+        self._stop_archiver()
+        if not self.cfg.RETENTION_DAYS:
+            return
+        self.archiver = HistoryArchiver(
+            self.cfg.PROJECT_NAME,
+            archive_dir=self.cfg.ARCHIVE_DIR,
+            max_age_days=float(self.cfg.RETENTION_DAYS),
+            transport=self.transport
+        )
+        self.archiver.start(interval_sec=self.cfg.RETENTION_INTERVAL_HOURS * 3600)
+
+    def _run_recovery(self):
+        """背景執行啟動復原：補傳上次異常中斷時 history 缺少的備份紀錄"""
+        if not self.cfg.RECOVERY_ENABLED:
+            return
+        filter_factory = None
+        if self.cfg.UPLOAD_FILTER_ENABLED:
+            try:
+                thresholds = self.transport.reference(f'{self.cfg.PROJECT_NAME}/settings/thresholds').get() or {}
+            except Exception:
+                thresholds = {}
+            # 與 RunProcess 相同：網頁未設定的等級沿用預設閾值
+            thresholds = dict(DEFAULT_THRESHOLDS, **thresholds)
+            def filter_factory(clock):
+                dead_band = DeadbandFilter(
+                    min_distance_m=self.cfg.UPLOAD_MIN_DISTANCE_M,
+                    min_conc_delta=self.cfg.UPLOAD_MIN_CONC_DELTA,
+                    heartbeat_sec=self.cfg.UPLOAD_HEARTBEAT_SEC,
+                    clock=clock
+                )
+                dead_band.set_thresholds(thresholds.values())
+                return dead_band
+        recovery = RecoveryManager(
+            self.cfg.PROJECT_NAME,
+            transport=self.transport,
+            lookback_hours=self.cfg.RECOVERY_LOOKBACK_HOURS,
+            retention_days=self.cfg.RETENTION_DAYS,
+            filter_factory=filter_factory
+        )
+        files = recovery.recent_files()     # 先決定要檢查的檔案，之後新開的備份不在範圍內
+        if not files:
+            return
+        if self.cfg.HISTORY_CACHE_ENABLED:
+            recovery.cache = HistoryCache(self.cfg.PROJECT_NAME, self.cfg.HISTORY_CACHE_PATH, transport=self.transport)
+        def _worker():
+            try:
+                recovery.run(files=files)
+            except Exception as e:
+                self.logger.error(f"❌ 啟動復原失敗: {e}")
+            finally:
+                if recovery.cache:
+                    recovery.cache.close()
+        threading.Thread(target=_worker, daemon=True).start()
+
+    def _stop_archiver(self):
+        if self.archiver:
+            self.archiver.stop()
+            self.archiver = None
+
     def _handle_config_update(self, event):
         if event.data is None or event.data == "": return
         new_settings = event.data
@@ -122,13 +201,13 @@ class SystemController:
         try:
             if old_project_name != new_project_name:
                 self.logger.info(f"👋 正在將舊專案 ({old_project_name}) 標記為離線...")
-                db.reference(f'{old_project_name}/status').set({
+                self.transport.reference(f'{old_project_name}/status').set({
                     'state': 'offline',
                     'message': f'後端已切換至: {new_project_name}'
                 })
                 
                 self.logger.info(f"🔜 預先初始化新專案 ({new_project_name}) 狀態...")
-                db.reference(f'{new_project_name}/status').set({
+                self.transport.reference(f'{new_project_name}/status').set({
                     'state': 'switching', 
                     'message': '專案切換中... (約 1 分鐘)'
                 })
@@ -151,7 +230,7 @@ class SystemController:
                 json.dump(config_data, f, indent=2, ensure_ascii=False)
             
             self.logger.info("✅ config.json 已更新")
-            db.reference(f'{old_project_name}/control/config_update').delete()
+            self.transport.reference(f'{old_project_name}/control/config_update').delete()
 
             self.cfg = Config(self.config_file)
 
@@ -162,12 +241,13 @@ class SystemController:
                     self.stop_process()
                 
                 # 🔥 這裡加入一點延遲，確保舊連線釋放
-                time.sleep(1.0)
+                time.sleep(self.switch_settle_sec)
                 self._setup_listeners()
+                self._start_archiver()
                 
-                time.sleep(1.0) 
+                time.sleep(self.switch_settle_sec) 
                 if not (self.process and self.process.running):
-                    db.reference(f'{new_project_name}/status').set({
+                    self.transport.reference(f'{new_project_name}/status').set({
                         'state': 'stopped',
                         'message': '切換完畢，後端程式已就緒'
                     })
@@ -185,10 +265,11 @@ class SystemController:
     def _command_handler(self, event):
         if event.data is None or event.data == "": return
         command = str(event.data).lower()
+        profile = parse_profile_command(command)
         
-        if command in ['start', 'stop']:
+        if command in ['start', 'stop'] or profile:
             try:
-                db.reference(f'{self.cfg.PROJECT_NAME}/control/command').set("")
+                self.transport.reference(f'{self.cfg.PROJECT_NAME}/control/command').set("")
             except: pass
 
         if command == "start":
@@ -197,6 +278,9 @@ class SystemController:
         elif command == "stop":
             self.logger.info(f"📩 收到指令: {command}")
             self.stop_process()
+        elif profile:
+            self.logger.info(f"📩 收到指令: {command}")
+            self.diagnostics.start(self.cfg.PROJECT_NAME, *profile)
 
     def start_process(self):
         if self.process is not None and self.process.running:
@@ -204,18 +288,20 @@ class SystemController:
         
         try:
             current_cfg = Config(self.config_file)
-            self.process = RunProcess(current_cfg)
+            self.process = RunProcess(current_cfg, transport=self.transport)
+            self.process.live_feed = self.live_feed
+            self.process.tile_proxy = self.tile_proxy
             self.process_thread = threading.Thread(target=self.process.run, daemon=True)
             self.process_thread.start()
 
-            db.reference(f'{self.cfg.PROJECT_NAME}/status').update({
+            self.transport.reference(f'{self.cfg.PROJECT_NAME}/status').update({
                 'state': 'connecting',
                 'message': '系統啟動中...'
             })
             
         except Exception as e:
             self.logger.error(f"❌ 啟動失敗: {e}")
-            db.reference(f'{self.cfg.PROJECT_NAME}/status').update({
+            self.transport.reference(f'{self.cfg.PROJECT_NAME}/status').update({
                 'state': 'stopped', 
                 'message': f'啟動失敗: {str(e)}'
             })
@@ -225,34 +311,93 @@ class SystemController:
             return
 
         self.logger.info("🛑 正在停止後端程序...")
-        self.process.stop()
+        report = self.process.stop() or {}
         if self.process_thread:
-            self.process_thread.join(timeout=1.0)
+            self.process_thread.join(timeout=self.stop_timeout)
+            if self.process_thread.is_alive():
+                self.logger.warning(f"⚠️ 程序執行緒未在 {self.stop_timeout} 秒內結束")
         
         self.process = None
+        self.process_thread = None
         
-        db.reference(f'{self.cfg.PROJECT_NAME}/status').update({
+        message = '使用者手動停止'
+        if report.get('dropped'):
+            message += f"，{report['dropped']} 筆未上傳 (已保留於本地備份)"
+        self.transport.reference(f'{self.cfg.PROJECT_NAME}/status').update({
             'state': 'stopped',
-            'message': '使用者手動停止'
+            'message': message
         })
         self.logger.info("✅ 後端程序已停止")
 
+    def _start_live_feed(self):
+        if not self.cfg.LIVE_FEED_PORT:
+            return
+        try:
+            self.live_feed = LiveFeedServer(
+                host=self.cfg.LIVE_FEED_HOST,
+                port=int(self.cfg.LIVE_FEED_PORT),
+                buffer_size=self.cfg.LIVE_FEED_BUFFER,
+                track_provider=self._local_track
+            )
+            self.live_feed.start()
+        except Exception as e:
+            self.logger.error(f"❌ 區網即時伺服器啟動失敗: {e}")
+            self.live_feed = None
+
+    def _local_track(self):
+        """區網即時網頁的既有軌跡：目前專案本地備份檔中最近 LIVE_FEED_TRACK_SIZE 筆"""
+        track = deque(maxlen=self.cfg.LIVE_FEED_TRACK_SIZE)
+        for path in backup_files(self.cfg.PROJECT_NAME):
+            track.extend(record for _, record in read_records(path))
+        return list(track)
+
+    def _start_tile_proxy(self):
+        if not self.cfg.TILE_PROXY_ENABLED:
+            return
+        try:
+            self.tile_proxy = TileProxy(
+                cache_dir=self.cfg.TILE_CACHE_DIR,
+                max_bytes=int(self.cfg.TILE_CACHE_MAX_MB * 1024 * 1024),
+                upstream=self.cfg.TILE_UPSTREAM,
+                host=self.cfg.TILE_PROXY_HOST,
+                port=self.cfg.TILE_PROXY_PORT,
+                prefetch_zooms=self.cfg.TILE_PREFETCH_ZOOMS,
+                prefetch_margin=self.cfg.TILE_PREFETCH_MARGIN
+            )
+            self.tile_proxy.start()
+        except Exception as e:
+            self.logger.error(f"❌ 圖磚代理啟動失敗: {e}")
+            self.tile_proxy = None
+
     def run(self):
-        url = (f"{self.cfg.MAP_URL}?"
+        self._start_live_feed()
+        self._start_tile_proxy()
+        map_url = self.cfg.MAP_URL
+        live_param = ""
+        if self.live_feed and self.live_feed.running:
+            # 改由本機伺服器提供網頁，資料走區網 SSE
+            map_url = f"http://localhost:{self.live_feed.port}/"
+            live_param = "&live=/events"
+        url = (f"{map_url}?"
                f"id={self.cfg.DB_ID}&"
                f"path={self.cfg.PROJECT_NAME}&"
-               f"key={self.cfg.API_KEY}")
+               f"key={self.cfg.API_KEY}"
+               f"{live_param}")
+        if self.tile_proxy:
+            url += f"&tiles={urllib.parse.quote(self.tile_proxy.url, safe='')}"
         
         webbrowser.open(url)
         
         self.logger.info("🧹 初始化狀態為 Stopped...")
-        db.reference(f'{self.cfg.PROJECT_NAME}/status').set({
+        self.transport.reference(f'{self.cfg.PROJECT_NAME}/status').set({
             'state': 'stopped',
             'message': '後端程式已就緒'
         })
 
         self._push_current_config_to_firebase()
         self._setup_listeners()
+        self._start_archiver()
+        self._run_recovery()
         
         self.logger.info("🟢 後端程式運作中 (按 Ctrl+C 結束)")
         
@@ -264,12 +409,19 @@ class SystemController:
             
             if self.process:
                 self.stop_process() 
+            self._stop_archiver()
+            self.diagnostics.stop()
+            if self.live_feed:
+                self.live_feed.stop()
+            if self.tile_proxy:
+                self.tile_proxy.stop()
             
-            db.reference(f'{self.cfg.PROJECT_NAME}/status').update({
+            self.transport.reference(f'{self.cfg.PROJECT_NAME}/status').update({
                 'state': 'offline',
                 'message': '後端程式已關閉'
             })
             
+            stop_logging(self.log_listener)
             os._exit(0)
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+import argparse
+import logging
+import firebase_admin
+
+from firebase_admin import credentials
+from Config import Config
+from Procedure.HistoryTransfer import HistoryExporter, HistoryImporter
+from Procedure.HistoryArchiver import HistoryArchiver
+from Procedure.HistoryCache import HistoryCache
+from Procedure.FirebaseTransport import create_transport
+
+logger = logging.getLogger("HistoryTool")
+
+def _init_firebase(cfg):
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(cfg.FIREBASE_KEY)
+        firebase_admin.initialize_app(cred, {'databaseURL': cfg.DB_URL})
+    logger.info("📡 HistoryTool 已連線至 Firebase")
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="專案歷史資料批次匯出 / 匯入工具")
+    parser.add_argument("--config", default="config.json", help="設定檔名稱 (預設 config.json)")
+    parser.add_argument("--project", help="專案名稱 (預設為設定檔中的 project_name)")
+    parser.add_argument("--no-resume", action="store_true", help="忽略上次的進度檔，從頭開始")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="分頁讀取 history 並串流寫入 CSV")
+    p_export.add_argument("output", nargs="?", help="輸出檔案 (預設 {project}.csv)")
+    p_export.add_argument("--page-size", type=int, default=500, help="每次讀取筆數")
+    p_export.add_argument("--cache", action="store_true", help="經由本地歷史快取匯出 (只下載新增的紀錄)")
+
+    p_sync = sub.add_parser("sync", help="增量同步 history 至本地快取")
+    p_sync.add_argument("--full", action="store_true", help="重新比對全部 key (含遠端改寫的舊紀錄、未登記的匯入)")
+    p_sync.add_argument("--page-size", type=int, default=500, help="每次讀取筆數")
+
+    p_import = sub.add_parser("import", help="將 CSV 分批平行上傳至 history")
+    p_import.add_argument("input", help="CSV 檔案 (備份檔或網頁下載的 CSV 皆可)")
+    p_import.add_argument("--batch-size", type=int, default=500, help="每批上傳筆數")
+    p_import.add_argument("--workers", type=int, default=4, help="同時上傳的批次數")
+
+    p_archive = sub.add_parser("archive", help="立即將過期的 history 封存至本地壓縮檔")
+    p_archive.add_argument("--days", type=float, help="保留天數 (預設為設定檔中的 max_age_days)")
+
+    p_rehydrate = sub.add_parser("rehydrate", help="將封存資料依時間區間載回 history")
+    p_rehydrate.add_argument("start", help="起始時間，例如 '2026-01-01 00:00:00'")
+    p_rehydrate.add_argument("end", help="結束時間，例如 '2026-01-31 23:59:59'")
+    return parser
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(message)s',
+        datefmt='%y/%m/%d %H:%M:%S'
+    )
+
+    cfg = Config(args.config)
+    project_name = args.project or cfg.PROJECT_NAME
+    _init_firebase(cfg)
+    transport = create_transport(cfg)
+
+    if args.command == "export":
+        output = args.output or f"{project_name}.csv"
+        cache = None
+        if args.cache:
+            cache = HistoryCache(project_name, cfg.HISTORY_CACHE_PATH, transport=transport, page_size=args.page_size)
+        try:
+            HistoryExporter(project_name, output, page_size=args.page_size, cache=cache,
+                            transport=transport).run(resume=not args.no_resume)
+        finally:
+            if cache:
+                cache.close()
+    elif args.command == "sync":
+        cache = HistoryCache(project_name, cfg.HISTORY_CACHE_PATH, transport=transport, page_size=args.page_size)
+        try:
+            count = cache.sync(full=args.full)
+            logger.info(f"🗃️ 同步完成: 新增 {count} 筆，快取共 {cache.count()} 筆 ({cfg.HISTORY_CACHE_PATH})")
+        finally:
+            cache.close()
+    elif args.command == "import":
+        importer = HistoryImporter(project_name, args.input, batch_size=args.batch_size, workers=args.workers,
+                                   transport=transport)
+        importer.run(resume=not args.no_resume)
+    elif args.command in ("archive", "rehydrate"):
+        days = getattr(args, "days", None) or cfg.RETENTION_DAYS or 30
+        archiver = HistoryArchiver(project_name, archive_dir=cfg.ARCHIVE_DIR, max_age_days=float(days),
+                                   transport=transport)
+        if args.command == "archive":
+            archiver.archive_once()
+        else:
+            archiver.rehydrate(args.start, args.end)
+
+if __name__ == "__main__":
+    main()
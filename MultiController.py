@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+import firebase_admin
+import os
+
+from firebase_admin import credentials, db
+from Config import Config
+from Process import RunProcess
+from Procedure.ReaderHub import ReaderHub
+from Procedure.LogPipeline import setup_logging, stop_logging
+from Procedure.ResourceMonitor import resource_snapshot, resource_delta, format_delta
+
+class ProjectRuntime:
+    """多專案模式下的單一專案：各自擁有 Queue、備份檔、status 與指令監聽"""
+    def __init__(self, cfg, hub, logger):
+        self.cfg = cfg
+        self.hub = hub
+        self.logger = logger
+        self.process = None
+        self.process_thread = None
+        self.cmd_listener = None
+        self.footprint = None       # 啟動後的資源增量
+
+    @property
+    def name(self):
+        return self.cfg.PROJECT_NAME
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.running
+
+    def _status(self, state, message):
+        try:
+            db.reference(f'{self.name}/status').update({'state': state, 'message': message})
+        except Exception as e:
+            self.logger.warning(f"[{self.name}] 狀態更新失敗: {e}")
+
+    def publish_ready(self):
+        db.reference(f'{self.name}/status').set({'state': 'stopped', 'message': '後端程式已就緒'})
+        db.reference(f'{self.name}/settings/current_config').set({
+            "db_id": self.cfg.DB_ID,
+            "project_name": self.name,
+            "gps_ip": self.cfg.GPS_IP,
+            "gps_port": self.cfg.GPS_PORT,
+            "conc_unit": self.cfg.CONC_UNIT
+        })
+
+    def setup_listener(self):
+        cmd_ref = db.reference(f'{self.name}/control/command')
+        cmd_ref.set("")
+        self.cmd_listener = cmd_ref.listen(self._command_handler)
+
+    def _command_handler(self, event):
+        if event.data is None or event.data == "": return
+        command = str(event.data).lower()
+        if command not in ('start', 'stop'):
+            return
+        try:
+            db.reference(f'{self.name}/control/command').set("")
+        except Exception: pass
+
+        self.logger.info(f"📩 [{self.name}] 收到指令: {command}")
+        if command == "start":
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        try:
+            before = resource_snapshot()
+            self.process = RunProcess(
+                self.cfg,
+                gps=self.hub.gps(self.cfg.GPS_IP, self.cfg.GPS_PORT),
+                conc=self.hub.conc(self.cfg.CONC_UNIT)
+            )
+            self.process_thread = threading.Thread(target=self.process.run, daemon=True)
+            self.process_thread.start()
+            self._status('connecting', '系統啟動中...')
+            # 執行緒與連線在啟動後陸續建立，稍後再量測增量
+            threading.Timer(2.0, self._measure_footprint, args=(before,)).start()
+        except Exception as e:
+            self.logger.error(f"❌ [{self.name}] 啟動失敗: {e}")
+            self._status('stopped', f'啟動失敗: {str(e)}')
+
+    def _measure_footprint(self, before):
+        if not self.running:
+            return
+        self.footprint = resource_delta(before, resource_snapshot())
+        self.logger.info(f"📊 [{self.name}] 啟動後資源增量: {format_delta(self.footprint)}")
+
+    def stop(self, message='使用者手動停止'):
+        if self.process is None:
+            return
+        self.process.stop()
+        if self.process_thread:
+            self.process_thread.join(timeout=1.0)
+        self.process = None
+        self._status('stopped', message)
+        self.logger.info(f"✅ [{self.name}] 後端程序已停止")
+
+    def close(self):
+        self.stop()
+        if self.cmd_listener:
+            try:
+                self.cmd_listener.close()
+            except Exception as e:
+                self.logger.warning(f"[{self.name}] 關閉監聽器時發生錯誤 (可忽略): {e}")
+            self.cmd_listener = None
+        self._status('offline', '後端程式已關閉')
+
+class MultiController:
+    """
+    單一行程同時服務多個專案：
+    - 共用同一個 firebase_admin app (連線池) 與 ReaderHub (相同來源只開一個讀取器)
+    - 每個專案各自擁有 RunProcess、Queue、備份檔與 status
+    """
+    def __init__(self, config_file="config.json"):
+        self.config_file = config_file
+        self.log_listener = None
+        self.logger = self._setup_logger()
+        self.hub = ReaderHub()
+
+        try:
+            self.cfg = Config(self.config_file)
+        except Exception as e:
+            self.logger.error(f"❌ 設定檔讀取失敗: {e}")
+            stop_logging(self.log_listener)
+            raise
+
+        self.logger = self._setup_logger(self.cfg)
+        configs = self.cfg.project_configs() or [self.cfg]
+        self.projects = {c.PROJECT_NAME: ProjectRuntime(c, self.hub, self.logger) for c in configs}
+        self._init_firebase()
+
+    def _setup_logger(self, cfg=None):
+        stop_logging(self.log_listener)
+        options = {}
+        if cfg is not None:
+            options = {'max_bytes': cfg.LOG_MAX_BYTES, 'backup_count': cfg.LOG_BACKUP_COUNT, 'when': cfg.LOG_ROTATE_WHEN}
+        self.log_listener = setup_logging("execution.log", **options)
+        return logging.getLogger("MultiController")
+
+    def _init_firebase(self):
+        try:
+            if not firebase_admin._apps:
+                cred = credentials.Certificate(self.cfg.FIREBASE_KEY)
+                firebase_admin.initialize_app(cred, {'databaseURL': self.cfg.DB_URL})
+            self.logger.info(f"📡 MultiController 已連線至 Firebase ({len(self.projects)} 個專案)")
+        except Exception as e:
+            self.logger.error(f"❌ Firebase 連線失敗: {e}")
+
+    def report_resources(self, baseline):
+        """輸出目前資源用量與平均每個執行中專案的增量"""
+        active = [p for p in self.projects.values() if p.running]
+        delta = resource_delta(baseline, resource_snapshot())
+        if active:
+            per_project = {k: (None if v is None else v / len(active)) for k, v in delta.items()}
+            self.logger.info(f"📊 {len(active)} 個專案運作中 | 總增量: {format_delta(delta)} | "
+                             f"平均每專案: {format_delta(per_project)} | 共用讀取器: {self.hub.stats()}")
+        return delta
+
+    def run(self, report_interval=60):
+        baseline = resource_snapshot()
+        for project in self.projects.values():
+            try:
+                project.publish_ready()
+                project.setup_listener()
+                self.logger.info(f"👂 已監聽專案: {project.name}")
+            except Exception as e:
+                self.logger.error(f"❌ [{project.name}] 監聽器啟動失敗: {e}")
+
+        self.logger.info("🟢 多專案後端運作中 (按 Ctrl+C 結束)")
+        try:
+            last_report = time.time()
+            while True:
+                time.sleep(1)
+                if time.time() - last_report >= report_interval:
+                    last_report = time.time()
+                    self.report_resources(baseline)
+        except KeyboardInterrupt:
+            self.logger.info("👋 正在關閉系統...")
+            for project in self.projects.values():
+                project.close()
+            stop_logging(self.log_listener)
+            os._exit(0)
+
+if __name__ == "__main__":
+    MultiController().run()
@@ -0,0 +1,217 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('a', 'b', 'c')
+DEFAULT_THRESHOLDS = {'a': 50.0, 'b': 100.0, 'c': 150.0}
+SKIP_STATUS = ('Sensor Timeout', 'All Lost')     # 濃度被強制為 0，不是量測值
+BUCKET_TABLES = ('last', 'rise_to', 'rise_from')
+
+def _bucket(conc):
+    """
+    濃度以 0.01 為單位向下取整分桶 (Firebase key 不可為純數字陣列，加上前綴)
+    桶值不大於濃度，略低於閾值的紀錄不會被算成超標；先取到 1e-6 避免 0.29 * 100 = 28.99… 的誤差
+    """
+    return f"b{math.floor(round(conc * 100, 6))}"
+
+def _bucket_value(key):
+    return int(key[1:]) / 100
+
+def _sum_above(counts, threshold):
+    return sum(count for key, count in counts.items() if _bucket_value(key) >= threshold)
+
+class AlertEngine:
+    """
+    後端閾值警報，逐筆 O(1) 計算並維護 {project}/alerts：
+    - levels/{a|b|c}: 目前閾值、超標筆數、超標事件數、最後超標時間
+    - episodes/{id}: 連續超標事件 (起訖時間、峰值與峰值位置、筆數、是否仍在進行)
+    - state: 事件序號與進行中的事件
+    濃度分佈另存於 {project}/alert_histogram (0.01 分桶，key 數隨濃度範圍成長)，
+    各桶的最後時間與上升次數存於 {project}/alert_buckets (last / rise_to / rise_from)：
+    閾值變更時只用它們重算受影響等級的超標筆數、事件數 (濃度由閾值下方升到上方的次數) 與最後超標時間，
+    不需重掃 history；讀取 alerts 時不會一併下載
+    evaluate() 在合併執行緒呼叫；flush() 由 FirebaseManager 的上傳迴圈定期呼叫，
+    以一次 multi-path update 寫入累積的變更 (路徑相對於 {project})
+    """
+    def __init__(self, project_name, transport, flush_interval=5.0, clock=time.monotonic):
+        self.project_name = project_name
+        self.transport = transport
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        self.levels = {lv: self._empty_level(lv) for lv in LEVELS}
+        self.histogram = {}
+        self.buckets = {name: {} for name in BUCKET_TABLES}
+        self.buckets_complete = True     # 舊資料沒有 alert_buckets 時無法重算事件數，保留原值
+        self.prev_bucket = None
+        self.open_episodes = {}      # level -> (episode_id, episode)
+        self.seq = 0
+        self.pending = {f'alerts/levels/{lv}': dict(level) for lv, level in self.levels.items()}
+        self.last_flush = clock()
+
+    def _empty_level(self, level):
+        return {'threshold': self.thresholds[level], 'records_above': 0, 'episodes': 0, 'last_alert': None}
+
+    def _ref(self, path):
+        return self.transport.reference(f'{self.project_name}/{path}')
+
+    # --- 啟動時延續上次的統計 ---
+    def load(self):
+        """只讀取 levels、state、進行中的事件與濃度分佈，不下載全部歷史事件"""
+        try:
+            levels = self._ref('alerts/levels').get() or {}
+            state = self._ref('alerts/state').get() or {}
+            open_ids = state.get('open') or {}
+            episodes = {lv: self._ref(f'alerts/episodes/{ep_id}').get() for lv, ep_id in open_ids.items()}
+            histogram = self._ref('alert_histogram').get() or {}
+            buckets = self._ref('alert_buckets').get() or {}
+            legacy = None
+            if not histogram:
+                # 舊版把分佈存在 alerts/histogram：搬到獨立節點
+                legacy = self._ref('alerts/histogram').get() or None
+        except Exception as e:
+            logger.warning(f"⚠️ 讀取 alerts 失敗，從零開始統計: {e}")
+            return
+        with self.lock:
+            self.histogram = dict(histogram or legacy or {})
+            self.buckets = {name: dict(buckets.get(name) or {}) for name in BUCKET_TABLES}
+            self.buckets_complete = bool(buckets) or not self.histogram
+            if legacy:
+                self.pending.update({f'alert_histogram/{key}': count for key, count in legacy.items()})
+                self.pending['alerts/histogram'] = None
+            for lv, saved in levels.items():
+                if lv in self.levels and isinstance(saved, dict):
+                    self.levels[lv].update(saved)
+                    self.thresholds[lv] = float(saved.get('threshold', self.thresholds[lv]))
+                    self.pending[f'alerts/levels/{lv}'] = dict(self.levels[lv])
+            self.seq = int(state.get('seq', 0))
+            for lv, ep_id in open_ids.items():
+                if isinstance(episodes.get(lv), dict):
+                    self.open_episodes[lv] = (ep_id, dict(episodes[lv]))
+        logger.info(f"🚨 警報統計已載入 (事件序號 {self.seq}，進行中 {len(self.open_episodes)} 件)")
+
+    # --- 閾值變更 ---
+    def set_thresholds(self, values):
+        changed = []
+        with self.lock:
+            for lv in LEVELS:
+                try:
+                    new = float(values.get(lv))
+                except (TypeError, ValueError):
+                    continue
+                if new == self.thresholds[lv]:
+                    continue
+                self.thresholds[lv] = new
+                self._close_episode(lv, reason='threshold_changed')
+                level = self.levels[lv]
+                level['threshold'] = new
+                level['records_above'] = _sum_above(self.histogram, new)
+                if self.buckets_complete:
+                    level['episodes'] = (_sum_above(self.buckets['rise_to'], new)
+                                         - _sum_above(self.buckets['rise_from'], new))
+                    level['last_alert'] = max((ts for key, ts in self.buckets['last'].items()
+                                               if _bucket_value(key) >= new), default=None)
+                self.pending[f'alerts/levels/{lv}'] = dict(level)
+                changed.append(lv)
+            if changed:
+                self.pending['alerts/state'] = self._state()
+        if changed:
+            logger.info(f"🚨 閾值變更，重新計算等級: {', '.join(changed)}")
+        return changed
+
+    # --- 逐筆計算 ---
+    def evaluate(self, data):
+        conc = data.get('conc')
+        if not isinstance(conc, (int, float)) or data.get('status') in SKIP_STATUS:
+            return
+        ts = data.get('timestamp')
+        with self.lock:
+            key = _bucket(conc)
+            self.histogram[key] = self.histogram.get(key, 0) + 1
+            self.pending[f'alert_histogram/{key}'] = self.histogram[key]
+            if ts is not None:
+                self._set_bucket('last', key, ts)
+            # 上升 (含第一筆)：閾值落在 (前一桶, 這一桶] 之間的等級都會開始一個事件
+            prev = self.prev_bucket
+            if prev is None or _bucket_value(key) > _bucket_value(prev):
+                self._set_bucket('rise_to', key, self.buckets['rise_to'].get(key, 0) + 1)
+                if prev is not None:
+                    self._set_bucket('rise_from', prev, self.buckets['rise_from'].get(prev, 0) + 1)
+            self.prev_bucket = key
+
+            for lv in LEVELS:
+                if conc < self.thresholds[lv]:
+                    self._close_episode(lv)
+                    continue
+                level = self.levels[lv]
+                level['records_above'] += 1
+                level['last_alert'] = ts
+                if lv not in self.open_episodes:
+                    self._open_episode(lv, data)
+                ep_id, episode = self.open_episodes[lv]
+                episode['end'] = ts
+                episode['records'] += 1
+                if conc > episode['peak']:
+                    episode.update({'peak': conc, 'peak_time': ts,
+                                    'lat': data.get('lat'), 'lon': data.get('lon')})
+                self.pending[f'alerts/episodes/{ep_id}'] = dict(episode)
+                self.pending[f'alerts/levels/{lv}'] = dict(level)
+
+    def _set_bucket(self, table, key, value):
+        self.buckets[table][key] = value
+        self.pending[f'alert_buckets/{table}/{key}'] = value
+
+    def _open_episode(self, lv, data):
+        self.seq += 1
+        ep_id = f"{lv}_{self.seq:06d}"
+        self.open_episodes[lv] = (ep_id, {
+            'level': lv, 'threshold': self.thresholds[lv], 'open': True,
+            'start': data.get('timestamp'), 'end': data.get('timestamp'),
+            'start_lat': data.get('lat'), 'start_lon': data.get('lon'),
+            'peak': data.get('conc'), 'peak_time': data.get('timestamp'),
+            'lat': data.get('lat'), 'lon': data.get('lon'), 'records': 0
+        })
+        self.levels[lv]['episodes'] += 1
+        self.pending['alerts/state'] = self._state()
+
+    def _close_episode(self, lv, reason=None):
+        if lv not in self.open_episodes:
+            return
+        ep_id, episode = self.open_episodes.pop(lv)
+        episode['open'] = False
+        if reason:
+            episode['closed_by'] = reason
+        self.pending[f'alerts/episodes/{ep_id}'] = dict(episode)
+        self.pending['alerts/state'] = self._state()
+
+    def _state(self):
+        return {'seq': self.seq, 'open': {lv: ep_id for lv, (ep_id, _) in self.open_episodes.items()}}
+
+    # --- 寫入 Firebase ---
+    def flush(self, force=False):
+        now = self.clock()
+        with self.lock:
+            if not self.pending or (not force and now - self.last_flush < self.flush_interval):
+                return 0
+            pending, self.pending = self.pending, {}
+            self.last_flush = now
+        try:
+            self.transport.reference(self.project_name).update(pending)
+            return len(pending)
+        except Exception as e:
+            logger.error(f"警報統計寫入失敗，稍後重試: {e}")
+            with self.lock:
+                for path, value in pending.items():
+                    self.pending.setdefault(path, value)
+            return 0
+
+    def close(self):
+        """結束時關閉進行中的事件並寫入"""
+        with self.lock:
+            for lv in list(self.open_episodes):
+                self._close_episode(lv, reason='stopped')
+        self.flush(force=True)
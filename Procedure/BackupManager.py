@@ -1,39 +1,105 @@
+import codecs
 import csv
+import glob
+import io
 import os
 import logging
+import re
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# 備份 / 匯出 / 封存共用的 CSV 欄位
+FIELDNAMES = ['timestamp', 'lat', 'lon', 'alt', 'conc', 'conc_unit', 'status']
+
+def row_to_record(row):
+    """將 CSV 讀出的一列 (皆為字串) 轉回上傳格式，空值轉為 None"""
+    if not row or not (row.get('timestamp') or '').strip():
+        return None
+    record = {}
+    for name in FIELDNAMES:
+        value = row.get(name)
+        value = value.strip() if isinstance(value, str) else value
+        if name in ('lat', 'lon', 'alt', 'conc'):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = None
+        elif value == '':
+            value = None
+        if value is not None:
+            record[name] = value
+    return record
+
+def backup_files(project_name, backup_dir="backups"):
+    """該專案的所有備份檔 (依檔名即建立時間排序)，排除名稱相近的其他專案"""
+    pattern = os.path.join(backup_dir, f"{glob.escape(project_name)}_*.csv")
+    own_name = re.compile(rf"{re.escape(project_name)}_\d{{8}}_\d{{6}}\.csv$")
+    return sorted(p for p in glob.glob(pattern) if own_name.match(os.path.basename(p)))
+
 class BackupManager:
+    """
+    本地 CSV 備份 (backups/{project}_{YYYYmmdd_HHMMSS}.csv，UTF-8 BOM)
+    每次寫入先組成完整的 CSV 文字再以無緩衝的檔案直接寫入：寫入失敗時截回寫入前的長度，
+    檔案中不會留下半批資料，呼叫端重試同一批也不會重複
+    """
     def __init__(self, project_name):
         self.project_name = project_name
         self.backup_dir = "backups"
         self.file = None
-        self.writer = None
-        self.fieldnames = ['timestamp', 'lat', 'lon', 'alt', 'conc', 'conc_unit', 'status']
+        self.size = 0
+        self.fieldnames = list(FIELDNAMES)
+
+    def _encode(self, records, header=False):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.fieldnames, extrasaction='ignore')
+        if header:
+            writer.writeheader()
+        writer.writerows(r for r in records if r)
+        return buffer.getvalue().encode('utf-8')
+
+    def _append(self, data):
+        """整段寫入檔案；失敗時截回寫入前的長度後拋出"""
+        start = self.size
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self.file.write(view):]
+            self.size += len(data)
+        except Exception:
+            try:
+                self.file.truncate(start)
+                self.file.seek(start)
+            except OSError as e:
+                logger.error(f"❌ 備份檔案無法還原到寫入前的長度: {e}")
+            raise
 
     def start(self):
         try:
             if not os.path.exists(self.backup_dir): os.makedirs(self.backup_dir)
             now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"{self.backup_dir}/{self.project_name}_{now_str}.csv"
-            self.file = open(filename, mode='w', newline='', encoding='utf-8-sig')
-            self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction='ignore')
-            self.writer.writeheader()
-            self.file.flush()
+            self.file = open(filename, mode='wb', buffering=0)
+            self.size = 0
+            self._append(codecs.BOM_UTF8 + self._encode([], header=True))
             logger.info(f"💾 本地備份已啟動: {filename}")
         except Exception as e:
             logger.error(f"❌ 無法建立備份檔案: {e}")
+            self.stop()
 
     def write(self, data):
-        if self.file and self.writer and data:
+        if self.file and data:
             try:
-                self.writer.writerow(data)
-                self.file.flush()
+                self._append(self._encode([data]))
             except Exception as e:
                 logger.error(f"⚠️ 寫入備份失敗: {e}")
 
+    def write_many(self, records):
+        """整批寫入 (要嘛全部寫入、要嘛都沒寫入)；錯誤直接拋出，由呼叫端 (CsvSink) 處理"""
+        if not self.file:
+            raise IOError("備份檔案未開啟")
+        self._append(self._encode(records))
+
     def stop(self):
         if self.file:
             try:
@@ -43,4 +109,3 @@ class BackupManager:
                 logger.error(f"❌ 關閉備份檔案錯誤: {e}")
             finally:
                 self.file = None
-                self.writer = None
\ No newline at end of file
@@ -12,6 +12,8 @@ class ConcentrationReader:
         self.unit = None 
         self.conc_queue = None
         self.running = False
+        self.thread = None
+        self.wake = threading.Event()     # stop() 時喚醒等待
 
     def _cleanup(self):
         """明確釋放所有連線資源"""
@@ -32,6 +34,7 @@ class ConcentrationReader:
 
     def stop(self):
         self.running = False
+        self.wake.set()
         self._cleanup()
 
     def _producer(self):
@@ -55,13 +58,15 @@ class ConcentrationReader:
                 self.conc_queue.put(conc_packet)
                 
                 # 控制頻率 (盡量接近 1 秒 1 次，與 GPS 同步)
-                time.sleep(1) 
+                self.wake.wait(1) 
                 
             except Exception as e:
                 logger.error(f"濃度讀取錯誤: {e}")
-                time.sleep(1)
+                self.wake.wait(1)
 
     def run(self):
         self.running = True
-        threading.Thread(target=self._producer, daemon=True).start()
+        self.wake.clear()
+        self.thread = threading.Thread(target=self._producer, daemon=True)
+        self.thread.start()
         logger.info(f"🚀 開始處理 Conc 數據...")
\ No newline at end of file
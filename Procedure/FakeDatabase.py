@@ -0,0 +1,191 @@
+import copy
+import itertools
+import threading
+
+from collections import OrderedDict
+
+class FakeEvent:
+    """模擬 firebase_admin.db.Event"""
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+class FakeListener:
+    def __init__(self, database, path, callback):
+        self.database = database
+        self.path = path
+        self.callback = callback
+
+    def close(self):
+        self.database._remove_listener(self)
+
+class FakeDatabase:
+    """
+    本地記憶體版 Realtime Database，僅供測試與壓力測試 (SoakTest) 使用：
+    - 支援 get / set / update / push / delete / listen
+    - 支援 order_by_key / order_by_child + start_at / end_at / limit_to_first / limit_to_last
+    """
+    def __init__(self):
+        self.root = {}
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.counter = itertools.count()
+        self.stats = {'get': 0, 'set': 0, 'update': 0, 'push': 0, 'delete': 0}
+
+    def reference(self, path='/'):
+        return FakeReference(self, path)
+
+    # --- 路徑工具 ---
+    @staticmethod
+    def _split(path):
+        return [p for p in str(path).split('/') if p]
+
+    def _read(self, parts):
+        node = self.root
+        for p in parts:
+            if not isinstance(node, dict) or p not in node:
+                return None
+            node = node[p]
+        return copy.deepcopy(node)
+
+    def _write(self, parts, value):
+        if not parts:
+            self.root = copy.deepcopy(value) if isinstance(value, dict) else {}
+            return
+        node = self.root
+        for p in parts[:-1]:
+            if not isinstance(node.get(p), dict):
+                node[p] = {}
+            node = node[p]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = copy.deepcopy(value)
+        self._prune(parts[:-1])
+
+    def _prune(self, parts):
+        """與 Firebase 相同：空節點自動消失"""
+        for depth in range(len(parts), 0, -1):
+            parent = self.root
+            for p in parts[:depth - 1]:
+                parent = parent.get(p, {})
+            if parent.get(parts[depth - 1]) == {}:
+                parent.pop(parts[depth - 1])
+
+    def _notify(self, parts):
+        for listener in list(self.listeners):
+            lp = self._split(listener.path)
+            if lp[:len(parts)] == parts or parts[:len(lp)] == lp:
+                listener.callback(FakeEvent('put', '/', self._read(lp)))
+
+    def _remove_listener(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def next_push_key(self):
+        # 與真正的 push id 相同：依產生順序可字典排序
+        return f"-fake{next(self.counter):015d}"
+
+class FakeReference:
+    def __init__(self, database, path, query=None):
+        self.database = database
+        self.path = '/' + '/'.join(FakeDatabase._split(path))
+        self.key = FakeDatabase._split(path)[-1] if FakeDatabase._split(path) else None
+        self.query = query or {}
+
+    def _parts(self):
+        return FakeDatabase._split(self.path)
+
+    def _with(self, **kwargs):
+        query = dict(self.query)
+        query.update(kwargs)
+        return FakeReference(self.database, self.path, query)
+
+    def child(self, path):
+        return self.database.reference(f"{self.path}/{path}")
+
+    # --- 查詢 ---
+    def order_by_key(self):
+        return self._with(order='$key')
+
+    def order_by_child(self, name):
+        return self._with(order=name)
+
+    def start_at(self, value):
+        return self._with(start=value)
+
+    def end_at(self, value):
+        return self._with(end=value)
+
+    def limit_to_first(self, n):
+        return self._with(first=n)
+
+    def limit_to_last(self, n):
+        return self._with(last=n)
+
+    def get(self, shallow=False):
+        with self.database.lock:
+            self.database.stats['get'] += 1
+            value = self.database._read(self._parts())
+        if shallow and isinstance(value, dict):
+            return {k: True for k in value}
+        if not self.query or not isinstance(value, dict):
+            return value
+
+        order = self.query.get('order', '$key')
+        def sort_value(item):
+            key, val = item
+            if order == '$key':
+                return key
+            return val.get(order) if isinstance(val, dict) else None
+
+        items = [(k, v) for k, v in value.items() if sort_value((k, v)) is not None]
+        items.sort(key=lambda item: (sort_value(item), item[0]))
+        if 'start' in self.query:
+            items = [i for i in items if sort_value(i) >= self.query['start']]
+        if 'end' in self.query:
+            items = [i for i in items if sort_value(i) <= self.query['end']]
+        if 'first' in self.query:
+            items = items[:self.query['first']]
+        if 'last' in self.query:
+            items = items[-self.query['last']:]
+        return OrderedDict(items)
+
+    # --- 寫入 ---
+    def set(self, value):
+        with self.database.lock:
+            self.database.stats['set'] += 1
+            self.database._write(self._parts(), value)
+            self.database._notify(self._parts())
+
+    def update(self, value):
+        with self.database.lock:
+            self.database.stats['update'] += 1
+            for sub_path, sub_value in value.items():
+                parts = self._parts() + FakeDatabase._split(sub_path)
+                self.database._write(parts, sub_value)
+            self.database._notify(self._parts())
+
+    def push(self, value=''):
+        with self.database.lock:
+            self.database.stats['push'] += 1
+            key = self.database.next_push_key()
+            ref = self.child(key)
+            self.database._write(ref._parts(), value)
+            self.database._notify(ref._parts())
+            return ref
+
+    def delete(self):
+        with self.database.lock:
+            self.database.stats['delete'] += 1
+            self.database._write(self._parts(), None)
+            self.database._notify(self._parts())
+
+    def listen(self, callback):
+        listener = FakeListener(self.database, self.path, callback)
+        with self.database.lock:
+            self.database.listeners.append(listener)
+            callback(FakeEvent('put', '/', self.database._read(self._parts())))
+        return listener
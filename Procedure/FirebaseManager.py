@@ -3,9 +3,23 @@ import logging
 import queue
 import time
 from firebase_admin import credentials, db
+from Procedure.FirebaseTransport import AdminTransport, PushIdGenerator
+from Procedure.LogPipeline import RecordSummary
+from Procedure.RecentWindow import clear_recent
 
 logger = logging.getLogger(__name__)
 
+def record_status(data):
+    """依紀錄的 status 欄位回傳 (status/state, status/message)"""
+    d_status = data.get('status')
+    if d_status == 'Sensor Timeout':
+        return 'conc_lost', 'CONC 連線失敗'
+    if d_status == 'GPS Lost' or d_status == 'V':
+        return 'gps_lost', 'GPS 連線失敗'
+    if d_status == 'All Lost':
+        return 'all_lost', '連線失敗'
+    return 'active', '連線成功'
+
 class FirebaseManager:
     def __init__(self, key_path, db_url):
         self.key_path = key_path
@@ -13,6 +27,17 @@ class FirebaseManager:
         self.project_name = None
         self.data_queue = None
         self.running = False
+        self.transport = AdminTransport()     # 可替換為 RestTransport
+        self.log_interval = 10.0              # 逐筆 log 彙總的間隔秒數
+        self.last_activity = 0.0              # 上游仍有資料但被壓縮略過的時間
+        self.alert_engine = None              # 選用: AlertEngine，於上傳迴圈中定期寫入
+        self.recent = None                    # 選用: RecentWindow，與 latest 一起寫入
+        self.supervised = False               # 由 Supervisor 管理時，錯誤直接拋出以便重新啟動
+        self.drain_deadline = None            # stop(deadline) 後上傳剩餘資料的期限 (monotonic)
+        self.uploaded = 0                     # 已寫入 history 的筆數
+        self.batch_size = 50                  # 每次 multi-path update 最多寫入的筆數
+        self.push_ids = PushIdGenerator()     # history key 在本地產生，重送時沿用
+        self.retry = {}                       # 失敗後放回佇列的紀錄：id(紀錄) -> (紀錄, key)
         self._initialize_firebase()  
 
     def _initialize_firebase(self):
@@ -25,55 +50,128 @@ class FirebaseManager:
             logger.error(f"❌ Firebase 連線失敗: {e}")
             return
     
+    def _requeue(self, batch, end=False):
+        """
+        上傳失敗：把已取出的一批紀錄 (與結束標記) 依原順序放回佇列最前面，重新啟動後先送這一批
+        記住原本的 key，若前一次其實已寫入 (如回應逾時)，重送只會覆寫同一批
+        """
+        with self.data_queue.mutex:
+            if end:
+                self.data_queue.queue.appendleft(None)
+                self.data_queue.unfinished_tasks += 1
+            for key, data in reversed(batch):
+                self.retry[id(data)] = (data, key)
+                self.data_queue.queue.appendleft(data)
+                self.data_queue.unfinished_tasks += 1
+            self.data_queue.not_empty.notify()
+
+    def _key_for(self, data):
+        entry = self.retry.pop(id(data), None)
+        if entry and entry[0] is data:
+            return entry[1]
+        return self.push_ids()
+
+    def end_stream(self):
+        """放入結束標記；不受佇列上限限制，佇列已滿時也不會阻塞"""
+        with self.data_queue.mutex:
+            self.data_queue.queue.append(None)
+            self.data_queue.unfinished_tasks += 1
+            self.data_queue.not_empty.notify()
+
+    def _next_batch(self):
+        """取出最多 batch_size 筆，回傳 (紀錄列表, 是否遇到結束標記)；佇列為空時拋出 queue.Empty"""
+        data = self.data_queue.get(timeout=1)
+        if data is None:
+            return [], True
+        batch = [data]
+        while len(batch) < self.batch_size:
+            try:
+                data = self.data_queue.get_nowait()
+            except queue.Empty:
+                break
+            if data is None:
+                return batch, True
+            batch.append(data)
+        return batch, False
+
+    def write_batch(self, batch, ref_project=None):
+        """
+        以一次 multi-path update 寫入一批 [(key, 紀錄)]：history/<key>、latest、recent 與 status
+        (與 set 相同是覆寫固定路徑，重送不會產生重複資料)；失敗時 recent 的寫入位置還原
+        """
+        last = batch[-1][1]
+        state, message = record_status(last)
+        updates = {f'history/{key}': data for key, data in batch}
+        updates.update({'latest': last, 'status/state': state, 'status/message': message})
+        mark = (self.recent.head, self.recent.count) if self.recent else None
+        try:
+            if self.recent:
+                for _, data in batch:
+                    updates.update(self.recent.next_update(data))
+            (ref_project or self.transport.reference(self.project_name)).update(updates)
+        except Exception:
+            if mark:
+                self.recent.head, self.recent.count = mark
+            raise
+
     def _update_status(self, ref_status, state, message=""):
         try:
             ref_status.update({'state': state, 'message': message})
         except Exception as e:
             logger.error(f"狀態更新失敗: {e}")
 
-    def stop(self):
+    def touch(self):
+        """上游有收到資料但未送來 (被上傳過濾略過)，避免狀態被誤判為等待訊號"""
+        self.last_activity = time.time()
+
+    def stop(self, deadline=None):
+        """deadline 有值時先把佇列中剩餘的資料上傳完 (最多到 deadline) 再結束"""
+        self.drain_deadline = deadline
         self.running = False
-        if self.data_queue: self.data_queue.put(None)
+        if self.data_queue: self.end_stream()
+
+    def _draining(self):
+        return self.drain_deadline is not None and time.monotonic() < self.drain_deadline
 
     def run(self):
         self.running = True
-        ref_latest = db.reference(f'{self.project_name}/latest')
-        ref_history = db.reference(f'{self.project_name}/history')
-        ref_status = db.reference(f'{self.project_name}/status')
+        self.drain_deadline = None
+        ref_status = self.transport.reference(f'{self.project_name}/status')
+        ref_project = self.transport.reference(self.project_name)
+        ref_recent = self.transport.reference(f'{self.project_name}/recent')
+        if self.recent:
+            self.recent.load(ref_recent)
+        else:
+            clear_recent(ref_recent)      # 先前工作階段留下的環狀區已不會更新
         logger.info(f"🚀 開始同步 Firebase ...")
+        summary = RecordSummary(logger, interval=self.log_interval)
         
         last_data_receive_time = time.time()
         grace_period = 2.0
         exit_state = 'offline'
         exit_msg = '程式已停止運作'
+        in_flight = None      # 已從佇列取出、尚未寫入的一批 [(key, 紀錄)]
+        end = False
         
         try:
-            while self.running:
+            while self.running or self._draining():
                 try:
-                    data = self.data_queue.get(timeout=1)
-                    if data:
+                    batch, end = self._next_batch()
+                    if batch:
+                        in_flight = [(self._key_for(data), data) for data in batch]
                         last_data_receive_time = time.time()
-                        ref_latest.set(data)
-                        
-                        d_status = data.get('status')
-                        new_state = 'active'
-                        new_msg = '連線成功'
-                        if d_status == 'Sensor Timeout':
-                            new_state = 'conc_lost'
-                            new_msg = 'CONC 連線失敗'
-                        elif d_status == 'GPS Lost' or d_status == 'V':
-                            new_state = 'gps_lost'
-                            new_msg = 'GPS 連線失敗'
-                        elif d_status == 'All Lost':
-                            new_state = 'all_lost'
-                            new_msg = '連線失敗'
-                        else:
-                            new_state = 'active'
-                            new_msg = '連線成功'
+                        self.write_batch(in_flight, ref_project)
+                        in_flight = None
+                        self.uploaded += len(batch)
+                        if self.alert_engine: self.alert_engine.flush()
+                        for data in batch:
+                            summary.add(data, record_status(data)[1])
+                        if logger.isEnabledFor(logging.DEBUG):
+                            data = batch[-1]
+                            coord_str = f"({data['lat']:.6f}, {data['lon']:.6f})" if (data['lat'] is not None and data['lon'] is not None) else "(No GPS)"
+                            logger.debug(f"座標: {coord_str} || 濃度: {data.get('conc', 'N/A')} {data.get('conc_unit', '')} ({record_status(data)[1]}) || 本批 {len(batch)} 筆")
 
-                        ref_status.update({'state': new_state, 'message': new_msg})
-
-                    if data is None: 
+                    if end:
                         if self.running:
                             exit_state = 'timeout'
                             exit_msg = '程式逾時停止，請重新開始'
@@ -81,14 +179,13 @@ class FirebaseManager:
                             exit_state = 'offline'
                             exit_msg = '程式已手動停止'
                         break
-
-                    ref_history.push(data)
-                    coord_str = f"({data['lat']:.6f}, {data['lon']:.6f})" if (data['lat'] is not None and data['lon'] is not None) else "(No GPS)"
-                    status_log = new_msg if data else 'N/A'
-                    logger.info(f"座標: {coord_str} || 濃度: {data.get('conc', 'N/A')} {data.get('conc_unit', '')} ({status_log})")
                 
                 except queue.Empty:
-                    time_diff = time.time() - last_data_receive_time
+                    if not self.running:
+                        break
+                    summary.flush()
+                    if self.alert_engine: self.alert_engine.flush()
+                    time_diff = time.time() - max(last_data_receive_time, self.last_activity)
                     if time_diff >= grace_period:
                         ref_status.update({'state': 'connecting', 'message': '等待訊號...'})
                     continue
@@ -96,6 +193,17 @@ class FirebaseManager:
             exit_state = 'error'
             exit_msg = f'程式錯誤: {str(e)}'
             logger.error(f"❌ 錯誤: {e}")
+            if in_flight is not None:
+                self._requeue(in_flight, end)
+            if self.supervised:
+                raise       # 交由 Supervisor 重新啟動，不寫入結束狀態
         finally:
-            self._update_status(ref_status, exit_state, exit_msg)
-            logger.info(f"🏁 服務停止，原因: {exit_state}")
\ No newline at end of file
+            summary.flush(force=True)
+            if exit_state != 'error' or not self.supervised:
+                if self.alert_engine: self.alert_engine.close()
+                self._update_status(ref_status, exit_state, exit_msg)
+                logger.info(f"🏁 服務停止，原因: {exit_state}")
+            stats = self.transport.stats()
+            if stats:
+                logger.info(f"🔁 傳輸統計: {stats['requests']} 次請求, 連線重用率 {stats['reuse_ratio']:.0%}, "
+                            f"新建連線 {stats['connections_opened']} 條, 壓縮比 {stats['compression_ratio']:.2f}")
\ No newline at end of file
@@ -0,0 +1,302 @@
+import gzip
+import http.client
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+from urllib.parse import urlsplit, urlencode, quote
+from firebase_admin import db
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'PATCH', 'DELETE')     # 重送不會改變結果，斷線後可安全重試
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+class TransportError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class PushIdGenerator:
+    """
+    在用戶端產生與 push() 相同格式的 key (8 字元毫秒時間 + 12 字元亂數，依產生順序可字典排序)
+    先決定 key 再以 set 寫入，逾時後重送同一 key 只會覆寫，不會像 push (POST) 產生重複紀錄
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.last_ms = None
+        self.last_rand = []
+
+    def __call__(self):
+        with self.lock:
+            now = int(self.clock() * 1000)
+            if now == self.last_ms:
+                # 同一毫秒內：亂數部分加一，維持排序
+                i = len(self.last_rand) - 1
+                while i >= 0 and self.last_rand[i] == len(PUSH_CHARS) - 1:
+                    self.last_rand[i] = 0
+                    i -= 1
+                if i >= 0:
+                    self.last_rand[i] += 1
+            else:
+                self.last_ms = now
+                self.last_rand = [random.randrange(len(PUSH_CHARS)) for _ in range(12)]
+            stamp = ''
+            for _ in range(8):
+                stamp = PUSH_CHARS[now % 64] + stamp
+                now //= 64
+            return stamp + ''.join(PUSH_CHARS[i] for i in self.last_rand)
+
+class AdminTransport:
+    """預設傳輸層：直接使用 firebase_admin 的 db.reference"""
+    def reference(self, path):
+        return db.reference(path)
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+class RestReference:
+    """與 db.reference 相同用法的 REST 版參照 (get / set / update / push / delete / 查詢)"""
+    def __init__(self, transport, path, params=None):
+        self.transport = transport
+        self.path = '/' + '/'.join(p for p in str(path).split('/') if p)
+        self.key = self.path.rsplit('/', 1)[-1] or None
+        self.params = params or {}
+
+    def child(self, path):
+        return RestReference(self.transport, f"{self.path}/{path}")
+
+    def _with(self, **params):
+        merged = dict(self.params)
+        merged.update({k: json.dumps(v) for k, v in params.items()})
+        return RestReference(self.transport, self.path, merged)
+
+    def order_by_key(self):
+        return self._with(orderBy="$key")
+
+    def order_by_child(self, name):
+        return self._with(orderBy=name)
+
+    def start_at(self, value):
+        return self._with(startAt=value)
+
+    def end_at(self, value):
+        return self._with(endAt=value)
+
+    def limit_to_first(self, n):
+        return self._with(limitToFirst=n)
+
+    def limit_to_last(self, n):
+        return self._with(limitToLast=n)
+
+    def get(self, shallow=False, timeout=None):
+        params = dict(self.params)
+        if shallow:
+            params['shallow'] = 'true'
+        return self.transport.request('GET', self.path, params=params, timeout=timeout)
+
+    def set(self, value, timeout=None):
+        self.transport.request('PUT', self.path, value, params={'print': 'silent'}, timeout=timeout)
+
+    def update(self, value, timeout=None):
+        self.transport.request('PATCH', self.path, value, params={'print': 'silent'}, timeout=timeout)
+
+    def push(self, value='', timeout=None):
+        result = self.transport.request('POST', self.path, value, timeout=timeout)
+        return self.child(result['name'])
+
+    def delete(self, timeout=None):
+        self.transport.request('DELETE', self.path, params={'print': 'silent'}, timeout=timeout)
+
+    def listen(self, callback):
+        # 即時監聽 (SSE) 仍交給 firebase_admin
+        return db.reference(self.path).listen(callback)
+
+class RestTransport:
+    """
+    Realtime Database REST 傳輸層：
+    - 連線池保持 keep-alive，避免每次寫入重新握手 TLS
+    - 超過 gzip_min_bytes 的請求以 gzip 壓縮；伺服器回應不支援該編碼 (415 或錯誤訊息提到 encoding / gzip)
+      才停用壓縮，其他 400 只以不壓縮重送一次，重送成功才確定是 gzip 的問題
+    - 每種方法可設定不同逾時，呼叫時也可個別指定 timeout
+    - stats() 提供連線重用率等統計
+    """
+    DEFAULT_TIMEOUTS = {'GET': 10.0, 'PUT': 5.0, 'PATCH': 5.0, 'POST': 5.0, 'DELETE': 5.0}
+
+    def __init__(self, db_url, credential=None, pool_size=4, timeouts=None,
+                 compress=True, gzip_min_bytes=512):
+        parts = urlsplit(db_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.credential = credential
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.compress = compress
+        self.gzip_min_bytes = gzip_min_bytes
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.lock = threading.Lock()
+        self.token_lock = threading.Lock()
+        self._token = None
+        self._token_expiry = 0
+        self.counters = {'requests': 0, 'connections_opened': 0, 'reused': 0, 'retries': 0,
+                         'gzip_requests': 0, 'bytes_raw': 0, 'bytes_sent': 0}
+
+    # --- 連線池 ---
+    def _new_connection(self, timeout):
+        conn_cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        with self.lock:
+            self.counters['connections_opened'] += 1
+        return conn_cls(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout):
+        try:
+            conn = self.pool.get_nowait()
+            with self.lock:
+                self.counters['reused'] += 1
+            return conn, True
+        except queue.Empty:
+            return self._new_connection(timeout), False
+
+    def _release(self, conn):
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # --- 認證 ---
+    def _auth_header(self):
+        if self.credential is None:
+            return {}
+        # 多個執行緒同時發現 token 過期時只更新一次
+        with self.token_lock:
+            if self._token is None or time.time() > self._token_expiry - 60:
+                info = self.credential.get_access_token()
+                self._token = info.access_token
+                self._token_expiry = info.expiry.timestamp() if info.expiry else time.time() + 3000
+            return {'Authorization': f'Bearer {self._token}'}
+
+    # --- 請求 ---
+    def reference(self, path):
+        return RestReference(self, path)
+
+    def _encode(self, value):
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        body = raw
+        if self.compress and len(raw) >= self.gzip_min_bytes:
+            body = gzip.compress(raw)
+            headers['Content-Encoding'] = 'gzip'
+        return raw, body, headers
+
+    def request(self, method, path, value=None, params=None, timeout=None):
+        timeout = timeout or self.timeouts.get(method, 10.0)
+        url = quote(f"{path.rstrip('/') or '/'}.json", safe='/$-_.~')
+        if params:
+            url += '?' + urlencode(params)
+        headers = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
+        headers.update(self._auth_header())
+        raw, body = b'', None
+        if value is not None or method in ('PUT', 'PATCH', 'POST'):
+            raw, body, body_headers = self._encode(value)
+            headers.update(body_headers)
+
+        gzip_suspect = False
+        for attempt in range(2):
+            if attempt == 0:
+                conn, reused = self._acquire(timeout)
+            else:
+                conn, reused = self._new_connection(timeout), False
+            sent = False
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, url, body=body, headers=headers)
+                sent = True
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    http.client.CannotSendRequest, http.client.BadStatusLine):
+                conn.close()
+                # 池中的舊連線可能已被伺服器關閉，換新連線重試一次；
+                # 請求送出後才斷線時伺服器可能已經寫入，POST (push) 重送會產生重複資料，不重試
+                if reused and attempt == 0 and (not sent or method in IDEMPOTENT_METHODS):
+                    with self.lock:
+                        self.counters['retries'] += 1
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if resp.getheader('Connection', '').lower() == 'close':
+                conn.close()
+            else:
+                self._release(conn)
+
+            if resp.getheader('Content-Encoding', '').lower() == 'gzip':
+                data = gzip.decompress(data)
+
+            if resp.status in (400, 415) and headers.get('Content-Encoding') == 'gzip' and attempt == 0:
+                message = data.decode('utf-8', 'ignore').lower()
+                if resp.status == 415 or 'encoding' in message or 'gzip' in message:
+                    logger.warning("⚠️ 伺服器不接受 gzip 請求，改為不壓縮傳送")
+                    self.compress = False
+                else:
+                    gzip_suspect = True     # 原因不明：只有這次改為不壓縮重送
+                body = raw
+                headers.pop('Content-Encoding')
+                continue
+
+            if gzip_suspect and resp.status < 400:
+                logger.warning("⚠️ gzip 請求被拒、不壓縮重送成功，改為不壓縮傳送")
+                self.compress = False
+
+            with self.lock:
+                self.counters['requests'] += 1
+                self.counters['bytes_raw'] += len(raw)
+                self.counters['bytes_sent'] += len(body or b'')
+                if headers.get('Content-Encoding') == 'gzip':
+                    self.counters['gzip_requests'] += 1
+
+            if resp.status >= 400:
+                raise TransportError(resp.status, data.decode('utf-8', 'ignore')[:200])
+            return json.loads(data) if data else None
+
+    def stats(self):
+        with self.lock:
+            result = dict(self.counters)
+        opened = result['connections_opened']
+        result['reuse_ratio'] = round(result['reused'] / max(result['reused'] + opened, 1), 3)
+        result['compression_ratio'] = round(result['bytes_sent'] / max(result['bytes_raw'], 1), 3)
+        return result
+
+def create_transport(cfg):
+    """依設定檔 transport.type 建立傳輸層 (admin: firebase_admin, rest: keep-alive REST)"""
+    if cfg.TRANSPORT_TYPE != 'rest':
+        return AdminTransport()
+    credential = None
+    if cfg.FIREBASE_KEY:
+        from firebase_admin import credentials
+        credential = credentials.Certificate(cfg.FIREBASE_KEY)
+    return RestTransport(
+        cfg.DB_URL,
+        credential=credential,
+        pool_size=cfg.TRANSPORT_POOL_SIZE,
+        timeouts=cfg.TRANSPORT_TIMEOUTS,
+        compress=cfg.TRANSPORT_GZIP
+    )
@@ -29,6 +29,8 @@ class GPSReader:
         }     # 緩存最新資料
         self.last_yield_time = None
         self.running = False
+        self.thread = None
+        self.wake = threading.Event()     # stop() 時喚醒重試等待
 
     def _cleanup(self):
         """明確釋放所有連線資源"""
@@ -39,6 +41,11 @@ class GPSReader:
         finally:
             self.file_obj = None
             
+        try:
+            # 先 shutdown 才能喚醒另一個執行緒中阻塞的讀取
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except Exception as e:
+            logger.debug(f"GPS Socket shutdown 時發生錯誤: {e}")
         try:
             self.socket.close()
         except Exception as e: 
@@ -49,6 +56,7 @@ class GPSReader:
     
     def stop(self):
         self.running = False
+        self.wake.set()
         self._cleanup()
 
     def _producer(self):
@@ -93,7 +101,7 @@ class GPSReader:
                 else:
                     logger.warning(f"⚠️ GPS 連線失敗，5 秒後重試...")
                     self._cleanup()
-                    time.sleep(5)       # 等待 5 秒後再嘗試
+                    self.wake.wait(5)   # 等待 5 秒後再嘗試 (stop 時立即返回)
 
         if self.running:
             logger.error("🏁 逾時連線，GPS 追蹤執行緒已停止。")
@@ -132,6 +140,8 @@ class GPSReader:
 
     def run(self):
         self.running = True
+        self.wake.clear()
         # 啟動背景執行緒 (daemon=True 確保主程式關閉時執行緒也結束)
         logger.info(f"🚀 開始處理 GPS 數據...")
-        threading.Thread(target=self._producer, daemon=True).start()
\ No newline at end of file
+        self.thread = threading.Thread(target=self._producer, daemon=True)
+        self.thread.start()
\ No newline at end of file
@@ -0,0 +1,223 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+
+from datetime import datetime, timedelta
+from Procedure.BackupManager import FIELDNAMES, row_to_record
+from Procedure.FirebaseTransport import AdminTransport
+from Procedure.HistoryTransfer import import_key_prefix, make_import_key, register_import
+
+logger = logging.getLogger(__name__)
+
+def open_records_file(path, mode='r'):
+    """開啟備份 / 封存檔 (.csv 或 .csv.gz)，兩者欄位相同可互換使用"""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', newline='', encoding='utf-8-sig')
+    return open(path, mode, newline='', encoding='utf-8-sig')
+
+def read_records(path, start=None, end=None):
+    """逐筆讀出檔案中的紀錄，可依時間區間 (含頭尾) 過濾"""
+    with open_records_file(path) as f:
+        for row_index, row in enumerate(csv.DictReader(f)):
+            record = row_to_record(row)
+            if record is None:
+                continue
+            ts = record['timestamp']
+            if (start and ts < start) or (end and ts > end):
+                continue
+            yield row_index, record
+
+def _compact(ts):
+    """'2026-01-06 12:00:00' -> '20260106_120000'"""
+    return ts.replace('-', '').replace(':', '').replace(' ', '_')
+
+class HistoryArchiver:
+    """
+    歷史資料保留與封存：
+    - 定期將超過 max_age_days 的 history 移至本地壓縮檔 (與備份檔同欄位)
+    - 於 {project}/archive 留下各封存檔的時間範圍與筆數
+    - 可依時間區間將封存資料重新載回 history
+    註: 依 timestamp 查詢需在資料庫規則中為 history 設定 ".indexOn": "timestamp"
+    """
+    def __init__(self, project_name, archive_dir="archives", max_age_days=30, page_size=500, max_file_records=50000,
+                 transport=None):
+        self.project_name = project_name
+        self.transport = transport or AdminTransport()
+        self.archive_dir = os.path.join(archive_dir, project_name)
+        self.max_age_days = max_age_days
+        self.page_size = page_size
+        self.max_file_records = max_file_records
+        self.index_path = os.path.join(self.archive_dir, "index.json")
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # --- 本地索引 ---
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    # --- 封存 ---
+    def _iter_expired(self, ref_history, cutoff):
+        """
+        以 (timestamp, key) 為游標依時間分頁讀出過期資料，逐頁產生 [(key, record)]
+        查詢只能從某個 timestamp 開始：同一時間點已讀過的筆數加進下一頁的 limit，再略過這些 key
+        (同一時間點依 key 排序，已讀過的必定排在最前面)，同一時間點超過一頁也不會提早結束
+        """
+        last_ts, seen = "", set()
+        while True:
+            limit = self.page_size + len(seen)
+            page = ref_history.order_by_child('timestamp').start_at(last_ts) \
+                              .end_at(cutoff).limit_to_first(limit).get() or {}
+            items = [(k, v) for k, v in page.items() if k not in seen and isinstance(v, dict)]
+            if not items:
+                return
+            yield items
+            ts = items[-1][1].get('timestamp', last_ts)
+            if ts != last_ts:
+                last_ts, seen = ts, set()
+            seen.update(k for k, v in items if v.get('timestamp') == last_ts)
+            if len(page) < limit:
+                return
+
+    def _write_archive(self, ref_history, index, chunk, now):
+        """將一批 (已依時間排序的) 過期資料落地成封存檔，確定寫入後才從 Firebase 刪除"""
+        chunk['file'].close()
+        start_ts, end_ts = chunk['start'], chunk['end']
+        archive_id = f"{_compact(start_ts)}-{_compact(end_ts)}"
+        suffix = 1
+        while archive_id in index:      # 同一時間點的資料分成多個檔案
+            suffix += 1
+            archive_id = f"{_compact(start_ts)}-{_compact(end_ts)}-{suffix}"
+        filename = f"{self.project_name}_{archive_id}.csv.gz"
+        path = os.path.join(self.archive_dir, filename)
+        os.replace(chunk['tmp_path'], path)
+
+        entry = {'start': start_ts, 'end': end_ts, 'count': len(chunk['keys']),
+                 'file': filename, 'created': now.strftime("%Y-%m-%d %H:%M:%S")}
+        index[archive_id] = entry
+        self._save_index(index)
+        self.transport.reference(f'{self.project_name}/archive/index/{archive_id}').set(entry)
+        keys = chunk['keys']
+        for i in range(0, len(keys), self.page_size):
+            ref_history.update({k: None for k in keys[i:i + self.page_size]})
+        logger.info(f"🗄️ 已封存 {len(keys)} 筆 ({start_ts} ~ {end_ts}) -> {path}")
+        return len(keys)
+
+    def _open_chunk(self):
+        if not os.path.exists(self.archive_dir): os.makedirs(self.archive_dir)
+        tmp_path = os.path.join(self.archive_dir, "archive.csv.gz.tmp")
+        f = gzip.open(tmp_path, 'wt', newline='', encoding='utf-8-sig')
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+        return {'file': f, 'writer': writer, 'tmp_path': tmp_path, 'keys': [], 'start': None, 'end': None}
+
+    def archive_once(self, now=None):
+        """
+        執行一次封存，回傳封存的筆數
+        逐頁串流寫入壓縮檔，每 max_file_records 筆落地成一個封存檔並刪除對應的 history，記憶體只保留該檔的 key
+        """
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+        ref_history = self.transport.reference(f'{self.project_name}/history')
+        index = self.load_index()
+        rehydrated_prefixes = tuple(import_key_prefix(archive_id) for archive_id in index)
+
+        total = 0
+        chunk = None
+        try:
+            for page in self._iter_expired(ref_history, cutoff):
+                # 先前載回的資料，封存檔裡已經有了，直接刪除
+                drop_keys = [k for k, _ in page if k.startswith(rehydrated_prefixes)]
+                if drop_keys:
+                    ref_history.update({k: None for k in drop_keys})
+                for key, record in page:
+                    if key.startswith(rehydrated_prefixes):
+                        continue
+                    if chunk is None:
+                        chunk = self._open_chunk()
+                        chunk['start'] = record['timestamp']
+                    chunk['writer'].writerow(record)
+                    chunk['keys'].append(key)
+                    chunk['end'] = record['timestamp']
+                    if len(chunk['keys']) >= self.max_file_records:
+                        total += self._write_archive(ref_history, index, chunk, now)
+                        chunk = None
+            if chunk:
+                total += self._write_archive(ref_history, index, chunk, now)
+                chunk = None
+        finally:
+            if chunk:       # 中途失敗：丟棄未完成的暫存檔，Firebase 資料保持不變
+                chunk['file'].close()
+                os.remove(chunk['tmp_path'])
+
+        self.transport.reference(f'{self.project_name}/archive').update({
+            'cutoff': cutoff,
+            'last_run': now.strftime("%Y-%m-%d %H:%M:%S"),
+            'total': sum(e['count'] for e in index.values())
+        })
+        return total
+
+    # --- 載回 ---
+    def rehydrate(self, start, end):
+        """將時間區間 [start, end] 內的封存資料載回 history，回傳筆數"""
+        ref_history = self.transport.reference(f'{self.project_name}/history')
+        total = 0
+        for archive_id, entry in sorted(self.load_index().items()):
+            if entry['end'] < start or entry['start'] > end:
+                continue
+            path = os.path.join(self.archive_dir, entry['file'])
+            batch = {}
+            loaded = total
+            for row_index, record in read_records(path, start, end):
+                # 固定 key：重複載回不會產生重複資料，下次封存時也能辨識
+                batch[make_import_key(archive_id, row_index)] = record
+                if len(batch) >= self.page_size:
+                    ref_history.update(batch)
+                    total += len(batch)
+                    batch = {}
+            if batch:
+                ref_history.update(batch)
+                total += len(batch)
+            if total > loaded:
+                register_import(self.transport, self.project_name, archive_id, archive=True)
+        logger.info(f"📦 已從封存載回 {total} 筆 ({start} ~ {end})")
+        return total
+
+    # --- 背景排程 ---
+    def _loop(self, interval_sec):
+        while self.running:
+            try:
+                self.archive_once()
+            except Exception as e:
+                logger.error(f"❌ 封存失敗: {e}")
+            if self.stop_event.wait(interval_sec):
+                break
+
+    def start(self, interval_sec=6 * 3600):
+        if self.running:
+            return
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, args=(interval_sec,), daemon=True)
+        self.thread.start()
+        logger.info(f"🗄️ 歷史封存已啟動 (保留 {self.max_age_days} 天)")
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
@@ -0,0 +1,197 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from Procedure.FirebaseTransport import AdminTransport
+from Procedure.HistoryTransfer import iter_history_pages
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['timestamp', 'lat', 'lon', 'alt', 'conc', 'conc_unit', 'status']
+PUSH_END = '-\uf8ff'     # push id 都以 '-' 開頭，排在匯入 / 補傳 key (import_、recovery_…) 之前
+
+class HistoryCache:
+    """
+    {project}/history 的本地增量快取 (SQLite, WAL)，供匯出、分析、復原比對等工具共用：
+    - 以 key 為主鍵儲存，sync() 只下載上次同步之後的新 key，重複分析大型專案幾乎不耗流量
+    - push id 與其他 key (匯入、補傳、載回的封存) 各記錄一個同步位置；
+      匯入工具完成後在 {project}/history_imports 登記前綴，同步時讀取一次，
+      登記時間有變的前綴整段重讀，排序在同步位置之前的新匯入也能取得
+    - 遠端已封存刪除的紀錄仍保留在本地快取；載回的封存 (import_<封存>_NNN) 若原紀錄已在快取中則不再寫入
+    - query() / timestamps_between() 以 (project, timestamp) 索引查詢時間範圍
+    """
+    def __init__(self, project_name, path="history_cache.sqlite3", transport=None, page_size=500):
+        self.project_name = project_name
+        self.path = path
+        self.transport = transport or AdminTransport()
+        self.page_size = page_size
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        if self.conn is not None:
+            return
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                project TEXT NOT NULL,
+                key TEXT NOT NULL,
+                timestamp TEXT,
+                lat REAL, lon REAL, alt REAL,
+                conc REAL, conc_unit TEXT, status TEXT,
+                PRIMARY KEY (project, key)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_time ON history(project, timestamp)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                project TEXT PRIMARY KEY,
+                push_key TEXT,
+                other_key TEXT,
+                synced_at REAL
+            )""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_imports (
+                project TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                updated REAL,
+                PRIMARY KEY (project, prefix)
+            )""")
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def state(self):
+        """上次同步的位置：{'push_key', 'other_key', 'synced_at'}"""
+        self.open()
+        row = self.conn.execute("SELECT push_key, other_key, synced_at FROM sync_state WHERE project = ?",
+                                (self.project_name,)).fetchone()
+        if row is None:
+            return {'push_key': None, 'other_key': None, 'synced_at': None}
+        return dict(row)
+
+    def _has_original(self, record):
+        """快取中是否已有同一筆紀錄的原始 key (非 import_ 開頭)"""
+        row = self.conn.execute(
+            "SELECT 1 FROM history WHERE project = ? AND timestamp = ? AND lat IS ? AND lon IS ? AND conc IS ? "
+            "AND key NOT LIKE 'import\\_%' ESCAPE '\\' LIMIT 1",
+            (self.project_name, record.get('timestamp'), record.get('lat'), record.get('lon'),
+             record.get('conc'))).fetchone()
+        return row is not None
+
+    def _store_page(self, page, archive_prefixes=()):
+        rows = []
+        for key, record in page:
+            if not isinstance(record, dict):
+                continue
+            # 載回的封存：原紀錄仍在快取中就略過，避免同一筆出現兩次
+            if archive_prefixes and key.startswith(archive_prefixes) and self._has_original(record):
+                continue
+            rows.append((self.project_name, key) + tuple(record.get(c) for c in COLUMNS))
+        if not rows:
+            return 0
+        keys = [row[1] for row in rows]
+        existing = self.conn.execute(
+            f"SELECT COUNT(*) FROM history WHERE project = ? AND key IN ({','.join('?' * len(keys))})",
+            [self.project_name] + keys).fetchone()[0]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO history (project, key, timestamp, lat, lon, alt, conc, conc_unit, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows) - existing
+
+    def _save_state(self, push_key, other_key):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state (project, push_key, other_key, synced_at) "
+                              "VALUES (?, ?, ?, ?)", (self.project_name, push_key, other_key, time.time()))
+
+    def _synced_imports(self):
+        rows = self.conn.execute("SELECT prefix, updated FROM sync_imports WHERE project = ?", (self.project_name,))
+        return {row['prefix']: row['updated'] for row in rows}
+
+    def _save_import(self, prefix, updated):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_imports (project, prefix, updated) VALUES (?, ?, ?)",
+                              (self.project_name, prefix, updated))
+
+    def sync(self, full=False):
+        """
+        下載上次同步之後新增的紀錄，回傳本次新增到快取的筆數
+        每頁寫入後即更新同步位置，中斷後下次從該處繼續
+        """
+        with self.lock:
+            self.open()
+            state = {'push_key': None, 'other_key': None} if full else self.state()
+            synced = {} if full else self._synced_imports()
+            ref_history = self.transport.reference(f'{self.project_name}/history')
+            imports = self.transport.reference(f'{self.project_name}/history_imports').get() or {}
+            imports = [entry for entry in imports.values() if isinstance(entry, dict) and entry.get('prefix')]
+            archive_prefixes = tuple(entry['prefix'] for entry in imports if entry.get('archive'))
+            push_key, other_key = state['push_key'], state['other_key']
+            count = 0
+
+            # push id：(上次位置, PUSH_END]
+            for page in iter_history_pages(ref_history, self.page_size, push_key, end_at=PUSH_END):
+                count += self._store_page(page, archive_prefixes)
+                push_key = page[-1][0]
+                self._save_state(push_key, other_key)
+
+            # 其他 key (匯入、補傳、載回的封存)：排在所有 push id 之後
+            for page in iter_history_pages(ref_history, self.page_size, max(other_key or PUSH_END, PUSH_END)):
+                count += self._store_page(page, archive_prefixes)
+                other_key = page[-1][0]
+                self._save_state(push_key, other_key)
+
+            # 登記時間有變的匯入前綴整段重讀 (排序在 other_key 之前的新匯入、續傳補上的列)
+            for entry in imports:
+                prefix, updated = entry['prefix'], entry.get('updated')
+                if prefix in synced and synced[prefix] == updated:
+                    continue
+                for page in iter_history_pages(ref_history, self.page_size, prefix, end_at=prefix + '\uf8ff'):
+                    count += self._store_page(page, archive_prefixes)
+                self._save_import(prefix, updated)
+
+            self._save_state(push_key, other_key)
+        if count:
+            logger.info(f"🗃️ 歷史快取 {self.project_name}: 新增 {count} 筆 (共 {self.count()} 筆)")
+        return count
+
+    def _read(self, sql, params):
+        with self.lock:
+            self.open()
+            return self.conn.execute(sql, params).fetchall()
+
+    def count(self):
+        return self._read("SELECT COUNT(*) FROM history WHERE project = ?", (self.project_name,))[0][0]
+
+    def query(self, start=None, end=None, limit=None):
+        """[start, end] 時間範圍內的紀錄 (依時間排序)，回傳 [(key, record)]"""
+        sql = "SELECT * FROM history WHERE project = ?"
+        params = [self.project_name]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND timestamp <= ?"
+            params.append(end)
+        sql += " ORDER BY timestamp, key"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [(row['key'], {c: row[c] for c in COLUMNS if row[c] is not None}) for row in self._read(sql, params)]
+
+    def timestamps_between(self, start, end):
+        """[start, end] 內已存在的時間點"""
+        rows = self._read("SELECT DISTINCT timestamp FROM history WHERE project = ? AND timestamp BETWEEN ? AND ?",
+                          (self.project_name, start, end))
+        return {row[0] for row in rows}
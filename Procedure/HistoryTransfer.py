@@ -0,0 +1,257 @@
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from Procedure.BackupManager import FIELDNAMES, row_to_record
+from Procedure.FirebaseTransport import AdminTransport
+from Procedure.RecentWindow import clear_recent
+
+logger = logging.getLogger(__name__)
+
+def iter_history_pages(ref, page_size=500, start_after=None, end_at=None):
+    """
+    以 order_by_key().start_at().limit_to_first() 分頁讀取節點：
+    - 每次只取 page_size 筆，逐頁產生 [(key, record), ...]
+    - start_after 為上次讀到的最後一個 key (不含)
+    - end_at 為最後一個要讀取的 key (含)，未指定則讀到結尾
+    """
+    last_key = start_after
+    while True:
+        query = ref.order_by_key()
+        limit = page_size
+        if last_key is not None:
+            query = query.start_at(last_key)
+            limit += 1     # start_at 包含自己，多取一筆再濾掉
+        if end_at is not None:
+            query = query.end_at(end_at)
+        page = query.limit_to_first(limit).get() or {}
+        items = [(k, v) for k, v in page.items() if k != last_key]
+        if not items:
+            return
+        yield items
+        last_key = items[-1][0]
+        if len(page) < limit:
+            return
+
+def import_key_prefix(source_name):
+    slug = re.sub(r'[.$#\[\]/\s]+', '_', source_name).strip('_') or 'import'
+    return f"import_{slug}_"
+
+def make_import_key(source_name, row_index):
+    """依檔名與列號產生固定 key，重傳同一列會覆寫而不會重複"""
+    return f"{import_key_prefix(source_name)}{row_index:09d}"
+
+def register_import(transport, project_name, source_name, archive=False):
+    """
+    在 {project}/history_imports 登記匯入前綴與完成時間，HistoryCache 同步時讀取一次，
+    前綴排序在已同步位置之前的匯入 (或補寫的舊列) 也能取得；archive=True 表示載回的封存
+    """
+    prefix = import_key_prefix(source_name)
+    entry = {'prefix': prefix, 'updated': time.time(), 'archive': bool(archive)}
+    transport.reference(f'{project_name}/history_imports/{prefix.rstrip("_")}').set(entry)
+
+class TransferProgress:
+    """定期輸出進度與吞吐量，避免每筆都寫 log"""
+    def __init__(self, label, interval=2.0, initial=0):
+        self.label = label
+        self.interval = interval
+        self.count = initial
+        self.session_count = 0
+        self.start_time = time.time()
+        self.last_report = self.start_time
+
+    def add(self, n):
+        self.count += n
+        self.session_count += n
+        now = time.time()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self._report(now)
+
+    def rate(self, now=None):
+        elapsed = max((now or time.time()) - self.start_time, 1e-6)
+        return self.session_count / elapsed
+
+    def _report(self, now):
+        logger.info(f"⏳ {self.label}: 累計 {self.count} 筆 | {self.rate(now):.1f} 筆/秒")
+
+    def finish(self):
+        elapsed = time.time() - self.start_time
+        logger.info(f"✅ {self.label}完成: 共 {self.count} 筆 (本次 {self.session_count} 筆, "
+                    f"{elapsed:.1f} 秒, {self.rate():.1f} 筆/秒)")
+
+class _StateFile:
+    """續傳用的進度檔 (JSON)，寫入時先寫暫存檔再取代，避免中斷時損毀"""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class HistoryExporter:
+    """
+    將 {project}/history 分頁讀出並直接串流寫入 CSV，可中斷續傳
+    指定 cache (HistoryCache) 時只增量同步新紀錄，再從本地快取依時間順序匯出
+    """
+    def __init__(self, project_name, output_path, page_size=500, cache=None, transport=None):
+        self.project_name = project_name
+        self.transport = transport or AdminTransport()
+        self.output_path = output_path
+        self.page_size = page_size
+        self.cache = cache
+        self.state = _StateFile(f"{output_path}.state.json")
+
+    def _run_from_cache(self):
+        self.cache.sync()
+        progress = TransferProgress("匯出")
+        logger.info(f"📤 從本地快取匯出 {self.project_name}/history -> {self.output_path}")
+        with open(self.output_path, mode='w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+            writer.writeheader()
+            for _, record in self.cache.query():
+                writer.writerow(record)
+                progress.add(1)
+        progress.finish()
+        return progress.count
+
+    def run(self, resume=True):
+        if self.cache is not None:
+            return self._run_from_cache()
+        ref_history = self.transport.reference(f'{self.project_name}/history')
+        state = self.state.load() if resume else None
+        if state and not os.path.exists(self.output_path):
+            state = None
+
+        if state:
+            # 截掉上次檢查點之後寫了一半的資料
+            with open(self.output_path, 'r+b') as f:
+                f.truncate(state['offset'])
+            f = open(self.output_path, mode='a', newline='', encoding='utf-8')
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+            logger.info(f"🔁 從第 {state['count']} 筆續傳匯出: {self.output_path}")
+        else:
+            f = open(self.output_path, mode='w', newline='', encoding='utf-8-sig')
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+            writer.writeheader()
+            state = {'last_key': None, 'count': 0}
+            logger.info(f"📤 開始匯出 {self.project_name}/history -> {self.output_path}")
+
+        progress = TransferProgress("匯出", initial=state['count'])
+        try:
+            for page in iter_history_pages(ref_history, self.page_size, state['last_key']):
+                for _, record in page:
+                    if isinstance(record, dict):
+                        writer.writerow(record)
+                f.flush()
+                state = {'last_key': page[-1][0], 'count': state['count'] + len(page), 'offset': f.tell()}
+                self.state.save(state)
+                progress.add(len(page))
+        finally:
+            f.close()
+
+        self.state.clear()
+        progress.finish()
+        return progress.count
+
+class HistoryImporter:
+    """
+    將 CSV 以固定大小的批次平行上傳至 {project}/history：
+    - 每列依檔名與列號產生固定 key，重傳不會重複
+    - 只記錄「連續完成」的列數，中斷後從該處續傳
+    """
+    def __init__(self, project_name, input_path, batch_size=500, workers=4, transport=None):
+        self.project_name = project_name
+        self.transport = transport or AdminTransport()
+        self.input_path = input_path
+        self.source_name = os.path.splitext(os.path.basename(input_path))[0]
+        self.batch_size = batch_size
+        self.workers = workers
+        self.state = _StateFile(f"{input_path}.state.json")
+
+    def _read_batches(self, skip_rows):
+        """逐批讀取 CSV，產生 (起始列, 結束列, {key: record})"""
+        batch = {}
+        batch_start = next_row = skip_rows
+        with open(self.input_path, 'r', newline='', encoding='utf-8-sig') as f:
+            for row_index, row in enumerate(csv.DictReader(f)):
+                if row_index < skip_rows:
+                    continue
+                record = row_to_record(row)
+                if record is not None:
+                    batch[make_import_key(self.source_name, row_index)] = record
+                next_row = row_index + 1
+                if next_row - batch_start >= self.batch_size:
+                    yield batch_start, next_row, batch
+                    batch = {}
+                    batch_start = next_row
+        if next_row > batch_start:
+            yield batch_start, next_row, batch
+
+    def run(self, resume=True):
+        ref_history = self.transport.reference(f'{self.project_name}/history')
+        state = (self.state.load() if resume else None) or {'done_rows': 0, 'count': 0}
+        if state['done_rows']:
+            logger.info(f"🔁 從第 {state['done_rows']} 列續傳匯入: {self.input_path}")
+        else:
+            logger.info(f"📥 開始匯入 {self.input_path} -> {self.project_name}/history")
+
+        progress = TransferProgress("匯入", initial=state['count'])
+        lock = threading.Lock()
+        finished = {}       # 起始列 -> (結束列, 筆數)
+        last_record = None
+
+        def on_done(start, end, n):
+            with lock:
+                finished[start] = (end, n)
+                # 推進連續完成的水位線
+                while state['done_rows'] in finished:
+                    end_row, count = finished.pop(state['done_rows'])
+                    state['count'] += count
+                    state['done_rows'] = end_row
+                self.state.save(state)
+                progress.add(n)
+
+        max_in_flight = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            for start, end, batch in self._read_batches(state['done_rows']):
+                if batch:
+                    last_record = list(batch.values())[-1]
+                future = pool.submit(ref_history.update, batch) if batch else pool.submit(lambda: None)
+                future.add_done_callback(
+                    lambda fut, s=start, e=end, n=len(batch): fut.exception() is None and on_done(s, e, n))
+                pending.add(future)
+                # 限制同時在途的批次數，避免整份檔案被讀進記憶體
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        fut.result()
+            for fut in pending:
+                fut.result()
+
+        if last_record:
+            self.transport.reference(f'{self.project_name}/latest').set(last_record)
+            clear_recent(self.transport.reference(f'{self.project_name}/recent'))
+        register_import(self.transport, self.project_name, self.source_name)
+        self.state.clear()
+        progress.finish()
+        return progress.count
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import urllib.request
+
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STATIC_FILES = {
+    '/': ('index.html', 'text/html; charset=utf-8'),
+    '/index.html': ('index.html', 'text/html; charset=utf-8'),
+    '/app.js': ('app.js', 'application/javascript; charset=utf-8'),
+    '/style.css': ('style.css', 'text/css; charset=utf-8'),
+    '/man-walking.png': ('man-walking.png', 'image/png'),
+}
+
+# 網頁使用的第三方函式庫 (固定版本)：由 /vendor/ 提供，第一次請求時從 CDN 下載並快取於 vendor_dir，之後離線也能載入
+VENDOR_ASSETS = {
+    'leaflet.css': 'https://unpkg.com/leaflet@1.9.4/dist/leaflet.css',
+    'leaflet.js': 'https://unpkg.com/leaflet@1.9.4/dist/leaflet.js',
+    'hammer.min.js': 'https://cdn.jsdelivr.net/npm/hammerjs@2.0.8/hammer.min.js',
+    'chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+    'chartjs-plugin-zoom.min.js': 'https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js',
+}
+VENDOR_TYPES = {'.js': 'application/javascript; charset=utf-8', '.css': 'text/css; charset=utf-8'}
+
+class _Client:
+    """單一連線的有界緩衝：滿了就丟掉最舊的一筆，慢的客戶端不會拖累其他人"""
+    def __init__(self, buffer_size):
+        self.buffer = deque(maxlen=buffer_size)
+        self.event = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, message):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(message)
+        self.event.set()
+
+class LiveFeedServer:
+    """
+    區網即時資料伺服器 (asyncio, Server-Sent Events)：
+    - 提供 index.html / app.js 等靜態檔，以及 /vendor/ 下的第三方函式庫 (讀取時快取，離線可用)
+    - GET /events 以 SSE 推送 RunProcess 合併後的每筆資料，新連線會先收到最近的紀錄
+      (重連時依 Last-Event-ID 只補送遺漏的部分)
+    - GET /track 回傳 track_provider() 提供的既有軌跡 (本地備份)，網頁不經 Firebase 也能畫出完整路線
+    - GET /stats 回傳連線數、推送與丟棄筆數
+    """
+    def __init__(self, host="0.0.0.0", port=8080, static_dir=None, buffer_size=256, keepalive_sec=15,
+                 vendor_dir=None, vendor_assets=None, track_provider=None):
+        self.host = host
+        self.port = port
+        self.static_dir = Path(static_dir or Path(__file__).parent.parent).resolve()
+        self.vendor_dir = Path(vendor_dir or self.static_dir / "vendor")
+        self.vendor_assets = VENDOR_ASSETS if vendor_assets is None else vendor_assets
+        self.track_provider = track_provider
+        self.buffer_size = buffer_size
+        self.keepalive_sec = keepalive_sec
+        self.recent = deque(maxlen=buffer_size)
+        self.clients = set()
+        self.published = 0
+        self.dropped_closed = 0     # 已離線客戶端累積的丟棄數
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.running = False
+        self._started = threading.Event()
+
+    # --- 對外介面 (可從任意執行緒呼叫) ---
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._started.clear()
+        self.thread = threading.Thread(target=self._serve_forever, daemon=True)
+        self.thread.start()
+        self._started.wait(timeout=5)
+        logger.info(f"🛰️ 區網即時伺服器已啟動: http://{self.host}:{self.port}/")
+
+    def stop(self):
+        if not self.running or self.loop is None:
+            return
+        self.running = False
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"關閉區網即時伺服器時發生錯誤 (可忽略): {e}")
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+        logger.info("🛰️ 區網即時伺服器已關閉")
+
+    def publish(self, record):
+        """序列化後交給事件迴圈分送；呼叫端不會被任何客戶端阻塞"""
+        if not self.running or self.loop is None:
+            return
+        payload = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        self.loop.call_soon_threadsafe(self._fanout, payload)
+
+    def vendor_asset(self, name):
+        """回傳第三方函式庫內容：先找本地快取，沒有則從 CDN 下載後存檔；離線且未快取時回傳 None"""
+        if name not in self.vendor_assets:
+            return None
+        path = self.vendor_dir / name
+        try:
+            return path.read_bytes()
+        except OSError:
+            pass
+        try:
+            with urllib.request.urlopen(self.vendor_assets[name], timeout=10) as resp:
+                body = resp.read()
+            self.vendor_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{name}.tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+            logger.info(f"🛰️ 已快取網頁函式庫: {name}")
+            return body
+        except Exception as e:
+            logger.warning(f"⚠️ 無法取得網頁函式庫 {name} (離線且尚未快取): {e}")
+            return None
+
+    def stats(self):
+        clients = list(self.clients)
+        return {
+            'clients': len(clients),
+            'published': self.published,
+            'dropped': self.dropped_closed + sum(c.dropped for c in clients)
+        }
+
+    # --- 事件迴圈內部 ---
+    def _serve_forever(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=1024))
+            self.port = self.server.sockets[0].getsockname()[1]
+            self._started.set()
+            self.loop.run_forever()
+        except Exception as e:
+            logger.error(f"❌ 區網即時伺服器錯誤: {e}")
+            self.running = False
+            self._started.set()
+        finally:
+            self.loop.close()
+
+    async def _shutdown(self):
+        self.server.close()
+        for client in list(self.clients):
+            client.event.set()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.call_soon(self.loop.stop)
+
+    def _fanout(self, payload):
+        self.published += 1
+        # 每筆附上遞增的事件 id，瀏覽器重連時會帶 Last-Event-ID，只補送遺漏的部分
+        message = b"id: %d\ndata: " % self.published + payload + b"\n\n"
+        self.recent.append((self.published, message))
+        for client in self.clients:
+            client.offer(message)
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self._respond(writer, 405, b'Method Not Allowed', 'text/plain')
+                return
+            path = parts[1].split('?', 1)[0]
+            if path == '/events':
+                last_id = headers.get('last-event-id', '')
+                await self._stream(writer, int(last_id) if last_id.isdigit() else 0)
+            elif path == '/stats':
+                await self._respond(writer, 200, json.dumps(self.stats()).encode(), 'application/json')
+            elif path == '/track':
+                # 讀檔可能較久，交給執行緒池，不阻塞其他連線
+                track = await asyncio.get_running_loop().run_in_executor(None, self._track)
+                await self._respond(writer, 200, json.dumps(track, ensure_ascii=False).encode('utf-8'),
+                                    'application/json; charset=utf-8')
+            elif path.startswith('/vendor/'):
+                name = path[len('/vendor/'):]
+                body = await asyncio.get_running_loop().run_in_executor(None, self.vendor_asset, name)
+                if body is None:
+                    await self._respond(writer, 404, b'Not Found', 'text/plain')
+                else:
+                    await self._respond(writer, 200, body, VENDOR_TYPES.get(os.path.splitext(name)[1], 'text/plain'))
+            elif path in STATIC_FILES:
+                filename, content_type = STATIC_FILES[path]
+                try:
+                    body = (self.static_dir / filename).read_bytes()
+                    await self._respond(writer, 200, body, content_type)
+                except OSError:
+                    await self._respond(writer, 404, b'Not Found', 'text/plain')
+            else:
+                await self._respond(writer, 404, b'Not Found', 'text/plain')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _track(self):
+        if not self.track_provider:
+            return []
+        try:
+            return list(self.track_provider())
+        except Exception as e:
+            logger.warning(f"⚠️ 讀取既有軌跡失敗: {e}")
+            return []
+
+    async def _respond(self, writer, code, body, content_type):
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[code]
+        writer.write(f"HTTP/1.1 {code} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer, last_id=0):
+        client = _Client(self.buffer_size)
+        if last_id > self.published:
+            last_id = 0     # 伺服器重啟過，編號已重新計算
+        for seq, message in self.recent:
+            if seq > last_id:
+                client.offer(message)
+        self.clients.add(client)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\n"
+                         b"Connection: keep-alive\r\n\r\n")
+            await writer.drain()
+            while self.running:
+                try:
+                    await asyncio.wait_for(client.event.wait(), timeout=self.keepalive_sec)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                client.event.clear()
+                while client.buffer:
+                    writer.write(client.buffer.popleft())
+                    client.sent += 1
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(client)
+            self.dropped_closed += client.dropped
@@ -0,0 +1,119 @@
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['timestamp', 'lat', 'lon', 'alt', 'conc', 'conc_unit', 'status']
+
+def _has_rtree(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._rtree_probe USING rtree(id, a, b)")
+        conn.execute("DROP TABLE temp._rtree_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+class LocalStore:
+    """
+    本地 SQLite 紀錄庫 (WAL)，供現場離線快速查詢：
+    - records 以 (project, timestamp) 建立時間索引
+    - records_rtree 為 R-Tree 空間索引 (SQLite 未編入 R-Tree 時改用 (lat, lon) 一般索引)
+    - 寫入由 SqliteSink 的執行緒負責；查詢各自開啟唯讀連線，不會互相阻塞
+    """
+    def __init__(self, path="local_store.sqlite3"):
+        self.path = path
+        self.conn = None
+        self.rtree = False
+
+    def open(self):
+        if self.conn is not None:
+            return
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY,
+                project TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                lat REAL, lon REAL, alt REAL,
+                conc REAL, conc_unit TEXT, status TEXT
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_time ON records(project, timestamp)")
+        self.rtree = _has_rtree(self.conn)
+        if self.rtree:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS records_rtree "
+                              "USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+        else:
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_pos ON records(lat, lon)")
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def insert_many(self, project, records):
+        """以單一交易寫入多筆紀錄"""
+        self.open()
+        with self.conn:
+            for r in records:
+                cur = self.conn.execute(
+                    "INSERT INTO records (project, timestamp, lat, lon, alt, conc, conc_unit, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (project,) + tuple(r.get(c) for c in COLUMNS))
+                if self.rtree and r.get('lat') is not None and r.get('lon') is not None:
+                    self.conn.execute("INSERT INTO records_rtree VALUES (?, ?, ?, ?, ?)",
+                                      (cur.lastrowid, r['lat'], r['lat'], r['lon'], r['lon']))
+        return len(records)
+
+    def _read(self, sql, params):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            conn.row_factory = sqlite3.Row
+            return [{k: row[k] for k in COLUMNS if row[k] is not None} for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def _uses_rtree(self):
+        """由其他執行個體 (未開啟寫入連線) 查詢時，依資料表是否存在判斷"""
+        if self.conn is not None:
+            return self.rtree
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'records_rtree'").fetchone() is not None
+        finally:
+            conn.close()
+
+    def query_time(self, project, start, end, limit=None):
+        """[start, end] 時間範圍內的紀錄 (依時間排序)"""
+        sql = ("SELECT * FROM records WHERE project = ? AND timestamp BETWEEN ? AND ? "
+               "ORDER BY timestamp, id")
+        params = [project, start, end]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self._read(sql, params)
+
+    def query_bbox(self, project, bbox, start=None, end=None):
+        """bbox = (min_lat, min_lon, max_lat, max_lon) 範圍內的紀錄，可再限制時間"""
+        min_lat, min_lon, max_lat, max_lon = bbox
+        sql = ("SELECT r.* FROM records r WHERE r.lat BETWEEN ? AND ? AND r.lon BETWEEN ? AND ? "
+               "AND r.project = ?")
+        params = [min_lat, max_lat, min_lon, max_lon, project]
+        if self._uses_rtree():
+            # R-Tree 以 32 位元浮點數儲存 (範圍向外取整)，先以索引篩選再用原始座標精確比對
+            sql = ("SELECT r.* FROM records_rtree t JOIN records r ON r.id = t.id "
+                   "WHERE t.max_lat >= ? AND t.min_lat <= ? AND t.max_lon >= ? AND t.min_lon <= ? "
+                   "AND r.lat BETWEEN ? AND ? AND r.lon BETWEEN ? AND ? AND r.project = ?")
+            params = [min_lat, max_lat, min_lon, max_lon] + params
+        if start is not None:
+            sql += " AND r.timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND r.timestamp <= ?"
+            params.append(end)
+        return self._read(sql + " ORDER BY r.timestamp, r.id", params)
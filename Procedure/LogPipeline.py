@@ -0,0 +1,97 @@
+import logging
+import logging.handlers
+import queue
+import time
+
+from collections import Counter
+
+LOG_FORMAT = '[%(asctime)s] %(message)s'
+LOG_DATEFMT = '%y/%m/%d %H:%M:%S'
+
+def setup_logging(log_filename="execution.log", max_bytes=5 * 1024 * 1024, backup_count=5,
+                  when=None, level=logging.INFO):
+    """
+    非同步、可輪替的 log 設定：
+    - 所有 logger 只把紀錄丟進 Queue (QueueHandler)，不會卡在磁碟或主控台 I/O
+    - 背景 QueueListener 負責寫入主控台與檔案
+    - when 有值 (如 'midnight') 時依時間輪替，否則依 max_bytes 大小輪替
+    回傳 QueueListener，程式結束前需呼叫 stop() 以寫完剩餘紀錄
+    """
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_filename, when=when, backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    handlers = [logging.StreamHandler(), file_handler]
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logging.basicConfig(
+        level=level,
+        handlers=[logging.handlers.QueueHandler(log_queue)],
+        force=True
+    )
+    listener.start()
+    return listener
+
+def stop_logging(listener):
+    """寫完 Queue 中剩餘的紀錄並關閉檔案 (os._exit 前務必呼叫)"""
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+class RecordSummary:
+    """
+    將逐筆紀錄彙總成每 interval 秒一行：筆數、速率、濃度範圍、最新座標與狀態分佈
+    (逐筆內容改以 DEBUG 輸出)
+    """
+    def __init__(self, logger, label="上傳", interval=10.0, clock=time.monotonic):
+        self.logger = logger
+        self.label = label
+        self.interval = interval
+        self.clock = clock
+        self.window_start = clock()
+        self.total = 0
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.states = Counter()
+        self.conc_min = None
+        self.conc_max = None
+        self.last_coord = None
+        self.unit = ''
+
+    def add(self, data, state_msg):
+        self.count += 1
+        self.total += 1
+        self.states[state_msg] += 1
+        conc = data.get('conc')
+        if isinstance(conc, (int, float)):
+            self.conc_min = conc if self.conc_min is None else min(self.conc_min, conc)
+            self.conc_max = conc if self.conc_max is None else max(self.conc_max, conc)
+        self.unit = data.get('conc_unit') or self.unit
+        if data.get('lat') is not None and data.get('lon') is not None:
+            self.last_coord = (data['lat'], data['lon'])
+        self.flush()
+
+    def flush(self, force=False):
+        now = self.clock()
+        elapsed = now - self.window_start
+        if not force and elapsed < self.interval:
+            return
+        if self.count:
+            coord = f"({self.last_coord[0]:.6f}, {self.last_coord[1]:.6f})" if self.last_coord else "(No GPS)"
+            conc = f"{self.conc_min}~{self.conc_max} {self.unit}" if self.conc_min is not None else "N/A"
+            states = ", ".join(f"{k} x{v}" for k, v in self.states.most_common())
+            self.logger.info(f"📈 近 {elapsed:.0f} 秒{self.label} {self.count} 筆 "
+                             f"({self.count / max(elapsed, 1e-6):.2f} 筆/秒, 累計 {self.total}) || "
+                             f"座標: {coord} || 濃度: {conc} || 狀態: {states}")
+        self.window_start = now
+        self._reset()
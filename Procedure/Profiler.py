@@ -0,0 +1,214 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_COMMAND = re.compile(r"^(profile|memprofile)(?::(\d+(?:\.\d+)?)([sm]?))?$")
+
+def parse_profile_command(command, default_seconds=30):
+    """
+    解析控制指令：profile / profile:30s / profile:2m / memprofile / memprofile:60s
+    回傳 ('cpu' | 'memory', 秒數)，不是分析指令則回傳 None
+    """
+    match = _COMMAND.match(str(command).strip().lower())
+    if not match:
+        return None
+    kind = 'cpu' if match.group(1) == 'profile' else 'memory'
+    if match.group(2) is None:
+        return kind, float(default_seconds)
+    seconds = float(match.group(2)) * (60 if match.group(3) == 'm' else 1)
+    return kind, seconds
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+class SamplingProfiler:
+    """
+    取樣式 CPU 分析：每 interval 秒以 sys._current_frames() 擷取所有執行緒的呼叫堆疊
+    - self：取樣時位於堆疊最上層的函式 (實際正在執行)
+    - total：出現在堆疊任一層的函式 (同一次取樣只算一次)
+    不使用 sys.setprofile，被分析的程式碼不會變慢；未執行時沒有任何開銷
+    """
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+
+    def run(self, seconds, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        own = threading.get_ident()
+        self_counts, total_counts, thread_counts = Counter(), Counter(), Counter()
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+        while time.monotonic() < deadline and not stop_event.is_set():
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread_counts[names.get(ident, str(ident))] += 1
+                self_counts[_frame_label(frame.f_code)] += 1
+                seen = set()
+                depth = 0
+                while frame is not None and depth < self.max_depth:
+                    label = _frame_label(frame.f_code)
+                    if label not in seen:
+                        total_counts[label] += 1
+                        seen.add(label)
+                    frame = frame.f_back
+                    depth += 1
+            frame = None     # 不保留堆疊參照
+            samples += 1
+            stop_event.wait(self.interval)
+        return {'kind': 'cpu', 'seconds': round(time.monotonic() - started, 2), 'samples': samples,
+                'self': self_counts, 'total': total_counts, 'threads': thread_counts}
+
+def memory_profile(seconds, stop_event=None, frames=10):
+    """
+    tracemalloc 快照：比較開始與結束時的配置，列出成長最多的程式碼位置
+    只在分析期間啟用 tracemalloc (若原本未啟用則結束時關閉)
+    """
+    stop_event = stop_event or threading.Event()
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(frames)
+    started = time.monotonic()
+    try:
+        before = tracemalloc.take_snapshot()
+        stop_event.wait(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+    growth = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    largest = after.filter_traces(ignore).statistics('lineno')
+    return {'kind': 'memory', 'seconds': round(time.monotonic() - started, 2),
+            'current_mb': current / 1024 / 1024, 'peak_mb': peak / 1024 / 1024,
+            'growth': growth, 'largest': largest}
+
+def _stat_label(stat):
+    frame = stat.traceback[0]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+
+def summarize(report, top=10):
+    """精簡的前 N 名摘要 (寫入 Firebase diagnostics)"""
+    if report['kind'] == 'cpu':
+        samples = max(1, report['samples'])
+        return {
+            'kind': 'cpu', 'seconds': report['seconds'], 'samples': report['samples'],
+            'top_self': [{'func': f, 'pct': round(c / samples * 100, 1)} for f, c in report['self'].most_common(top)],
+            'top_total': [{'func': f, 'pct': round(c / samples * 100, 1)} for f, c in report['total'].most_common(top)]
+        }
+    return {
+        'kind': 'memory', 'seconds': report['seconds'],
+        'current_mb': round(report['current_mb'], 2), 'peak_mb': round(report['peak_mb'], 2),
+        'top_growth': [{'line': _stat_label(s), 'kb': round(s.size_diff / 1024, 1), 'count': s.count_diff}
+                       for s in report['growth'][:top] if s.size_diff > 0],
+        'top_size': [{'line': _stat_label(s), 'kb': round(s.size / 1024, 1)} for s in report['largest'][:top]]
+    }
+
+def format_report(report, top=30):
+    """完整報告文字 (寫入本地檔案)"""
+    lines = []
+    if report['kind'] == 'cpu':
+        samples = max(1, report['samples'])
+        lines.append(f"CPU 取樣分析: {report['seconds']} 秒, {report['samples']} 次取樣")
+        for title, counts in (("self (正在執行)", report['self']), ("total (含呼叫中)", report['total'])):
+            lines.append("")
+            lines.append(f"== {title} ==")
+            for label, count in counts.most_common(top):
+                lines.append(f"{count / samples * 100:6.1f}%  {count:6d}  {label}")
+        lines.append("")
+        lines.append("== 執行緒 ==")
+        for name, count in report['threads'].most_common():
+            lines.append(f"{count:6d}  {name}")
+    else:
+        lines.append(f"記憶體分析 (tracemalloc): {report['seconds']} 秒, "
+                     f"目前 {report['current_mb']:.2f} MB, 峰值 {report['peak_mb']:.2f} MB")
+        lines.append("")
+        lines.append("== 期間成長 ==")
+        for stat in report['growth'][:top]:
+            lines.append(str(stat))
+        lines.append("")
+        lines.append("== 目前配置 ==")
+        for stat in report['largest'][:top]:
+            lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+class DiagnosticsRunner:
+    """
+    由控制指令觸發的遠端分析 (profile:30s / memprofile)：
+    - 背景執行緒執行，同時間只允許一個分析，最長 max_seconds 秒
+    - 完整報告寫入 output_dir (與 execution.log 同一資料夾)
+    - 前 N 名摘要寫入 {project}/diagnostics/{cpu|memory}
+    """
+    def __init__(self, transport, output_dir=".", max_seconds=300, top=10):
+        self.transport = transport
+        self.output_dir = output_dir
+        self.max_seconds = max_seconds
+        self.top = top
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, project_name, kind, seconds):
+        """啟動背景分析；已有分析進行中則回傳 False"""
+        with self.lock:
+            if self.active:
+                logger.warning("⚠️ 已有分析進行中，忽略本次指令")
+                return False
+            seconds = min(max(float(seconds), 1.0), self.max_seconds)
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, args=(project_name, kind, seconds),
+                                           name=f"diagnostics-{kind}", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def run(self, project_name, kind, seconds):
+        """執行一次分析並輸出報告，回傳摘要"""
+        logger.info(f"🩺 開始{'CPU' if kind == 'cpu' else '記憶體'}分析 ({seconds:.0f} 秒)...")
+        try:
+            if kind == 'cpu':
+                report = SamplingProfiler().run(seconds, self.stop_event)
+            else:
+                report = memory_profile(seconds, self.stop_event)
+        except Exception as e:
+            logger.error(f"❌ 分析失敗: {e}")
+            return None
+
+        stamp = datetime.now()
+        path = os.path.join(self.output_dir, f"profile_{kind}_{stamp.strftime('%Y%m%d_%H%M%S')}.txt")
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(format_report(report))
+        except OSError as e:
+            logger.error(f"❌ 分析報告寫入失敗: {e}")
+            path = None
+
+        summary = summarize(report, self.top)
+        summary['time'] = stamp.strftime("%Y-%m-%d %H:%M:%S")
+        summary['file'] = os.path.basename(path) if path else None
+        try:
+            self.transport.reference(f'{project_name}/diagnostics/{kind}').set(summary)
+        except Exception as e:
+            logger.warning(f"⚠️ 分析摘要寫入失敗: {e}")
+        logger.info(f"🩺 分析完成，報告已寫入 {path}")
+        return summary
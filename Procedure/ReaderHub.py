@@ -0,0 +1,111 @@
+import logging
+import queue
+import threading
+
+from Procedure.GPSReader import GPSReader
+from Procedure.ConcentrationReader import ConcentrationReader
+
+logger = logging.getLogger(__name__)
+
+class _FanoutQueue:
+    """讓單一讀取器的輸出複製到多個訂閱者的 Queue (每份各自一個 dict，互不影響)"""
+    def __init__(self):
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        with self.lock:
+            targets = list(self.subscribers)
+        for q in targets:
+            q.put(item.copy() if isinstance(item, dict) else item)
+
+class HubSubscription:
+    """
+    提供與 GPSReader / ConcentrationReader 相同的介面給 RunProcess：
+    gps_queue / conc_queue、unit、run()、stop()
+    """
+    def __init__(self, hub, key, unit=None):
+        self.hub = hub
+        self.key = key
+        self.unit = unit
+        self.queue = queue.Queue()
+        self.gps_queue = self.queue
+        self.conc_queue = self.queue
+        self.running = False
+
+    def run(self):
+        if not self.running:
+            self.running = True
+            self.hub._attach(self)
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.hub._detach(self)
+
+class ReaderHub:
+    """
+    多專案共用的讀取器：
+    - 相同 (ip, port) 的 GPS、相同單位的濃度計只會開一個讀取器
+    - 第一個訂閱者啟動讀取器，最後一個訂閱者離開時才停止
+    """
+    def __init__(self, gps_factory=GPSReader, conc_factory=ConcentrationReader):
+        self.gps_factory = gps_factory
+        self.conc_factory = conc_factory
+        self.entries = {}       # key -> {'reader', 'fanout'}
+        self.lock = threading.Lock()
+
+    def gps(self, ip, port):
+        return HubSubscription(self, ('gps', ip, int(port)))
+
+    def conc(self, unit):
+        return HubSubscription(self, ('conc', unit), unit=unit)
+
+    def _create_reader(self, key, fanout=None):
+        fanout = fanout or _FanoutQueue()
+        if key[0] == 'gps':
+            reader = self.gps_factory()
+            reader.ip, reader.port = key[1], key[2]
+            reader.gps_queue = fanout
+        else:
+            reader = self.conc_factory()
+            reader.unit = key[1]
+            reader.conc_queue = fanout
+        return {'reader': reader, 'fanout': fanout}
+
+    def _attach(self, sub):
+        with self.lock:
+            entry = self.entries.get(sub.key)
+            is_new = entry is None
+            if is_new:
+                entry = self._create_reader(sub.key)
+                self.entries[sub.key] = entry
+            elif not entry['reader'].running:
+                # GPS 讀取器逾時放棄後 running 會變 False，需重新建立；
+                # 沿用原本的 fanout，其他專案的訂閱者繼續收到新讀取器的資料
+                entry = self._create_reader(sub.key, entry['fanout'])
+                self.entries[sub.key] = entry
+                is_new = True
+            with entry['fanout'].lock:
+                entry['fanout'].subscribers.append(sub.queue)
+            if is_new:
+                entry['reader'].run()
+                logger.info(f"🔗 共用讀取器已啟動: {sub.key}")
+
+    def _detach(self, sub):
+        with self.lock:
+            entry = self.entries.get(sub.key)
+            if entry is None:
+                return
+            with entry['fanout'].lock:
+                if sub.queue in entry['fanout'].subscribers:
+                    entry['fanout'].subscribers.remove(sub.queue)
+                remaining = len(entry['fanout'].subscribers)
+            if remaining == 0:
+                self.entries.pop(sub.key)
+                entry['reader'].stop()
+                logger.info(f"🔌 共用讀取器已停止: {sub.key}")
+
+    def stats(self):
+        with self.lock:
+            return {str(k): len(e['fanout'].subscribers) for k, e in self.entries.items()}
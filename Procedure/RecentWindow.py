@@ -0,0 +1,55 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+def clear_recent(ref_recent):
+    """刪除 {project}/recent (功能停用或 history 被匯入、整批取代時)，網頁改回讀取 history，不會顯示過期的環狀區"""
+    try:
+        ref_recent.delete()
+    except Exception as e:
+        logger.warning(f"⚠️ 清除 recent 失敗: {e}")
+
+class RecentWindow:
+    """
+    {project}/recent：最近 size 筆紀錄的固定大小環狀區
+    - slots/000 ~ slots/{size-1} 以固定 key 原地覆寫，節點大小不隨工作時間增加
+    - meta 記錄下一個寫入位置 (head)、總寫入筆數與時間窗 (window_minutes，供網頁只顯示最近 T 分鐘)
+    - 與 latest 合併成一次 multi-path update，每筆資料不額外增加請求數
+    """
+    def __init__(self, size=300, window_minutes=None):
+        self.size = size
+        self.window_minutes = window_minutes
+        self.head = 0
+        self.count = 0
+
+    def slot_key(self, index):
+        return f"{index:03d}" if self.size <= 1000 else f"{index:06d}"
+
+    def load(self, ref_recent):
+        """沿用上次的寫入位置；大小改變時從頭開始覆寫"""
+        try:
+            meta = ref_recent.child('meta').get() or {}
+        except Exception as e:
+            logger.warning(f"⚠️ 讀取 recent/meta 失敗，從第 0 格開始: {e}")
+            return
+        if meta.get('size') == self.size:
+            self.head = int(meta.get('head', 0)) % self.size
+            self.count = int(meta.get('count', 0))
+        else:
+            if meta:
+                try:
+                    ref_recent.child('slots').delete()
+                except Exception as e:
+                    logger.warning(f"⚠️ 清除舊的 recent 失敗: {e}")
+            self.head, self.count = 0, 0
+
+    def meta(self):
+        return {'size': self.size, 'head': self.head, 'count': self.count,
+                'window_minutes': self.window_minutes}
+
+    def next_update(self, data, prefix='recent/'):
+        """回傳寫入這筆資料所需的 multi-path 內容 (路徑相對於專案節點)"""
+        key = self.slot_key(self.head)
+        self.head = (self.head + 1) % self.size
+        self.count += 1
+        return {f'{prefix}slots/{key}': data, f'{prefix}meta': self.meta()}
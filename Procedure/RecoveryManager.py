@@ -0,0 +1,165 @@
+import csv
+import logging
+import os
+import time
+
+from datetime import datetime, timedelta
+from Procedure.BackupManager import backup_files, row_to_record
+from Procedure.FirebaseTransport import AdminTransport
+from Procedure.HistoryTransfer import make_import_key, register_import
+
+logger = logging.getLogger(__name__)
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def repair_backup(path):
+    """
+    修復異常中斷留下的備份檔：最後一行沒有換行代表只寫了一半，截掉該行
+    回傳是否有修改
+    """
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if not data or data.endswith(b'\n'):
+            return False
+        cut = data.rfind(b'\n') + 1
+        f.truncate(cut)
+    logger.warning(f"🩹 已截除備份檔末端不完整的一行: {path}")
+    return True
+
+def _parse_ts(ts):
+    try:
+        return datetime.strptime(ts, TS_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+class RecoveryManager:
+    """
+    啟動時比對本地備份與 Firebase history，補傳異常中斷時遺漏的紀錄：
+    - 只掃描最近 lookback_hours 內修改過的備份檔，並修復截斷的最後一行
+    - 依備份檔的時間範圍，以 timestamp 索引分段查詢 history (不下載整個節點)
+    - 只補傳缺少的時間點；key 由檔名與列號產生，重複執行不會重複寫入
+    - 上傳壓縮 (DeadbandFilter) 啟用時，以相同參數重播備份，只補本來就該上傳的紀錄
+    - 早於 retention_days 的資料屬於封存範圍，不補傳
+    - 指定 cache (HistoryCache) 時先增量同步一次，之後的比對都查本地快取
+    註: 需在資料庫規則中為 history 設定 ".indexOn": "timestamp"
+    """
+    def __init__(self, project_name, backup_dir="backups", transport=None, lookback_hours=48,
+                 batch_size=500, window_minutes=60, retention_days=None, filter_factory=None, cache=None):
+        self.project_name = project_name
+        self.backup_dir = backup_dir
+        self.transport = transport or AdminTransport()
+        self.lookback_hours = lookback_hours
+        self.batch_size = batch_size
+        self.window_minutes = window_minutes
+        self.retention_days = retention_days
+        self.filter_factory = filter_factory
+        self.cache = cache
+        self.cache_ready = False
+
+    def recent_files(self, now=None):
+        now = now or time.time()
+        return [p for p in backup_files(self.project_name, self.backup_dir)
+                if now - os.path.getmtime(p) <= self.lookback_hours * 3600]
+
+    def _read_expected(self, path, cutoff):
+        """讀出備份檔中應存在於 history 的紀錄: [(row_index, record)]"""
+        replay, clock = None, [0.0]
+        if self.filter_factory:
+            replay = self.filter_factory(lambda: clock[0])
+        records = []
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            for row_index, row in enumerate(csv.DictReader(f)):
+                record = row_to_record(row)
+                if record is None:
+                    continue
+                ts = _parse_ts(record['timestamp'])
+                if ts is None:
+                    continue
+                if replay is not None:
+                    clock[0] = ts.timestamp()
+                    if not replay.offer(record):
+                        continue
+                if cutoff and record['timestamp'] < cutoff:
+                    continue
+                records.append((row_index, record))
+        return records
+
+    def _existing_timestamps(self, ref_history, start, end):
+        """以 timestamp 索引分段查詢 [start, end] 內已存在的時間點"""
+        if self.cache_ready:
+            return self.cache.timestamps_between(start, end)
+        found = set()
+        window = timedelta(minutes=self.window_minutes)
+        cursor = _parse_ts(start)
+        last = _parse_ts(end)
+        while cursor <= last:
+            seg_end = min(cursor + window, last)
+            page = ref_history.order_by_child('timestamp') \
+                              .start_at(cursor.strftime(TS_FORMAT)) \
+                              .end_at(seg_end.strftime(TS_FORMAT)).get() or {}
+            found.update(v.get('timestamp') for v in page.values() if isinstance(v, dict))
+            cursor = seg_end + timedelta(seconds=1)
+        return found
+
+    def recover_file(self, path, ref_history, cutoff=None):
+        """補傳單一備份檔，回傳該檔的統計"""
+        repaired = repair_backup(path)
+        expected = self._read_expected(path, cutoff)
+        result = {'file': os.path.basename(path), 'repaired': repaired, 'checked': len(expected),
+                  'missing': 0, 'uploaded': 0}
+        if not expected:
+            return result
+
+        timestamps = [r['timestamp'] for _, r in expected]
+        existing = self._existing_timestamps(ref_history, min(timestamps), max(timestamps))
+        source_name = f"recovery_{os.path.splitext(os.path.basename(path))[0]}"
+        missing = {make_import_key(source_name, row_index): record
+                   for row_index, record in expected if record['timestamp'] not in existing}
+        result['missing'] = len(missing)
+
+        items = list(missing.items())
+        for i in range(0, len(items), self.batch_size):
+            ref_history.update(dict(items[i:i + self.batch_size]))
+            result['uploaded'] += len(items[i:i + self.batch_size])
+        if missing:
+            register_import(self.transport, self.project_name, source_name)
+            logger.info(f"♻️ {result['file']}: 補傳 {result['uploaded']} / {result['checked']} 筆")
+        return result
+
+    def run(self, now=None, files=None):
+        """執行一次復原，回傳彙總報告 (同時寫入 {project}/recovery/last_run)"""
+        now = now or datetime.now()
+        cutoff = None
+        if self.retention_days:
+            cutoff = (now - timedelta(days=float(self.retention_days))).strftime(TS_FORMAT)
+        ref_history = self.transport.reference(f'{self.project_name}/history')
+
+        if files is None:
+            files = self.recent_files(now.timestamp())
+        report = {'time': now.strftime(TS_FORMAT), 'files': len(files), 'repaired': 0,
+                  'checked': 0, 'missing': 0, 'uploaded': 0, 'errors': 0}
+        self.cache_ready = False
+        if self.cache is not None and files:
+            try:
+                self.cache.sync()
+                self.cache_ready = True
+            except Exception as e:
+                logger.warning(f"⚠️ 歷史快取同步失敗，改為直接查詢 history: {e}")
+        for path in files:
+            try:
+                result = self.recover_file(path, ref_history, cutoff)
+            except Exception as e:
+                report['errors'] += 1
+                logger.error(f"❌ 復原 {path} 失敗: {e}")
+                continue
+            report['repaired'] += int(result['repaired'])
+            for key in ('checked', 'missing', 'uploaded'):
+                report[key] += result[key]
+
+        logger.info(f"♻️ 啟動復原完成: 檢查 {report['files']} 個備份檔 / {report['checked']} 筆，"
+                    f"補傳 {report['uploaded']} 筆，修復 {report['repaired']} 個檔案")
+        try:
+            self.transport.reference(f'{self.project_name}/recovery/last_run').set(report)
+        except Exception as e:
+            logger.warning(f"⚠️ 復原報告寫入失敗: {e}")
+        return report
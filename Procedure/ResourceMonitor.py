@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+
+def _rss_mb():
+    """目前常駐記憶體 (MB)；Linux 讀 /proc，其他平台退回峰值"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return None
+
+def _open_fds():
+    for fd_dir in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+def resource_snapshot():
+    """回傳目前行程的執行緒數、檔案描述符數與記憶體用量"""
+    return {
+        'threads': threading.active_count(),
+        'fds': _open_fds(),
+        'rss_mb': _rss_mb()
+    }
+
+def resource_delta(before, after):
+    """兩次快照的差值 (無法取得的項目為 None)"""
+    return {k: (None if before.get(k) is None or after.get(k) is None else after[k] - before[k])
+            for k in after}
+
+def format_delta(snapshot):
+    """將快照差值格式化為一行文字"""
+    parts = [f"執行緒 {snapshot['threads']:+.0f}" if snapshot.get('threads') is not None else None,
+             f"FD {snapshot['fds']:+.0f}" if snapshot.get('fds') is not None else None,
+             f"記憶體 {snapshot['rss_mb']:+.1f} MB" if snapshot.get('rss_mb') is not None else None]
+    return ", ".join(p for p in parts if p)
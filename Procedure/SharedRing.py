@@ -0,0 +1,231 @@
+import logging
+import logging.handlers
+import math
+import multiprocessing
+import queue
+import struct
+import time
+
+from multiprocessing import shared_memory
+
+logger = logging.getLogger(__name__)
+
+# 固定長度紀錄：種類、時間字串、lat、lon、alt、conc、status、unit
+_RECORD = struct.Struct('<B19sdddd16s16s')
+# 標頭：已寫入筆數 (head)、已讀取筆數 (tail)、因滿載丟棄筆數
+_HEADER = struct.Struct('<QQQ')
+
+KIND_END, KIND_GPS, KIND_CONC = 0, 1, 2
+
+def _num(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _text(raw):
+    return raw.rstrip(b'\0').decode('utf-8', 'ignore') or None
+
+def _opt(value):
+    return None if math.isnan(value) else value
+
+class SharedRing:
+    """
+    單一生產者 / 單一消費者的共享記憶體環狀緩衝：
+    - 生產者 (讀取器子行程) 與消費者 (RunProcess) 以固定格式讀寫，不需 pickle
+    - 提供與 queue.Queue 相同的 put / get / get_nowait / empty，可直接替換 gps_queue / conc_queue
+    - put(None) 寫入結束標記 (必要時等待空位)；一般資料在緩衝已滿時丟棄並計數，不會阻塞讀取器
+    註: head 只由生產者寫、tail 只由消費者寫，兩者皆為 8 byte 對齊的欄位
+    """
+    def __init__(self, name=None, capacity=1024, create=True):
+        self.capacity = capacity
+        size = _HEADER.size + capacity * _RECORD.size
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.capacity = (self.shm.size - _HEADER.size) // _RECORD.size
+        self.name = self.shm.name
+        self.owner = create
+
+    def _counters(self):
+        if self.shm.buf is None:
+            return 0, 0, 0      # 已關閉：視為空的緩衝
+        return _HEADER.unpack_from(self.shm.buf, 0)
+
+    # --- 生產者端 ---
+    def put(self, item):
+        if self.shm.buf is None:
+            return
+        head, tail, dropped = self._counters()
+        if item is None:
+            # 結束標記不可遺失：短暫等待消費者騰出空間
+            deadline = time.monotonic() + 5
+            while head - tail >= self.capacity and time.monotonic() < deadline:
+                time.sleep(0.001)
+                head, tail, dropped = self._counters()
+        if head - tail >= self.capacity:
+            struct.pack_into('<Q', self.shm.buf, 16, dropped + 1)
+            return
+        offset = _HEADER.size + (head % self.capacity) * _RECORD.size
+        if item is None:
+            _RECORD.pack_into(self.shm.buf, offset, KIND_END, b'', 0, 0, 0, 0, b'', b'')
+        elif 'lat' in item:
+            _RECORD.pack_into(self.shm.buf, offset, KIND_GPS,
+                              str(item.get('timestamp', '')).encode(),
+                              _num(item.get('lat')), _num(item.get('lon')), _num(item.get('alt')),
+                              math.nan, str(item.get('status') or '').encode()[:16], b'')
+        else:
+            _RECORD.pack_into(self.shm.buf, offset, KIND_CONC,
+                              str(item.get('timestamp', '')).encode(),
+                              math.nan, math.nan, math.nan, _num(item.get('conc')),
+                              b'', str(item.get('conc_unit') or '').encode()[:16])
+        # 資料寫完後才推進 head，消費者不會讀到寫一半的紀錄
+        struct.pack_into('<Q', self.shm.buf, 0, head + 1)
+
+    # --- 消費者端 ---
+    def empty(self):
+        head, tail, _ = self._counters()
+        return head == tail
+
+    def qsize(self):
+        head, tail, _ = self._counters()
+        return head - tail
+
+    def dropped(self):
+        return self._counters()[2]
+
+    def get_nowait(self):
+        head, tail, _ = self._counters()
+        if head == tail:
+            raise queue.Empty
+        offset = _HEADER.size + (tail % self.capacity) * _RECORD.size
+        kind, ts, lat, lon, alt, conc, status, unit = _RECORD.unpack_from(self.shm.buf, offset)
+        struct.pack_into('<Q', self.shm.buf, 8, tail + 1)
+        if kind == KIND_END:
+            return None
+        if kind == KIND_GPS:
+            # 無高度資訊時維持 GPSReader 的 '?' 表示法
+            return {"timestamp": _text(ts) or "", "lat": _opt(lat), "lon": _opt(lon),
+                    "alt": '?' if math.isnan(alt) else alt, "status": _text(status)}
+        return {"timestamp": _text(ts) or "", "conc": _opt(conc), "conc_unit": _text(unit)}
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.0005
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
+
+    def close(self):
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception as e:
+            logger.debug(f"釋放共享記憶體時發生錯誤: {e}")
+
+class _ForwardHandler(logging.Handler):
+    """把子行程送回來的 log 交給主行程同名 logger"""
+    def handle(self, record):
+        logging.getLogger(record.name).handle(record)
+        return True
+
+def _reader_worker(kind, settings, ring_name, stop_event, log_queue):
+    """子行程進入點：在獨立行程中執行 GPSReader / ConcentrationReader，輸出寫入共享環狀緩衝"""
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter('%(message)s'))     # 格式交給主行程的 handler
+    logging.basicConfig(level=logging.INFO, handlers=[handler], force=True)
+    ring = SharedRing(ring_name, create=False)
+    if kind == 'gps':
+        from Procedure.GPSReader import GPSReader
+        reader = GPSReader()
+        reader.ip, reader.port = settings['ip'], settings['port']
+        reader.gps_queue = ring
+    else:
+        from Procedure.ConcentrationReader import ConcentrationReader
+        reader = ConcentrationReader()
+        reader.unit = settings['unit']
+        reader.conc_queue = ring
+    reader.run()
+    try:
+        while reader.running and not stop_event.wait(0.2):
+            pass
+    finally:
+        reader.stop()
+        if reader.thread:
+            reader.thread.join(timeout=6)
+        ring.shm.close()
+
+class ProcessReader:
+    """
+    在子行程執行讀取器，對 RunProcess 提供與 GPSReader / ConcentrationReader 相同的介面：
+    gps_queue / conc_queue (SharedRing)、unit、running、run()、stop()
+    共享記憶體與 log 佇列在 run() 時才建立，stop() 一律釋放 (即使從未啟動)；
+    未讀出的資料在釋放前移到 gps_queue / conc_queue (queue.Queue)
+    """
+    def __init__(self, kind, capacity=1024, **settings):
+        self.kind = kind
+        self.capacity = capacity
+        self.settings = settings
+        self.unit = settings.get('unit')
+        self.ring = None
+        self.gps_queue = None
+        self.conc_queue = None
+        self.running = False
+        self.process = None
+        self.stop_event = None
+        self.log_queue = None
+        self.log_listener = None
+
+    def run(self):
+        # 監督者重新啟動時沿用既有的環狀緩衝，尚未讀出的資料不會遺失
+        if self.ring is None:
+            self.ring = SharedRing(capacity=self.capacity)
+            self.gps_queue = self.ring
+            self.conc_queue = self.ring
+        if self.log_listener is None:
+            self.log_queue = multiprocessing.Queue()
+            self.log_listener = logging.handlers.QueueListener(self.log_queue, _ForwardHandler())
+            self.log_listener.start()
+        self.stop_event = multiprocessing.Event()
+        self.running = True
+        self.process = multiprocessing.Process(
+            target=_reader_worker,
+            args=(self.kind, self.settings, self.ring.name, self.stop_event, self.log_queue),
+            daemon=True
+        )
+        self.process.start()
+        logger.info(f"🧩 {self.kind} 讀取器已於子行程啟動 (pid={self.process.pid})")
+
+    def stop(self):
+        self.running = False
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if self.process:
+            self.process.join(timeout=8)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=1)
+            self.process = None
+        if self.log_listener is not None:
+            self.log_listener.stop()
+            self.log_queue.close()
+            self.log_listener = None
+            self.log_queue = None
+        if self.ring is not None:
+            # 尚未讀出的資料移到一般佇列，共享記憶體釋放後合併執行緒仍可處理完
+            rest = queue.Queue()
+            while not self.ring.empty():
+                rest.put(self.ring.get_nowait())
+            if self.ring.dropped():
+                logger.warning(f"⚠️ {self.kind} 環狀緩衝已滿，共丟棄 {self.ring.dropped()} 筆")
+            self.ring.close()
+            self.ring = None
+            self.gps_queue = self.conc_queue = rest
@@ -0,0 +1,244 @@
+import abc
+import logging
+import queue
+import threading
+import time
+
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class Sink(abc.ABC):
+    """
+    合併後資料的輸出目的地 (RunProcess 逐筆分送給每個 sink)：
+    - offer() 只放進該 sink 自己的有界佇列，不會阻塞；佇列滿時丟棄並計數，慢的 sink 不會拖累合併或其他 sink
+    - run() 由 Supervisor 的執行緒執行，一次取出最多 batch_size 筆交給 write_batch()
+    - running 在建立時即為 True，只有 stop() 會清除：stop() 早於 run() 或 run() 重新啟動時都不會被還原
+    - 寫入失敗時以 retry_delay 退避重試同一批，超過 max_retries 次則丟棄該批並計數
+    - counters 由分送端 (offer) 與寫入執行緒同時更新，一律經 _count() 在 counter_lock 內遞增
+    - stats(caller) 回傳收到 / 寫入 / 丟棄筆數、每秒寫入量與佇列延遲 (最舊一筆等待的秒數)；
+      每秒寫入量以各 caller 自己上次呼叫的時間點計算，定期統計與停止報告互不影響
+    子類別實作 write_batch(records)，必要時覆寫 close()
+    """
+    name = 'sink'
+
+    def __init__(self, maxsize=10000, batch_size=50, retry_delay=1.0, max_retries=3, clock=time.monotonic):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.clock = clock
+        self.running = True
+        self.deadline = None
+        self.wake = threading.Event()
+        self.counters = {'received': 0, 'written': 0, 'dropped': 0, 'errors': 0, 'batches': 0}
+        self.counter_lock = threading.Lock()
+        self._start_mark = (clock(), 0)
+        self._rate_marks = {}
+
+    def _count(self, name, n=1):
+        with self.counter_lock:
+            self.counters[name] += n
+
+    def offer(self, record):
+        self._count('received')
+        try:
+            self.queue.put_nowait((self.clock(), record))
+        except queue.Full:
+            self._count('dropped')
+
+    @abc.abstractmethod
+    def write_batch(self, records):
+        pass
+
+    def close(self):
+        pass
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def lag(self):
+        """佇列中最舊一筆已等待的秒數"""
+        with self.queue.mutex:
+            oldest = self.queue.queue[0][0] if self.queue.queue else None
+        return 0.0 if oldest is None else self.clock() - oldest
+
+    def stats(self, caller='default'):
+        with self.counter_lock:
+            counters = dict(self.counters)
+            now = self.clock()
+            mark_time, mark_written = self._rate_marks.get(caller, self._start_mark)
+            self._rate_marks[caller] = (now, counters['written'])
+        rate = (counters['written'] - mark_written) / (now - mark_time) if now > mark_time else 0.0
+        return dict(counters, pending=self.pending(), lag_sec=round(self.lag(), 2), rate=round(rate, 2))
+
+    def _next_batch(self, timeout):
+        try:
+            batch = [self.queue.get(timeout=timeout)[1]]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait()[1])
+            except queue.Empty:
+                break
+        return batch
+
+    def _expired(self):
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def _write(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.write_batch(batch)
+                with self.counter_lock:
+                    self.counters['written'] += len(batch)
+                    self.counters['batches'] += 1
+                return True
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"⚠️ {self.name} 寫入失敗 (第 {attempt + 1} 次): {e}")
+                if (not self.running and self._expired()) or attempt == self.max_retries:
+                    break
+                self.wake.wait(self.retry_delay * (2 ** attempt))
+        self._count('dropped', len(batch))
+        logger.error(f"❌ {self.name} 放棄 {len(batch)} 筆")
+        return False
+
+    def run(self):
+        """寫入迴圈；stop() 後繼續寫完佇列 (最多到 deadline) 再結束"""
+        while True:
+            batch = self._next_batch(timeout=0.2)
+            if batch:
+                self._write(batch)
+            elif not self.running:
+                break
+            if not self.running and self._expired():
+                break
+
+    def stop(self, deadline=None):
+        self.deadline = deadline
+        self.running = False
+        self.wake.set()
+
+    def finish(self, deadline=None):
+        """執行緒結束後呼叫：在期限內同步寫完剩餘資料 (未啟動過的 sink 也適用)，再關閉；回傳未寫入筆數"""
+        while self.pending() and (deadline is None or self.clock() < deadline):
+            batch = self._next_batch(timeout=0)
+            if batch:
+                self._write(batch)
+        left = self.pending()
+        self._count('dropped', left)
+        try:
+            self.close()
+        except Exception as e:
+            logger.error(f"❌ 關閉 {self.name} 失敗: {e}")
+        return left
+
+class FirebaseSink(Sink):
+    """
+    Firebase 輸出：佇列即 FirebaseManager.data_queue (有上限，滿時丟棄並計數，不阻塞合併)，
+    寫入迴圈為 FirebaseManager.run，一次取出最多 batch_size 筆以 multi-path update 寫入 (各自由 Supervisor 管理)
+    上傳前死區壓縮 (DeadbandFilter) 掛在這個 sink，本地 sink 仍收到每一筆
+    """
+    name = 'firebase'
+
+    def __init__(self, fb, upload_filter=None, clock=time.monotonic):
+        super().__init__(clock=clock)
+        self.fb = fb
+        self.upload_filter = upload_filter
+        self.queue = fb.data_queue
+
+    def offer(self, record):
+        self._count('received')
+        records = self.upload_filter.offer(record) if self.upload_filter else [record]
+        for r in records:
+            self._put(r)
+        if not records:
+            self.fb.touch()
+
+    def _put(self, record):
+        try:
+            self.fb.data_queue.put_nowait(record)
+        except queue.Full:
+            self._count('dropped')
+
+    def flush_filter(self):
+        """資料流結束：送出過濾器暫存的最後一筆"""
+        if self.upload_filter:
+            for record in self.upload_filter.flush():
+                self._put(record)
+
+    def write_batch(self, records):
+        self.fb.write_batch([(self.fb.push_ids(), record) for record in records])
+
+    def pending(self):
+        with self.queue.mutex:
+            return sum(1 for item in self.queue.queue if item is not None)
+
+    def lag(self):
+        """佇列中最舊一筆資料的時間戳距今秒數 (上傳落後多少)"""
+        with self.queue.mutex:
+            oldest = next((item for item in self.queue.queue if item), None)
+        if oldest is None:
+            return 0.0
+        try:
+            return max(0.0, (datetime.now() - datetime.strptime(oldest['timestamp'], "%Y-%m-%d %H:%M:%S")).total_seconds())
+        except (KeyError, TypeError, ValueError):
+            return 0.0
+
+    def stats(self, caller='default'):
+        with self.counter_lock:
+            self.counters['written'] = self.fb.uploaded
+        st = super().stats(caller)
+        if self.upload_filter:
+            st['suppressed'] = self.upload_filter.stats['suppressed']
+        return st
+
+    def run(self):
+        self.fb.run()
+
+    def stop(self, deadline=None):
+        self.fb.stop(deadline=deadline)
+
+    def finish(self, deadline=None):
+        left = self.pending()
+        self._count('dropped', left)
+        return left
+
+class CsvSink(Sink):
+    """本地 CSV 備份 (BackupManager)；收到第一筆資料時才建立檔案，每批整批寫入 (失敗時不留下部分資料)"""
+    name = 'csv'
+
+    def __init__(self, backup, **options):
+        super().__init__(**options)
+        self.backup = backup
+        self.started = False
+
+    def write_batch(self, records):
+        if not self.started:
+            self.backup.start()
+            if not self.backup.file:
+                raise IOError("無法建立備份檔案")
+            self.started = True
+        self.backup.write_many(records)
+
+    def close(self):
+        if self.started:
+            self.backup.stop()
+            self.started = False
+
+class SqliteSink(Sink):
+    """本地 SQLite 紀錄庫 (LocalStore)，每批一個交易 (失敗時整批回復，重試不會重複)"""
+    name = 'sqlite'
+
+    def __init__(self, store, project_name, **options):
+        super().__init__(**options)
+        self.store = store
+        self.project_name = project_name
+
+    def write_batch(self, records):
+        self.store.insert_many(self.project_name, records)
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,147 @@
+import pytest
+
+from unittest.mock import MagicMock, patch
+from Procedure.AlertEngine import AlertEngine, _bucket
+
+def _record(i, conc, status="A"):
+    return {"timestamp": f"2026-01-06 12:00:{i:02d}", "lat": 25.0 + i * 1e-4, "lon": 121.5,
+            "conc": conc, "conc_unit": "ppm", "status": status}
+
+class TestAlertEngine:
+
+    @pytest.fixture
+    def fake(self, fake_firebase):
+        return fake_firebase
+
+    @pytest.fixture
+    def engine(self, fake):
+        return AlertEngine("site", fake, flush_interval=0)
+
+    def _feed(self, engine, values):
+        for i, conc in enumerate(values):
+            engine.evaluate(_record(i, conc))
+
+    def test_episodes_and_counters(self, engine, fake):
+        """40 → 120 → 60 → 30：a 一個事件、b 一個事件，峰值位置記在事件中"""
+        self._feed(engine, [40, 55, 120, 130, 60, 30, 70])
+        engine.flush(force=True)
+        alerts = fake.reference('site/alerts').get()
+
+        assert alerts['levels']['a']['records_above'] == 5
+        assert alerts['levels']['a']['episodes'] == 2
+        assert alerts['levels']['b']['records_above'] == 2
+        assert alerts['levels']['c']['records_above'] == 0
+
+        first_a = alerts['episodes']['a_000001']
+        assert first_a['open'] is False
+        assert (first_a['start'][-2:], first_a['end'][-2:], first_a['records']) == ("01", "04", 4)
+        assert first_a['peak'] == 130 and first_a['lat'] == pytest.approx(25.0003)
+        assert alerts['episodes']['a_000003']['open'] is True
+        assert alerts['state']['open'] == {'a': 'a_000003'}
+
+    def test_lost_sensor_is_ignored(self, engine):
+        engine.evaluate(_record(0, 0, status="Sensor Timeout"))
+        engine.evaluate(_record(1, None))
+        assert engine.histogram == {}
+
+    def test_threshold_change_recomputes_only_that_level(self, engine, fake):
+        """修改 b：只重算 b 的超標筆數、事件數與最後超標時間 (由各桶統計計算)，進行中的事件以新閾值結束"""
+        self._feed(engine, [40, 55, 120, 130, 101])
+        engine.flush(force=True)
+
+        assert engine.set_thresholds({'a': '50', 'b': 85, 'c': 150}) == ['b']
+        assert set(engine.pending) == {'alerts/levels/b', 'alerts/episodes/b_000002', 'alerts/state'}
+        engine.flush(force=True)
+        alerts = fake.reference('site/alerts').get()
+        assert alerts['levels']['b'] == {'threshold': 85.0, 'records_above': 3, 'episodes': 1,
+                                         'last_alert': "2026-01-06 12:00:04"}
+        assert alerts['levels']['a']['records_above'] == 4
+        assert alerts['episodes']['b_000002']['closed_by'] == 'threshold_changed'
+
+        engine.evaluate(_record(10, 86))
+        assert engine.levels['b']['episodes'] == 2
+
+    def test_threshold_change_counts_runs_above_new_threshold(self, engine):
+        """閾值降低：依濃度升到新閾值上方的次數重算事件數，與一開始就用新閾值計算的結果相同"""
+        values = [10, 45, 20, 48, 60, 30, 47, 10]
+        self._feed(engine, values)
+        engine.set_thresholds({'a': 44})
+
+        fresh = AlertEngine("other", MagicMock(), flush_interval=0)
+        fresh.set_thresholds({'a': 44})
+        self._feed(fresh, values)
+        for key in ('records_above', 'episodes', 'last_alert'):
+            assert engine.levels['a'][key] == fresh.levels['a'][key]
+        assert engine.levels['a']['episodes'] == 3
+
+    def test_resume_after_restart(self, engine, fake):
+        """重新啟動後延續計數與事件序號"""
+        self._feed(engine, [60, 70])
+        engine.flush(force=True)
+
+        restarted = AlertEngine("site", fake, flush_interval=0)
+        restarted.load()
+        restarted.evaluate(_record(5, 80))
+        restarted.evaluate(_record(6, 10))
+        restarted.evaluate(_record(7, 90))
+        restarted.close()
+
+        alerts = fake.reference('site/alerts').get()
+        assert alerts['levels']['a']['records_above'] == 4
+        assert alerts['episodes']['a_000001']['records'] == 3
+        assert alerts['episodes']['a_000002']['closed_by'] == 'stopped'
+        assert alerts['state']['seq'] == 2 and not alerts['state'].get('open')
+
+    def test_flush_is_batched_and_retried(self, fake):
+        clock = MagicMock(return_value=0.0)
+        engine = AlertEngine("site", fake, flush_interval=5.0, clock=clock)
+        self._feed(engine, [60, 61, 62])
+        assert engine.flush() == 0          # 未到間隔
+
+        clock.return_value = 5.0
+        broken = MagicMock()
+        broken.reference.return_value.update.side_effect = RuntimeError("offline")
+        engine.transport = broken
+        assert engine.flush() == 0
+        engine.transport = fake
+        assert engine.flush(force=True) > 0
+        assert fake.stats['update'] == 1
+        assert fake.reference('site/alerts/levels/a/records_above').get() == 3
+
+    def test_histogram_is_stored_apart_from_alerts(self, engine, fake):
+        """濃度分佈存於獨立節點，載入時不下載歷史事件"""
+        self._feed(engine, [60, 70, 10, 80])
+        engine.flush(force=True)
+        assert 'histogram' not in fake.reference('site/alerts').get()
+        assert fake.reference('site/alert_histogram').get() == {'b6000': 1, 'b7000': 1, 'b1000': 1, 'b8000': 1}
+
+        read = []
+        original = type(fake.reference('/')).get
+        def spy(ref, *args, **kwargs):
+            read.append(ref.path)
+            return original(ref, *args, **kwargs)
+        with patch.object(type(fake.reference('/')), 'get', spy):
+            restarted = AlertEngine("site", fake, flush_interval=0)
+            restarted.load()
+        assert sorted(read) == ['/site/alert_buckets', '/site/alert_histogram', '/site/alerts/episodes/a_000002',
+                                '/site/alerts/levels', '/site/alerts/state']
+        assert restarted.histogram == engine.histogram
+        assert restarted.open_episodes['a'][0] == 'a_000002'
+
+    def test_legacy_histogram_is_moved(self, fake):
+        fake.reference('site/alerts').set({'histogram': {'b6000': 2}, 'levels': {'a': {'threshold': 50.0,
+                                           'records_above': 2, 'episodes': 1, 'last_alert': None}}})
+        engine = AlertEngine("site", fake, flush_interval=0)
+        engine.load()
+        engine.flush(force=True)
+        assert fake.reference('site/alert_histogram').get() == {'b6000': 2}
+        assert fake.reference('site/alerts/histogram').get() is None
+        assert engine.set_thresholds({'a': 55}) == ['a'] and engine.levels['a']['records_above'] == 2
+        assert engine.levels['a']['episodes'] == 1      # 舊資料沒有各桶統計：保留原本的事件數
+
+    def test_buckets_round_down(self, engine):
+        """分桶向下取整：略低於閾值的濃度不算超標"""
+        assert (_bucket(49.999), _bucket(50.0), _bucket(0.29), _bucket(120.456)) == ("b4999", "b5000", "b29", "b12045")
+        self._feed(engine, [49.996, 49.999])
+        engine.set_thresholds({'a': 50})
+        assert engine.levels['a']['records_above'] == 0
@@ -0,0 +1,222 @@
+import gzip
+import json
+import pytest
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from Procedure.FirebaseTransport import PushIdGenerator, RestTransport, TransportError
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """本地假 Realtime Database REST：以 dict 存資料，支援 keep-alive 與 gzip 請求"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _parts(self):
+        path = self.path.split('?', 1)[0]
+        return [p for p in path[:-len('.json')].split('/') if p]
+
+    def _body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            if self.server.reject_gzip:
+                return None
+            self.server.gzip_bodies += 1
+            data = gzip.decompress(data)
+        return json.loads(data) if data else None
+
+    def _reply(self, code, value):
+        body = json.dumps(value).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.drop_next:
+            # 模擬閒置逾時：回應後靜默關閉連線 (未送 Connection: close)
+            self.server.drop_next = False
+            self.close_connection = True
+
+    def _node(self, parts, create=False):
+        node = self.server.tree
+        for p in parts:
+            if p not in node:
+                if not create:
+                    return None
+                node[p] = {}
+            node = node[p]
+        return node
+
+    def do_GET(self):
+        if self._parts()[:1] == ['forbidden']:
+            return self._reply(401, {"error": "Permission denied"})
+        self._reply(200, self._node(self._parts()))
+
+    def _write(self, merge):
+        if self._parts()[:1] == ['invalid']:
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            return self._reply(400, {"error": "Invalid data; couldn't parse JSON object."})
+        value = self._body()
+        if value is None and self.headers.get('Content-Encoding') == 'gzip':
+            return self._reply(415, {"error": "gzip not supported"})
+        parts = self._parts()
+        parent = self._node(parts[:-1], create=True)
+        if merge:
+            parent.setdefault(parts[-1], {}).update(value)
+        else:
+            parent[parts[-1]] = value
+        self._reply(200, None)
+
+    def do_PUT(self):
+        self._write(merge=False)
+
+    def do_PATCH(self):
+        self._write(merge=True)
+
+    def do_POST(self):
+        value = self._body()
+        node = self._node(self._parts(), create=True)
+        key = f"-push{len(node):06d}"
+        node[key] = value
+        if self.server.drop_after_write:
+            # 模擬已寫入、回應前連線中斷
+            self.server.drop_after_write = False
+            self.close_connection = True
+            return
+        self._reply(200, {"name": key})
+
+    def do_DELETE(self):
+        parts = self._parts()
+        self._node(parts[:-1], create=True).pop(parts[-1], None)
+        self._reply(200, None)
+
+class TestFirebaseTransport:
+
+    @pytest.fixture
+    def server(self):
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        srv.tree, srv.connections, srv.gzip_bodies = {}, 0, 0
+        srv.reject_gzip = srv.drop_next = srv.drop_after_write = False
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        yield srv
+        srv.shutdown()
+        srv.server_close()
+
+    @pytest.fixture
+    def transport(self, server):
+        obj = RestTransport(f"http://127.0.0.1:{server.server_address[1]}", pool_size=2, gzip_min_bytes=256)
+        yield obj
+        obj.close()
+
+    def test_keep_alive_reuses_connection(self, server, transport):
+        """連續 50 次寫入只建立一條連線"""
+        ref_latest = transport.reference('test_project/latest')
+        for i in range(50):
+            ref_latest.set({"lat": 25.0, "lon": 121.5, "conc": float(i)})
+        assert server.tree['test_project']['latest']['conc'] == 49.0
+
+        stats = transport.stats()
+        assert stats['connections_opened'] == 1 == server.connections
+        assert stats['reused'] == 49
+        assert stats['reuse_ratio'] == 0.98
+
+    def test_crud_matches_db_reference(self, server, transport):
+        """set / update / push / get / delete 與 db.reference 的用法一致"""
+        ref = transport.reference('p/status')
+        ref.set({'state': 'stopped', 'message': 'ready'})
+        ref.update({'state': 'active'})
+        assert ref.get() == {'state': 'active', 'message': 'ready'}
+
+        new_ref = transport.reference('p/history').push({"conc": 1.0})
+        assert transport.reference(f'p/history/{new_ref.key}').get() == {"conc": 1.0}
+
+        ref.delete()
+        assert transport.reference('p/status').get() is None
+
+    def test_large_body_is_gzipped(self, server, transport):
+        """大批次寫入以 gzip 送出，小請求維持原樣"""
+        batch = {f"k{i:04d}": {"timestamp": "2026-01-06 12:00:00", "conc": 1.0} for i in range(100)}
+        transport.reference('p/history').update(batch)
+        transport.reference('p/latest').set({"conc": 1.0})
+        assert server.gzip_bodies == 1
+        assert len(server.tree['p']['history']) == 100
+        assert transport.stats()['compression_ratio'] < 0.5
+
+    def test_gzip_fallback_when_rejected(self, server, transport):
+        """伺服器不接受 gzip 時自動改為不壓縮並重送"""
+        server.reject_gzip = True
+        batch = {f"k{i:04d}": {"conc": float(i)} for i in range(100)}
+        transport.reference('p/history').update(batch)
+        assert len(server.tree['p']['history']) == 100
+        assert transport.compress is False
+
+    def test_unrelated_400_keeps_gzip(self, server, transport):
+        """與編碼無關的 400：不壓縮重送一次後照常拋出錯誤，之後仍維持 gzip"""
+        batch = {f"k{i:04d}": {"conc": float(i)} for i in range(100)}
+        with pytest.raises(TransportError) as err:
+            transport.reference('invalid/history').update(batch)
+        assert err.value.status == 400
+        assert transport.compress is True
+        transport.reference('p/history').update(batch)
+        assert server.gzip_bodies == 1
+
+    def test_token_refresh_is_serialized(self, transport):
+        """多個執行緒同時請求時只更新一次 token"""
+        class _Credential:
+            calls = 0
+
+            def get_access_token(self):
+                _Credential.calls += 1
+                time.sleep(0.05)
+                return SimpleNamespace(access_token="token", expiry=None)
+
+        transport.credential = _Credential()
+        threads = [threading.Thread(target=transport._auth_header) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert _Credential.calls == 1
+        assert transport._auth_header() == {'Authorization': 'Bearer token'}
+
+    def test_stale_connection_is_retried(self, server, transport):
+        """池中連線被伺服器關閉後，自動以新連線重試"""
+        ref = transport.reference('p/latest')
+        server.drop_next = True
+        ref.set({"conc": 1.0})
+        ref.set({"conc": 2.0})
+        assert server.tree['p']['latest'] == {"conc": 2.0}
+        assert transport.stats()['retries'] == 1
+
+    def test_push_is_not_resent_after_disconnect(self, server, transport):
+        """POST 送出後才斷線：伺服器可能已寫入，不重送以免 history 重複"""
+        transport.reference('p/latest').get()
+        server.drop_after_write = True
+        with pytest.raises(Exception):
+            transport.reference('p/history').push({"conc": 1.0})
+        assert len(server.tree['p']['history']) == 1
+        assert transport.stats()['retries'] == 0
+
+    def test_http_error_raises(self, server, transport):
+        """伺服器回傳錯誤碼時拋出 TransportError，連線仍可繼續使用"""
+        with pytest.raises(TransportError) as err:
+            transport.reference('forbidden/history').get()
+        assert err.value.status == 401
+        transport.reference('p/latest').set({"conc": 1.0})
+        assert transport.stats()['connections_opened'] == 1
+
+    def test_push_ids_sort_in_creation_order(self):
+        """用戶端產生的 push id：20 字元、以 '-' 開頭，同一毫秒內也依產生順序排序"""
+        clock = iter([1767700000.0] * 50 + [1767700000.001] * 50)
+        make_id = PushIdGenerator(clock=lambda: next(clock))
+        keys = [make_id() for _ in range(100)]
+        assert len(set(keys)) == 100
+        assert keys == sorted(keys)
+        assert all(len(k) == 20 and k.startswith('-') for k in keys)
@@ -0,0 +1,86 @@
+import pytest
+
+from datetime import datetime
+from Procedure.HistoryArchiver import HistoryArchiver, read_records
+
+class TestHistoryArchiver:
+
+    @pytest.fixture
+    def fake_db(self, fake_firebase):
+        """10 天前 12 筆 + 今天 3 筆"""
+        fake = fake_firebase
+        ref = fake.reference('test_project/history')
+        for i in range(12):
+            ref.push({"timestamp": f"2026-01-01 08:00:{i:02d}", "lat": 25.0, "lon": 121.5,
+                      "conc": float(i), "conc_unit": "ppm", "status": "A"})
+        for i in range(3):
+            ref.push({"timestamp": f"2026-01-11 08:00:{i:02d}", "lat": 25.0, "lon": 121.5,
+                      "conc": 99.0, "conc_unit": "ppm", "status": "A"})
+        return fake
+
+    @pytest.fixture
+    def archiver(self, fake_db, tmp_path):
+        return HistoryArchiver("test_project", archive_dir=str(tmp_path), max_age_days=7, page_size=5,
+                               transport=fake_db)
+
+    def test_archive_moves_old_records(self, fake_db, archiver):
+        """過期資料移至壓縮檔，並在 Firebase 留下索引"""
+        assert archiver.archive_once(now=datetime(2026, 1, 11, 9, 0, 0)) == 12
+
+        history = fake_db.reference('test_project/history').get()
+        assert len(history) == 3
+        assert all(r['timestamp'].startswith("2026-01-11") for r in history.values())
+
+        meta = fake_db.reference('test_project/archive').get()
+        (entry,) = meta['index'].values()
+        assert entry['start'] == "2026-01-01 08:00:00"
+        assert entry['end'] == "2026-01-01 08:00:11"
+        assert meta['total'] == 12
+
+        rows = [r for _, r in read_records(f"{archiver.archive_dir}/{entry['file']}")]
+        assert [r['conc'] for r in rows] == [float(i) for i in range(12)]
+
+    def test_rehydrate_range_is_idempotent(self, fake_db, archiver):
+        """依時間區間載回，重複載回與再次封存都不會產生重複資料"""
+        archiver.archive_once(now=datetime(2026, 1, 11, 9, 0, 0))
+
+        assert archiver.rehydrate("2026-01-01 08:00:03", "2026-01-01 08:00:05") == 3
+        assert archiver.rehydrate("2026-01-01 08:00:03", "2026-01-01 08:00:05") == 3
+        assert len(fake_db.reference('test_project/history').get()) == 6
+        (registered,) = fake_db.reference('test_project/history_imports').get().values()
+        assert registered['archive'] is True
+
+        # 載回的資料再次過期時只會被刪除，不會再寫一份封存檔
+        assert archiver.archive_once(now=datetime(2026, 1, 11, 9, 0, 0)) == 0
+        assert len(fake_db.reference('test_project/history').get()) == 3
+        assert len(archiver.load_index()) == 1
+
+    def test_backup_file_is_readable_as_archive(self, tmp_path):
+        """備份檔與封存檔欄位相同，可用同一個讀取函式"""
+        backup = tmp_path / "p_20260101_080000.csv"
+        with open(backup, 'w', newline='', encoding='utf-8-sig') as f:
+            f.write("timestamp,lat,lon,alt,conc,conc_unit,status\n")
+            f.write("2026-01-01 08:00:00,25.0,121.5,?,50.5,ppm,A\n")
+            f.write("2026-01-01 08:00:01,,,0,51.0,ppm,GPS Lost\n")
+        rows = [r for _, r in read_records(str(backup))]
+        assert rows[0] == {"timestamp": "2026-01-01 08:00:00", "lat": 25.0, "lon": 121.5,
+                           "conc": 50.5, "conc_unit": "ppm", "status": "A"}
+        assert rows[1]['status'] == "GPS Lost" and 'lat' not in rows[1]
+
+    def test_same_timestamp_spanning_pages(self, fake_db, tmp_path):
+        """同一時間點超過一頁也會全部封存，並依 max_file_records 分成多個檔案串流寫入"""
+        ref = fake_db.reference('test_project/history')
+        for i in range(13):
+            ref.push({"timestamp": "2026-01-02 08:00:00", "lat": 25.0, "lon": 121.5,
+                      "conc": 50.0 + i, "conc_unit": "ppm", "status": "A"})
+        archiver = HistoryArchiver("test_project", archive_dir=str(tmp_path), max_age_days=7,
+                                   page_size=4, max_file_records=10, transport=fake_db)
+        assert archiver.archive_once(now=datetime(2026, 1, 11, 9, 0, 0)) == 25
+        assert len(fake_db.reference('test_project/history').get()) == 3
+
+        index = archiver.load_index()
+        assert len(index) == 3
+        rows = [r for entry in sorted(index.values(), key=lambda e: (e['start'], e['file']))
+                for _, r in read_records(f"{archiver.archive_dir}/{entry['file']}")]
+        assert sorted(r['conc'] for r in rows) == [float(i) for i in range(12)] + [50.0 + i for i in range(13)]
+        assert not list(tmp_path.glob("**/*.tmp"))
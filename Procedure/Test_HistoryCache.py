@@ -0,0 +1,161 @@
+import csv
+import pytest
+
+from datetime import datetime
+from unittest.mock import MagicMock
+from Procedure.BackupManager import FIELDNAMES
+from Procedure.HistoryCache import HistoryCache
+from Procedure.HistoryTransfer import HistoryExporter, make_import_key, register_import
+from Procedure.RecoveryManager import RecoveryManager
+
+def _record(i, conc=None):
+    return {"timestamp": f"2026-01-06 12:{i // 60:02d}:{i % 60:02d}", "lat": 25.0 + i * 1e-4, "lon": 121.5,
+            "alt": 0.0, "conc": float(i) if conc is None else conc, "conc_unit": "ppm", "status": "A"}
+
+def _read_csv(path):
+    with open(path, encoding='utf-8-sig') as f:
+        return list(csv.DictReader(f))
+
+def _write_backup(path, records):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for r in records:
+            writer.writerow(r)
+
+class TestHistoryCache:
+
+    @pytest.fixture
+    def fake(self, fake_firebase):
+        """建立含 25 筆 push 資料的本地假資料庫"""
+        fake = fake_firebase
+        for i in range(25):
+            fake.reference('site/history').push(_record(i))
+        return fake
+
+    @pytest.fixture
+    def cache(self, fake, tmp_path):
+        cache = HistoryCache("site", str(tmp_path / "cache.sqlite3"), transport=fake, page_size=10)
+        yield cache
+        cache.close()
+
+    def test_incremental_sync_fetches_only_new_keys(self, fake, cache):
+        """第二次同步只讀取新增的 key"""
+        assert cache.sync() == 25
+        assert cache.count() == 25
+
+        for i in range(25, 28):
+            fake.reference('site/history').push(_record(i))
+        before = fake.stats['get']
+        assert cache.sync() == 3
+        assert fake.stats['get'] - before == 3       # push id 一頁 + 其他 key 一頁 + 匯入登記
+        assert cache.count() == 28
+        assert cache.sync() == 0
+
+    def test_push_keys_after_import_keys_are_synced(self, fake, cache):
+        """匯入 key 排在 push id 之後：之後新增的 push id 仍會同步到"""
+        fake.reference('site/history').update({make_import_key("old", i): _record(100 + i) for i in range(5)})
+        assert cache.sync() == 30
+        fake.reference('site/history').push(_record(200))
+        fake.reference('site/history').update({make_import_key("old", 5): _record(105)})
+        assert cache.sync() == 2
+        assert cache.state()['other_key'] == make_import_key("old", 5)
+
+    def test_state_persists_across_instances(self, fake, cache):
+        cache.sync()
+        cache.close()
+        reopened = HistoryCache("site", cache.path, transport=fake)
+        try:
+            assert reopened.sync() == 0
+            assert reopened.count() == 25
+        finally:
+            reopened.close()
+
+    def test_time_range_query(self, cache):
+        cache.sync()
+        rows = cache.query("2026-01-06 12:00:05", "2026-01-06 12:00:09")
+        assert [r['conc'] for _, r in rows] == [5.0, 6.0, 7.0, 8.0, 9.0]
+        assert all(key.startswith('-') for key, _ in rows)
+        assert len(cache.query(limit=3)) == 3
+        assert cache.timestamps_between("2026-01-06 12:00:20", "2026-01-06 12:01:00") == \
+            {f"2026-01-06 12:00:{i}" for i in range(20, 25)}
+
+    def test_export_from_cache(self, fake, cache, tmp_path):
+        """經由快取匯出：第二次只同步新增的紀錄，輸出與直接匯出相同"""
+        out, out_direct = tmp_path / "site.csv", tmp_path / "direct.csv"
+        fake.reference('site/history').update({make_import_key("early", 0): dict(_record(0, conc=-1.0), lat=24.9)})
+        register_import(fake, "site", "early")
+        direct = MagicMock()
+        direct.reference.side_effect = AssertionError("不應直接讀取")
+        assert HistoryExporter("site", str(out), cache=cache, transport=direct).run() == 26
+        fake.reference('site/history').push(_record(30))
+        before = fake.stats['get']
+        assert HistoryExporter("site", str(out), cache=cache, transport=direct).run() == 27
+        assert fake.stats['get'] - before == 3      # push id 一頁 + 其他 key 一頁 + 匯入登記
+        rows = _read_csv(out)
+        assert [r['timestamp'] for r in rows] == sorted(r['timestamp'] for r in rows)
+        assert rows[-1]['conc'] == '30.0'
+        assert HistoryExporter("site", str(out_direct), transport=fake).run() == 27
+        assert sorted(map(tuple, (r.values() for r in rows))) == \
+            sorted(map(tuple, (r.values() for r in _read_csv(out_direct))))
+
+    def test_recovery_uses_cache(self, fake, cache, tmp_path):
+        """復原比對改查本地快取，結果與直接查詢相同"""
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+        path = backup_dir / "site_20260106_120000.csv"
+        _write_backup(path, [_record(i) for i in range(40)])
+
+        manager = RecoveryManager("site", backup_dir=str(backup_dir), transport=fake, cache=cache)
+        report = manager.run(now=datetime(2026, 1, 6, 13, 0, 0), files=[str(path)])
+        assert report['uploaded'] == 15
+        assert len(fake.reference('site/history').get()) == 40
+
+        again = manager.run(now=datetime(2026, 1, 6, 13, 0, 0), files=[str(path)])
+        assert again['uploaded'] == 0
+        assert cache.count() == 40
+
+    def test_new_import_prefix_sorting_earlier_is_synced(self, fake, cache):
+        """之後才匯入、排序較前的前綴，依 history_imports 登記一般同步即可取得 (不需 full)"""
+        ref = fake.reference('site/history')
+        ref.update({make_import_key("zone", i): _record(100 + i) for i in range(3)})
+        register_import(fake, "site", "zone")
+        assert cache.sync() == 28
+        ref.update({make_import_key("alpha", i): _record(200 + i) for i in range(2)})
+        register_import(fake, "site", "alpha")
+        ref.update({make_import_key("zone", 3): _record(103)})
+        ref.update({make_import_key("zone_2024", 0): _record(300)})
+        register_import(fake, "site", "zone_2024")
+        assert cache.sync() == 4
+        assert cache.count() == 32
+        before = fake.stats['get']
+        assert cache.sync() == 0
+        assert fake.stats['get'] - before == 3      # 前綴數量不影響無變化時的讀取次數
+
+    def test_rehydrated_archive_is_not_duplicated(self, fake, cache, tmp_path):
+        """封存刪除後又載回 (import_<封存>_NNN)：原紀錄已在快取中就不再寫入，匯出與直接匯出相同"""
+        cache.sync()
+        ref = fake.reference('site/history')
+        archived = sorted(ref.get().items())[:10]
+        ref.update({key: None for key, _ in archived})
+        ref.update({make_import_key("archive-20260106", i): record for i, (_, record) in enumerate(archived)})
+        register_import(fake, "site", "archive-20260106", archive=True)
+        assert cache.sync() == 0
+
+        rows = cache.query()
+        assert len(rows) == cache.count() == 25
+        assert all(key.startswith('-') for key, _ in rows)
+        assert len(cache.query(limit=12)) == 12
+
+        out, out_direct = tmp_path / "site.csv", tmp_path / "direct.csv"
+        assert HistoryExporter("site", str(out), cache=cache).run() == 25
+        assert HistoryExporter("site", str(out_direct), transport=fake).run() == 25
+        assert sorted(map(tuple, (r.values() for r in _read_csv(out)))) == \
+            sorted(map(tuple, (r.values() for r in _read_csv(out_direct))))
+
+    def test_records_without_position_are_kept(self, fake, cache):
+        """同一秒、無 GPS 定位 (lat/lon 為空) 的不同紀錄都保留"""
+        for conc in (1.0, 2.0):
+            fake.reference('site/history').push(dict(_record(59, conc=conc), lat=None, lon=None))
+        assert cache.sync() == 27
+        assert [r['conc'] for _, r in cache.query("2026-01-06 12:00:59", "2026-01-06 12:00:59")] == [1.0, 2.0]
@@ -0,0 +1,80 @@
+import csv
+import pytest
+
+from unittest.mock import patch
+from Procedure.HistoryTransfer import HistoryExporter, HistoryImporter, iter_history_pages
+
+class TestHistoryTransfer:
+
+    @pytest.fixture
+    def fake_db(self, fake_firebase):
+        """建立含 25 筆歷史資料的本地假資料庫"""
+        fake = fake_firebase
+        ref = fake.reference('test_project/history')
+        for i in range(25):
+            ref.push({"timestamp": f"2026-01-06 12:00:{i:02d}", "lat": 25.0 + i * 1e-4, "lon": 121.5,
+                      "alt": 10, "conc": float(i), "conc_unit": "ppm", "status": "A"})
+        return fake
+
+    def test_pagination_reads_each_key_once(self, fake_db):
+        """分頁讀取：每筆只出現一次，且每頁不超過 page_size"""
+        pages = list(iter_history_pages(fake_db.reference('test_project/history'), page_size=10))
+        keys = [k for page in pages for k, _ in page]
+        assert [len(p) for p in pages] == [10, 10, 5]
+        assert len(keys) == len(set(keys)) == 25
+
+    def test_export_then_import_roundtrip(self, fake_db, tmp_path):
+        """匯出的 CSV 可原樣匯入另一個專案"""
+        out = tmp_path / "test_project.csv"
+        assert HistoryExporter("test_project", str(out), page_size=7, transport=fake_db).run() == 25
+        assert not (tmp_path / "test_project.csv.state.json").exists()
+
+        with open(out, encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        assert rows[0]['timestamp'] == "2026-01-06 12:00:00"
+        assert len(rows) == 25
+
+        assert HistoryImporter("copy_project", str(out), batch_size=4, workers=3, transport=fake_db).run() == 25
+        copied = fake_db.reference('copy_project/history').get()
+        assert sorted(r['conc'] for r in copied.values()) == [float(i) for i in range(25)]
+        assert fake_db.reference('copy_project/latest').get()['timestamp'] == "2026-01-06 12:00:24"
+        assert fake_db.reference('copy_project/history_imports/import_test_project').get()['prefix'] == \
+            "import_test_project_"
+
+    def test_export_resumes_after_interruption(self, fake_db, tmp_path):
+        """匯出中斷後續傳：不重複、不遺漏"""
+        out = tmp_path / "export.csv"
+        exporter = HistoryExporter("test_project", str(out), page_size=10, transport=fake_db)
+        reference_type = type(fake_db.reference('/'))
+        real_get = reference_type.get
+        calls = {'n': 0}
+
+        def flaky_get(self, shallow=False):
+            calls['n'] += 1
+            if calls['n'] == 2:
+                raise ConnectionError("模擬斷線")
+            return real_get(self, shallow)
+
+        with patch.object(reference_type, 'get', flaky_get):
+            with pytest.raises(ConnectionError):
+                exporter.run()
+        assert (tmp_path / "export.csv.state.json").exists()
+
+        exporter.run()
+        with open(out, encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        assert [r['conc'] for r in rows] == [str(float(i)) for i in range(25)]
+
+    def test_import_resume_is_idempotent(self, fake_db, tmp_path):
+        """匯入重跑時使用固定 key，不會產生重複資料"""
+        src = tmp_path / "field_day.csv"
+        with open(src, 'w', newline='', encoding='utf-8-sig') as f:
+            f.write("timestamp,lat,lon,conc,conc_unit,status\n")
+            for i in range(10):
+                f.write(f"2026-01-06 13:00:{i:02d},25.0,121.5,{i},ppm,A\n")
+
+        HistoryImporter("p", str(src), batch_size=3, transport=fake_db).run()
+        HistoryImporter("p", str(src), batch_size=3, workers=2, transport=fake_db).run(resume=False)
+        history = fake_db.reference('p/history').get()
+        assert len(history) == 10
+        assert all(k.startswith("import_field_day_") for k in history)
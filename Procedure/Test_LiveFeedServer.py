@@ -0,0 +1,135 @@
+import asyncio
+import json
+import pytest
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Procedure.LiveFeedServer import LiveFeedServer, _Client
+
+class _StandInCDN:
+    """本地假 CDN：回傳固定內容並記錄請求"""
+    def __init__(self):
+        stand_in = self
+        self.requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.requests.append(self.path)
+                body = b"window.Vendor = true;"
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestLiveFeedServer:
+
+    @pytest.fixture
+    def server(self, tmp_path):
+        track = [{"timestamp": "2026-01-06 11:59:59", "lat": 25.0, "lon": 121.5, "conc": 1.0}]
+        obj = LiveFeedServer(host="127.0.0.1", port=0, buffer_size=64, keepalive_sec=1,
+                             vendor_dir=str(tmp_path / "vendor"), vendor_assets={}, track_provider=lambda: track)
+        obj.start()
+        yield obj
+        obj.stop()
+
+    @staticmethod
+    async def _subscribe(port, expected, last_event_id=None):
+        """模擬一個瀏覽器 EventSource，收滿 expected 筆後回傳"""
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        extra = f"Last-Event-ID: {last_event_id}\r\n" if last_event_id is not None else ""
+        writer.write(f"GET /events HTTP/1.1\r\nHost: x\r\n{extra}\r\n".encode())
+        await writer.drain()
+        records = []
+        while len(records) < expected:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"data: "):
+                records.append(json.loads(line[6:]))
+        writer.close()
+        return records
+
+    def test_serves_static_files(self, server):
+        """提供 index.html / app.js，其他路徑回 404"""
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/app.js") as resp:
+            assert b"MapManager" in resp.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/config.json")
+
+    def test_fanout_to_hundreds_of_clients(self, server):
+        """壓力測試：300 個客戶端同時連線，每個都收到全部 50 筆且順序正確"""
+        n_clients, n_records = 300, 50
+
+        async def scenario():
+            tasks = [asyncio.create_task(self._subscribe(server.port, n_records)) for _ in range(n_clients)]
+            while server.stats()['clients'] < n_clients:
+                await asyncio.sleep(0.05)
+            start = time.time()
+            for i in range(n_records):
+                server.publish({"timestamp": f"2026-01-06 12:00:{i:02d}", "conc": float(i)})
+            results = await asyncio.wait_for(asyncio.gather(*tasks), timeout=30)
+            return results, time.time() - start
+
+        results, elapsed = asyncio.run(scenario())
+        assert all([r['conc'] for r in records] == [float(i) for i in range(n_records)] for records in results)
+        assert server.stats()['published'] == n_records
+        assert server.stats()['dropped'] == 0
+        assert elapsed < 10.0, f"{n_clients} 個客戶端 x {n_records} 筆花了 {elapsed:.2f} 秒"
+
+    def test_new_client_gets_backlog_and_resume(self, server):
+        """新連線會補送最近資料；帶 Last-Event-ID 重連只補送遺漏的部分"""
+        for i in range(5):
+            server.publish({"conc": float(i)})
+        time.sleep(0.1)
+        backlog = asyncio.run(self._subscribe(server.port, 5))
+        assert [r['conc'] for r in backlog] == [0.0, 1.0, 2.0, 3.0, 4.0]
+        resumed = asyncio.run(self._subscribe(server.port, 2, last_event_id=3))
+        assert [r['conc'] for r in resumed] == [3.0, 4.0]
+
+    def test_slow_client_buffer_is_bounded(self):
+        """慢速客戶端只保留最新的 buffer_size 筆，並計算丟棄數"""
+        client = _Client(buffer_size=10)
+        for i in range(25):
+            client.offer(b"%d" % i)
+        assert len(client.buffer) == 10
+        assert client.dropped == 15
+        assert client.buffer[0] == b"15"
+
+    def test_track_endpoint(self, server):
+        """/track 回傳後端提供的既有軌跡 (不經 Firebase)"""
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/track") as resp:
+            assert json.loads(resp.read()) == [{"timestamp": "2026-01-06 11:59:59", "lat": 25.0, "lon": 121.5, "conc": 1.0}]
+
+    def test_vendor_assets_are_cached_for_offline_use(self, tmp_path):
+        """第三方函式庫第一次從 CDN 下載並快取，CDN 無法連線後仍可由本地提供；未列出的檔名一律 404"""
+        cdn = _StandInCDN()
+        server = LiveFeedServer(host="127.0.0.1", port=0, vendor_dir=str(tmp_path / "vendor"),
+                                vendor_assets={'leaflet.js': f"{cdn.url}/leaflet@1.9.4/dist/leaflet.js"})
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}/vendor/leaflet.js"
+            with urllib.request.urlopen(url) as resp:
+                assert resp.read() == b"window.Vendor = true;"
+                assert resp.headers['Content-Type'].startswith('application/javascript')
+            cdn.stop()
+            with urllib.request.urlopen(url) as resp:
+                assert resp.read() == b"window.Vendor = true;"
+            assert cdn.requests == ["/leaflet@1.9.4/dist/leaflet.js"]
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"http://127.0.0.1:{server.port}/vendor/../config.json")
+        finally:
+            server.stop()
@@ -0,0 +1,67 @@
+import logging
+import pytest
+
+from unittest.mock import MagicMock
+from Procedure.LogPipeline import RecordSummary, setup_logging, stop_logging
+
+class TestLogPipeline:
+
+    @pytest.fixture
+    def clock(self):
+        """可手動推進的時鐘"""
+        class Clock:
+            now = 0.0
+            def __call__(self):
+                return self.now
+        return Clock()
+
+    @pytest.fixture
+    def restore_root(self):
+        """setup_logging 會替換 root handler，測試後還原給 pytest"""
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        yield
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+    def test_summary_emits_once_per_interval(self, clock):
+        """每秒一筆、連續 25 秒：只輸出 2 行彙總，結束時再補最後一行"""
+        log = MagicMock()
+        summary = RecordSummary(log, interval=10.0, clock=clock)
+        for i in range(25):
+            clock.now = i + 1
+            status = '連線成功' if i % 5 else 'GPS 連線失敗'
+            summary.add({"lat": 25.0, "lon": 121.5, "conc": float(i), "conc_unit": "ppm"}, status)
+        assert log.info.call_count == 2
+
+        first = log.info.call_args_list[0][0][0]
+        assert "10 筆" in first and "0.0~9.0 ppm" in first and "GPS 連線失敗 x2" in first
+
+        summary.flush(force=True)
+        assert log.info.call_count == 3
+        assert "累計 25" in log.info.call_args_list[-1][0][0]
+
+    def test_no_line_when_idle(self, clock):
+        log = MagicMock()
+        summary = RecordSummary(log, interval=1.0, clock=clock)
+        clock.now = 5.0
+        summary.flush()
+        log.info.assert_not_called()
+
+    def test_log_file_rotates_and_is_kept_on_restart(self, tmp_path, restore_root):
+        """依大小輪替；重新啟動時沿用舊檔而不是清空"""
+        log_file = tmp_path / "execution.log"
+        listener = setup_logging(str(log_file), max_bytes=2000, backup_count=2)
+        for i in range(200):
+            logging.getLogger("Controller").info(f"第 {i} 行 " + "x" * 20)
+        stop_logging(listener)
+
+        rotated = sorted(p.name for p in tmp_path.iterdir())
+        assert rotated == ["execution.log", "execution.log.1", "execution.log.2"]
+        assert all(p.stat().st_size < 2200 for p in tmp_path.iterdir())     # 以字元數判斷，中文略超過
+
+        before = log_file.stat().st_size
+        listener = setup_logging(str(log_file), max_bytes=10 ** 6)
+        logging.getLogger("Controller").info("重新啟動")
+        stop_logging(listener)
+        assert log_file.stat().st_size > before
@@ -0,0 +1,73 @@
+import pytest
+import threading
+import time
+import tracemalloc
+
+from Procedure.Profiler import DiagnosticsRunner, SamplingProfiler, memory_profile, parse_profile_command, summarize
+
+def _busy_loop(stop):
+    total = 0
+    while not stop.is_set():
+        total += sum(range(200))
+    return total
+
+def _allocate(stop, sink):
+    while not stop.is_set() and len(sink) < 2000:
+        sink.append(bytearray(1024))
+        time.sleep(0.0005)
+
+class TestProfiler:
+
+    @pytest.fixture
+    def worker(self):
+        """背景執行的工作負載，測試結束時停止"""
+        stop, threads = threading.Event(), []
+
+        def start(target, *args):
+            t = threading.Thread(target=target, args=(stop,) + args, daemon=True)
+            t.start()
+            threads.append(t)
+        yield start
+        stop.set()
+        for t in threads:
+            t.join(timeout=2)
+
+    def test_parse_commands(self):
+        assert parse_profile_command("profile:30s") == ('cpu', 30.0)
+        assert parse_profile_command("PROFILE:2m") == ('cpu', 120.0)
+        assert parse_profile_command("profile:15") == ('cpu', 15.0)
+        assert parse_profile_command("profile") == ('cpu', 30.0)
+        assert parse_profile_command("memprofile") == ('memory', 30.0)
+        assert parse_profile_command("memprofile:5s") == ('memory', 5.0)
+        assert parse_profile_command("start") is None
+        assert parse_profile_command("profile:abc") is None
+
+    def test_sampling_finds_busy_function(self, worker):
+        worker(_busy_loop)
+        report = SamplingProfiler(interval=0.005).run(0.4)
+        assert report['samples'] > 10
+        summary = summarize(report, top=5)
+        assert any('_busy_loop' in item['func'] for item in summary['top_total'])
+
+    def test_memory_profile_reports_growth(self, worker):
+        sink = []
+        worker(_allocate, sink)
+        report = memory_profile(0.5)
+        assert not tracemalloc.is_tracing()      # 分析結束即關閉，不留下額外開銷
+        summary = summarize(report, top=5)
+        assert summary['top_growth'][0]['line'].startswith('Test_Profiler.py')
+        assert summary['top_growth'][0]['kb'] > 100
+
+    def test_runner_writes_report_and_summary(self, worker, fake_firebase, tmp_path):
+        worker(_busy_loop)
+        fake = fake_firebase
+        runner = DiagnosticsRunner(fake, output_dir=str(tmp_path))
+        assert runner.start("site", 'cpu', 0.2) is True
+        assert runner.start("site", 'memory', 0.2) is False     # 同時只允許一個分析
+        runner.thread.join(timeout=5)
+
+        summary = fake.reference('site/diagnostics/cpu').get()
+        assert summary['samples'] > 0 and summary['top_self']
+        report = tmp_path / summary['file']
+        assert report.read_text(encoding='utf-8').startswith("CPU 取樣分析")
+        assert not runner.active
@@ -0,0 +1,113 @@
+import pytest
+import threading
+import time
+
+from unittest.mock import patch, MagicMock
+from MultiController import ProjectRuntime
+from Procedure.ReaderHub import ReaderHub
+from Procedure.ResourceMonitor import resource_snapshot
+
+class StubGPSReader:
+    """本地假 GPS：啟動後每 50ms 送出一筆"""
+    instances = []
+
+    def __init__(self):
+        self.ip = None
+        self.port = None
+        self.gps_queue = None
+        self.running = False
+        StubGPSReader.instances.append(self)
+
+    def _producer(self):
+        i = 0
+        while self.running:
+            self.gps_queue.put({"timestamp": f"2026-01-06 12:00:{i:02d}", "lat": 25.0, "lon": 121.5,
+                                "alt": 0, "status": "A"})
+            i += 1
+            time.sleep(0.05)
+
+    def run(self):
+        self.running = True
+        threading.Thread(target=self._producer, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+class StubConcReader(StubGPSReader):
+    def __init__(self):
+        super().__init__()
+        self.unit = None
+        self.conc_queue = None
+
+    def _producer(self):
+        while self.running:
+            self.conc_queue.put({"conc": 42.0, "conc_unit": self.unit})
+            time.sleep(0.05)
+
+class TestReaderHub:
+
+    @pytest.fixture
+    def hub(self):
+        StubGPSReader.instances.clear()
+        return ReaderHub(gps_factory=StubGPSReader, conc_factory=StubConcReader)
+
+    def test_same_source_shares_one_reader(self, hub):
+        """相同來源只建立一個讀取器，每個訂閱者拿到各自的複本"""
+        a = hub.gps("127.0.0.1", 11123)
+        b = hub.gps("127.0.0.1", "11123")
+        a.run(); b.run()
+        first_a = a.gps_queue.get(timeout=1)
+        first_b = b.gps_queue.get(timeout=1)
+        first_a['conc'] = 1.0
+        assert 'conc' not in first_b
+
+        gps_readers = [r for r in StubGPSReader.instances if not isinstance(r, StubConcReader)]
+        assert len(gps_readers) == 1
+
+        a.stop()
+        assert gps_readers[0].running is True     # 尚有訂閱者
+        b.stop()
+        assert gps_readers[0].running is False
+        assert hub.stats() == {}
+
+    def test_recreated_reader_keeps_existing_subscribers(self, hub):
+        """讀取器逾時放棄後由新訂閱者重新建立：先前的訂閱者也繼續收到資料"""
+        a = hub.gps("127.0.0.1", 11123)
+        a.run()
+        a.gps_queue.get(timeout=1)
+        StubGPSReader.instances[0].running = False      # 模擬逾時放棄
+        time.sleep(0.1)
+        while not a.gps_queue.empty():
+            a.gps_queue.get_nowait()
+
+        b = hub.gps("127.0.0.1", 11123)
+        b.run()
+        assert len(StubGPSReader.instances) == 2
+        assert a.gps_queue.get(timeout=1) and b.gps_queue.get(timeout=1)
+        assert hub.stats() == {str(('gps', '127.0.0.1', 11123)): 2}
+        a.stop(); b.stop()
+        assert StubGPSReader.instances[1].running is False
+
+    def test_multiple_projects_keep_separate_state(self, hub, fake_firebase, make_cfg, tmp_path, monkeypatch):
+        """三個專案共用一個 GPS 來源，各自寫入自己的 history 與備份檔"""
+        monkeypatch.chdir(tmp_path)
+        fake = fake_firebase
+
+        with patch('Procedure.FirebaseManager.db.reference', side_effect=fake.reference), \
+             patch('MultiController.db.reference', side_effect=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            baseline = resource_snapshot()
+            projects = [ProjectRuntime(make_cfg(f"site_{i}"), hub, MagicMock()) for i in range(3)]
+            for p in projects:
+                p.start()
+            time.sleep(0.5)
+            threads_per_project = (resource_snapshot()['threads'] - baseline['threads']) / len(projects)
+            for p in projects:
+                p.stop()
+
+        for i in range(3):
+            assert len(fake.reference(f'site_{i}/history').get()) > 0
+            assert fake.reference(f'site_{i}/status').get()['state'] == 'stopped'
+        assert len(list((tmp_path / "backups").glob("site_*.csv"))) == 3
+        # 讀取器共用：每多一個專案只多出監督、合併與各 sink (上傳、備份) 的執行緒
+        assert threads_per_project < 6
@@ -0,0 +1,89 @@
+import csv
+import pytest
+import queue
+
+from unittest.mock import patch
+from Procedure.BackupManager import FIELDNAMES
+from Procedure.FirebaseManager import FirebaseManager
+from Procedure.HistoryTransfer import HistoryImporter
+from Procedure.RecentWindow import RecentWindow
+
+def _record(i):
+    return {"timestamp": f"2026-01-06 12:00:{i:02d}", "lat": 25.0, "lon": 121.5 + i * 1e-4,
+            "alt": 0, "conc": float(i), "conc_unit": "ppm", "status": "A"}
+
+class TestRecentWindow:
+
+    @pytest.fixture
+    def fake(self, fake_firebase):
+        return fake_firebase
+
+    def test_slots_wrap_in_place(self):
+        window = RecentWindow(size=3)
+        keys = [next(k for k in window.next_update(_record(i)) if 'slots' in k) for i in range(5)]
+        assert keys == ['recent/slots/000', 'recent/slots/001', 'recent/slots/002',
+                        'recent/slots/000', 'recent/slots/001']
+        assert window.meta() == {'size': 3, 'head': 2, 'count': 5, 'window_minutes': None}
+
+    def test_load_resumes_or_resets(self, fake):
+        ref = fake.reference('site/recent')
+        ref.update({'slots/000': _record(0), 'meta': {'size': 3, 'head': 1, 'count': 4}})
+
+        same = RecentWindow(size=3)
+        same.load(ref)
+        assert (same.head, same.count) == (1, 4)
+
+        resized = RecentWindow(size=5)
+        resized.load(ref)
+        assert (resized.head, resized.count) == (0, 0)
+        assert ref.child('slots').get() is None
+
+    def test_firebase_manager_keeps_bounded_ring(self, fake):
+        """寫入 20 筆、環狀區 8 格：recent 只保留最後 8 筆，latest 與 history 照常"""
+        with patch('Procedure.FirebaseManager.db.reference', side_effect=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            fb = FirebaseManager(key_path=None, db_url=None)
+            fb.project_name = "site"
+            fb.data_queue = queue.Queue()
+            fb.recent = RecentWindow(size=8)
+            for i in range(20):
+                fb.data_queue.put(_record(i))
+            fb.data_queue.put(None)
+            fb.run()
+
+        site = fake.reference('site').get()
+        assert len(site['history']) == 20
+        assert site['latest'] == _record(19)
+        slots = site['recent']['slots']
+        assert len(slots) == 8
+        assert sorted(s['conc'] for s in slots.values()) == [float(i) for i in range(12, 20)]
+        assert site['recent']['meta']['head'] == 4
+        # history、latest、recent 與 status 合併為 multi-path update，不再逐筆 set
+        assert fake.stats['set'] == 0
+
+    def test_disabled_ring_is_cleared(self, fake):
+        """未啟用 recent：先前工作階段留下的環狀區在開始上傳時清除，網頁改讀 history"""
+        fake.reference('site/recent').update({'slots/000': _record(0), 'meta': {'size': 3, 'head': 1, 'count': 1}})
+        with patch('Procedure.FirebaseManager.db.reference', side_effect=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            fb = FirebaseManager(key_path=None, db_url=None)
+            fb.project_name = "site"
+            fb.data_queue = queue.Queue()
+            fb.data_queue.put(_record(1))
+            fb.data_queue.put(None)
+            fb.run()
+
+        assert fake.reference('site/recent').get() is None
+        assert len(fake.reference('site/history').get()) == 1
+
+    def test_import_clears_ring(self, fake, tmp_path):
+        """HistoryTool import 寫入 history 後，舊的環狀區一併清除"""
+        fake.reference('site/recent').update({'slots/000': _record(0), 'meta': {'size': 3, 'head': 1, 'count': 1}})
+        src = tmp_path / "field.csv"
+        with open(src, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            for i in range(3):
+                writer.writerow({k: v for k, v in _record(i).items() if k in FIELDNAMES})
+        assert HistoryImporter("site", str(src), transport=fake).run() == 3
+        assert fake.reference('site/recent').get() is None
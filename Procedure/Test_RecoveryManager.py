@@ -0,0 +1,79 @@
+import csv
+import pytest
+
+from datetime import datetime
+from Procedure.BackupManager import FIELDNAMES
+from Procedure.RecoveryManager import RecoveryManager, repair_backup
+from Procedure.UploadFilter import DeadbandFilter
+
+def _record(i, conc=None):
+    return {"timestamp": f"2026-01-06 12:{i // 60:02d}:{i % 60:02d}", "lat": 25.0 + i * 1e-4, "lon": 121.5,
+            "alt": 0.0, "conc": float(i) if conc is None else conc, "conc_unit": "ppm", "status": "A"}
+
+def _write_backup(path, records, truncate_last=False):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for r in records:
+            writer.writerow(r)
+    if truncate_last:
+        data = path.read_bytes()
+        path.write_bytes(data[:-12])     # 模擬斷電：最後一行只寫一半
+
+class TestRecoveryManager:
+
+    @pytest.fixture
+    def fake(self, fake_firebase):
+        return fake_firebase
+
+    @pytest.fixture
+    def backup_dir(self, tmp_path):
+        path = tmp_path / "backups"
+        path.mkdir()
+        return path
+
+    def test_repair_truncated_line(self, backup_dir):
+        path = backup_dir / "site_20260106_120000.csv"
+        _write_backup(path, [_record(0), _record(1)], truncate_last=True)
+        assert repair_backup(str(path)) is True
+        assert path.read_text(encoding='utf-8-sig').splitlines()[-1].startswith("2026-01-06 12:00:00")
+        assert repair_backup(str(path)) is False
+
+    def test_uploads_only_missing_records(self, fake, backup_dir):
+        """history 只有前 60 筆：補傳其餘 39 筆 (最後一筆不完整已截除)，重跑不會重複"""
+        path = backup_dir / "site_20260106_120000.csv"
+        _write_backup(path, [_record(i) for i in range(100)], truncate_last=True)
+        _write_backup(backup_dir / "site_b_20260106_120000.csv", [_record(0)])    # 其他專案
+        for i in range(60):
+            fake.reference('site/history').push(_record(i))
+
+        manager = RecoveryManager("site", backup_dir=str(backup_dir), transport=fake, batch_size=16)
+        report = manager.run(now=datetime(2026, 1, 6, 13, 0, 0), files=manager.recent_files(path.stat().st_mtime))
+        assert (report['files'], report['repaired'], report['checked'], report['uploaded']) == (1, 1, 99, 39)
+        assert len(fake.reference('site/history').get()) == 99
+        assert fake.stats['update'] == 3      # 39 筆分 3 批
+        assert fake.reference('site/recovery/last_run').get()['uploaded'] == 39
+
+        again = manager.run(now=datetime(2026, 1, 6, 13, 0, 0), files=[str(path)])
+        assert again['uploaded'] == 0
+        assert len(fake.reference('site/history').get()) == 99
+
+    def test_old_files_and_expired_records_are_skipped(self, fake, backup_dir):
+        path = backup_dir / "site_20260106_120000.csv"
+        _write_backup(path, [_record(i) for i in range(10)])
+        manager = RecoveryManager("site", backup_dir=str(backup_dir), transport=fake, lookback_hours=1)
+        assert manager.recent_files(path.stat().st_mtime + 7200) == []
+
+        manager = RecoveryManager("site", backup_dir=str(backup_dir), transport=fake, retention_days=1)
+        report = manager.run(now=datetime(2026, 1, 7, 12, 0, 5), files=[str(path)])
+        assert report['checked'] == 5        # 12:00:05 之前的已超過保留期限
+
+    def test_replay_upload_filter(self, fake, backup_dir):
+        """啟用上傳壓縮時，只補本來就會上傳的紀錄"""
+        path = backup_dir / "site_20260106_120000.csv"
+        records = [dict(_record(i, conc=10.0), lat=25.0) for i in range(120)]
+        _write_backup(path, records)
+        factory = lambda clock: DeadbandFilter(min_distance_m=3, min_conc_delta=1, heartbeat_sec=30, clock=clock)
+        manager = RecoveryManager("site", backup_dir=str(backup_dir), transport=fake, filter_factory=factory)
+        report = manager.run(now=datetime(2026, 1, 6, 13, 0, 0), files=[str(path)])
+        assert report['uploaded'] == 4       # 首筆 + 每 30 秒心跳
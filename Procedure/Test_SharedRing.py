@@ -0,0 +1,95 @@
+import multiprocessing
+import pytest
+import queue
+
+from Procedure.SharedRing import ProcessReader, SharedRing
+from AcquisitionBenchmark import run_benchmark
+
+def _child_put(ring_name, count):
+    ring = SharedRing(ring_name, create=False)
+    for i in range(count):
+        ring.put({"timestamp": f"2026-01-06 12:00:{i % 60:02d}", "conc": float(i), "conc_unit": "ppm"})
+    ring.put(None)
+    ring.shm.close()
+
+class TestSharedRing:
+
+    @pytest.fixture
+    def ring(self):
+        obj = SharedRing(capacity=8)
+        yield obj
+        obj.close()
+
+    def test_roundtrip_keeps_reader_format(self, ring):
+        """GPS / 濃度紀錄寫入後讀回的欄位與讀取器輸出相同"""
+        ring.put({"timestamp": "2026-01-06 12:00:00", "lat": 25.03, "lon": 121.56, "alt": '?', "status": "A"})
+        ring.put({"timestamp": "2026-01-06 12:00:00", "conc": 1.5, "conc_unit": "ppm"})
+        assert ring.qsize() == 2
+        assert ring.get_nowait() == {"timestamp": "2026-01-06 12:00:00", "lat": 25.03, "lon": 121.56,
+                                     "alt": '?', "status": "A"}
+        assert ring.get_nowait() == {"timestamp": "2026-01-06 12:00:00", "conc": 1.5, "conc_unit": "ppm"}
+        assert ring.empty()
+
+    def test_end_marker_and_timeout(self, ring):
+        ring.put(None)
+        assert ring.get(timeout=0.1) is None
+        with pytest.raises(queue.Empty):
+            ring.get(timeout=0.05)
+
+    def test_full_ring_drops_and_counts(self, ring):
+        """緩衝滿載時丟棄新資料而不阻塞，環繞後仍依序讀出"""
+        for i in range(10):
+            ring.put({"timestamp": "t", "conc": float(i), "conc_unit": "ppm"})
+        assert ring.dropped() == 2
+        assert [ring.get_nowait()["conc"] for _ in range(8)] == [float(i) for i in range(8)]
+
+        for i in range(5):
+            ring.put({"timestamp": "t", "conc": float(100 + i), "conc_unit": "ppm"})
+        assert [ring.get_nowait()["conc"] for _ in range(5)] == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+    def test_cross_process(self):
+        """子行程寫入、主行程讀取"""
+        ring = SharedRing(capacity=64)
+        proc = multiprocessing.Process(target=_child_put, args=(ring.name, 500))
+        proc.start()
+        received = []
+        while True:
+            item = ring.get(timeout=5)
+            if item is None:
+                break
+            received.append(item["conc"])
+        proc.join(timeout=5)
+        dropped = ring.dropped()
+        ring.close()
+        # 消費端跟不上時會丟資料，但收到的必須依序且不重複
+        assert received == sorted(set(received))
+        assert len(received) + dropped == 500
+
+    def test_benchmark_runs_real_readers(self):
+        """量測走真實的 GPSReader / ProcessReader 路徑：讀取器連上模擬的 NMEA 串流並送出資料"""
+        for mode in ('thread', 'process'):
+            result = run_benchmark(mode, records=300, work=1, capacity=32)
+            assert result["records"] == 300 and result["rate"] > 0
+            assert result["gps_records"] >= 1
+
+class TestProcessReader:
+
+    def test_no_shared_memory_until_run(self):
+        """建構後未啟動即停止：不配置也不殘留共享記憶體"""
+        reader = ProcessReader('conc', unit='ppm')
+        assert reader.ring is None and reader.log_queue is None
+        reader.stop()
+        assert reader.ring is None
+
+    def test_stop_releases_ring_and_keeps_unread(self):
+        """停止時釋放共享記憶體，未讀出的資料移到一般佇列"""
+        reader = ProcessReader('conc', capacity=8, unit='ppm')
+        reader.ring = SharedRing(capacity=8)
+        reader.conc_queue = reader.ring
+        name = reader.ring.name
+        reader.ring.put({"timestamp": "t", "conc": 1.0, "conc_unit": "ppm"})
+        reader.stop()
+        assert reader.ring is None
+        assert reader.conc_queue.get_nowait() == {"timestamp": "t", "conc": 1.0, "conc_unit": "ppm"}
+        with pytest.raises(FileNotFoundError):
+            SharedRing(name, create=False)
@@ -0,0 +1,211 @@
+import pytest
+import queue
+import threading
+import time
+
+from unittest.mock import patch, MagicMock
+from Procedure.BackupManager import BackupManager
+from Procedure.LocalStore import LocalStore
+from Procedure.Sinks import CsvSink, FirebaseSink, Sink, SqliteSink
+from Process import RunProcess
+
+def _record(i):
+    return {"timestamp": f"2026-01-06 12:{i // 60:02d}:{i % 60:02d}", "lat": 25.0 + (i % 10) * 1e-3,
+            "lon": 121.5 + (i // 10) * 1e-3, "alt": 0.0, "conc": float(i), "conc_unit": "ppm", "status": "A"}
+
+class _ListSink(Sink):
+    """寫入 list 的 sink，可設定每批延遲與前幾次失敗"""
+    name = 'list'
+
+    def __init__(self, delay=0.0, failures=0, **options):
+        super().__init__(**options)
+        self.delay = delay
+        self.failures = failures
+        self.batches = []
+
+    def write_batch(self, records):
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise IOError("disk busy")
+        self.batches.append(list(records))
+
+class _FlakyFile:
+    """第一次寫入只寫一半就失敗 (模擬磁碟滿)，之後正常"""
+    def __init__(self, file):
+        self.file = file
+        self.failed = False
+
+    def write(self, data):
+        if not self.failed:
+            self.failed = True
+            self.file.write(data[:len(data) // 2])
+            raise OSError("No space left on device")
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+def _run(sink):
+    thread = threading.Thread(target=sink.run, daemon=True)
+    thread.start()
+    return thread
+
+class TestSinks:
+
+    def test_batches_and_drain_on_stop(self):
+        sink = _ListSink(batch_size=10)
+        for i in range(35):
+            sink.offer(_record(i))
+        thread = _run(sink)
+        sink.stop(deadline=time.monotonic() + 5)
+        thread.join(timeout=5)
+        assert [len(b) for b in sink.batches] == [10, 10, 10, 5]
+        st = sink.stats()
+        assert (st['received'], st['written'], st['pending'], st['dropped']) == (35, 35, 0, 0)
+
+    def test_retry_then_give_up(self):
+        sink = _ListSink(failures=2, retry_delay=0.01, max_retries=3)
+        sink.offer(_record(0))
+        assert sink.finish() == 0
+        assert len(sink.batches) == 1 and sink.counters['errors'] == 2
+
+        broken = _ListSink(failures=10, retry_delay=0.01, max_retries=1)
+        broken.offer(_record(0))
+        broken.finish()
+        assert broken.counters['dropped'] == 1 and broken.batches == []
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        sink = _ListSink(maxsize=5)
+        started = time.monotonic()
+        for i in range(8):
+            sink.offer(_record(i))
+        assert time.monotonic() - started < 0.1
+        assert (sink.pending(), sink.counters['dropped']) == (5, 3)
+        assert sink.lag() >= 0.0
+
+    def test_firebase_queue_is_bounded(self):
+        """上傳佇列滿時丟棄並計數，不阻塞合併；結束標記不受上限限制"""
+        fb = MagicMock(data_queue=queue.Queue(maxsize=5))
+        sink = FirebaseSink(fb)
+        started = time.monotonic()
+        for i in range(8):
+            sink.offer(_record(i))
+        assert time.monotonic() - started < 0.1
+        assert (sink.pending(), sink.counters['dropped']) == (5, 3)
+
+    def test_rate_is_tracked_per_caller(self):
+        """定期統計與停止報告各自計算寫入速率，互不重設"""
+        clock = MagicMock(return_value=0.0)
+        sink = _ListSink(clock=clock)
+        for i in range(10):
+            sink.offer(_record(i))
+        sink.finish()
+        clock.return_value = 10.0
+        assert sink.stats('periodic')['rate'] == 1.0
+        clock.return_value = 20.0
+        assert sink.stats('shutdown')['rate'] == 0.5
+        assert sink.stats('periodic')['rate'] == 0.0
+
+    def test_sink_requires_write_batch(self):
+        class _Incomplete(Sink):
+            pass
+        with pytest.raises(TypeError):
+            _Incomplete()
+
+    def test_sqlite_store_queries(self, tmp_path):
+        store = LocalStore(str(tmp_path / "local.sqlite3"))
+        sink = SqliteSink(store, "site")
+        for i in range(100):
+            sink.offer(_record(i))
+        sink.offer(dict(_record(0), lat=None, lon=None, status="GPS Lost"))
+        assert sink.finish() == 0
+
+        reader = LocalStore(store.path)      # 另一個執行個體只做查詢
+        assert len(reader.query_time("site", "2026-01-06 12:00:10", "2026-01-06 12:00:19")) == 10
+        assert reader.query_time("other", "2026-01-06 12:00:00", "2026-01-06 12:59:59") == []
+        inside = reader.query_bbox("site", (25.0, 121.5, 25.0025, 121.5015))
+        assert sorted(r['conc'] for r in inside) == [0.0, 1.0, 2.0, 10.0, 11.0, 12.0]
+        inside = reader.query_bbox("site", (25.0, 121.5, 25.0025, 121.5015), start="2026-01-06 12:00:10")
+        assert [r['conc'] for r in inside] == [10.0, 11.0, 12.0]
+
+    def test_slow_sink_does_not_stall_others(self, fake_firebase, cfg, tmp_path, monkeypatch):
+        """CSV 寫入緩慢時，Firebase 照常上傳，合併迴圈也不會被卡住"""
+        monkeypatch.chdir(tmp_path)
+        fake = fake_firebase
+        cfg.DRAIN_TIMEOUT = 0.5
+
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=MagicMock(), conc=MagicMock())
+            slow = _ListSink(delay=0.2, batch_size=1)
+            process.sinks.append(slow)
+            threads = [_run(sink) for sink in process.sinks]
+            started = time.monotonic()
+            for i in range(50):
+                process._emit(_record(i))
+            emit_seconds = time.monotonic() - started
+            deadline = time.monotonic() + 5
+            while process.fb.uploaded < 50 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            stats = {sink.name: sink.stats() for sink in process.sinks}
+            for sink in process.sinks:
+                sink.stop(deadline=time.monotonic() + 0.5)
+            for thread in threads:
+                thread.join(timeout=5)
+            for sink in process.sinks:
+                sink.finish(time.monotonic() + 0.5)
+
+        assert emit_seconds < 0.5
+        assert len(fake.reference('site/history').get()) == 50
+        assert stats['list']['pending'] > 30 and stats['list']['lag_sec'] > 0
+        assert stats['csv']['written'] == 50
+        assert slow.counters['dropped'] > 0      # 期限到仍未寫完的部分計為丟棄
+
+    def test_stop_before_run_is_kept(self):
+        """stop() 早於執行緒啟動：run() 不會把 running 還原，期限到即結束"""
+        sink = _ListSink(delay=0.05, batch_size=1)
+        for i in range(50):
+            sink.offer(_record(i))
+        sink.stop(deadline=time.monotonic())
+        thread = _run(sink)
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+        assert len(sink.batches) <= 1
+
+    def test_csv_batch_is_all_or_nothing(self, tmp_path, monkeypatch):
+        """寫到一半失敗時截回原長度，重試同一批不會重複寫入"""
+        monkeypatch.chdir(tmp_path)
+        backup = BackupManager("site")
+        backup.start()
+        backup.file = _FlakyFile(backup.file)
+        sink = CsvSink(backup, batch_size=10, retry_delay=0.01)
+        sink.started = True
+        for i in range(10):
+            sink.offer(_record(i))
+        assert sink.finish(time.monotonic() + 5) == 0
+        assert sink.counters['errors'] == 1 and sink.counters['written'] == 10
+
+        lines = next(tmp_path.glob("backups/site_*.csv")).read_text(encoding='utf-8-sig').strip().splitlines()
+        assert lines[0].startswith("timestamp,") and len(lines) == 11
+        assert len(set(lines)) == 11
+
+    def test_local_failures_are_reported_on_shutdown(self, fake_firebase, cfg, tmp_path, monkeypatch):
+        """CSV 無法寫入時，status/shutdown 記錄未寫入筆數，且不標記為 clean"""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "backups").write_text("not a folder")
+        fake = fake_firebase
+        cfg.DRAIN_TIMEOUT = 1.0
+
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=MagicMock(), conc=MagicMock())
+            csv_sink = next(sink for sink in process.sinks if sink.name == 'csv')
+            csv_sink.retry_delay, csv_sink.max_retries = 0.01, 1
+            for i in range(5):
+                process._emit(_record(i))
+            report = process.stop()
+
+        assert report['local_dropped'] == {'csv': 5}
+        assert report['clean'] is False
+        assert fake.reference('site/status/shutdown/local_dropped').get() == {'csv': 5}
@@ -0,0 +1,15 @@
+import pytest
+
+from SoakTest import SoakHarness
+
+class TestSoakTest:
+
+    def test_start_stop_and_switch_do_not_leak(self, tmp_path):
+        """短版壓力測試：60 次啟停 (含 6 次專案切換) 後執行緒、FD 與監聽器不再成長"""
+        harness = SoakHarness(cycles=60, switch_every=10, sample_every=20, workdir=str(tmp_path))
+        report = harness.run()
+        SoakHarness.assert_bounded(report, max_threads=3, max_fds=10, max_rss_mb=30.0)
+
+        assert report['latency']['start_stop']['count'] == 54
+        assert report['latency']['switch']['count'] == 6
+        assert report['latency']['start_stop']['p95'] < 2.0
@@ -0,0 +1,249 @@
+import pytest
+import queue
+import threading
+import time
+
+from unittest.mock import patch, MagicMock
+from Procedure.FakeDatabase import FakeDatabase
+from Process import RunProcess, Supervisor
+
+def _record(i):
+    return {"timestamp": f"2026-01-06 12:{i // 60:02d}:{i % 60:02d}", "lat": 25.0, "lon": 121.5 + i * 1e-4,
+            "alt": 0, "status": "A"}
+
+class _Reader:
+    """只有佇列的假讀取器 (GPS 資料預先放入)"""
+    def __init__(self, records=()):
+        self.gps_queue = self.conc_queue = queue.Queue()
+        self.unit = "ppm"
+        self.running = False
+        self.thread = None
+        for r in records:
+            self.gps_queue.put(r)
+
+    def run(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+class _SlowDatabase(FakeDatabase):
+    """
+    寫入 history 的 multi-path update 每筆需要 delay 秒，模擬網路緩慢；fail_pushes 次寫入會拋出例外，
+    lost_replies 次寫入成功後仍拋出例外 (模擬回應逾時)
+    """
+    def __init__(self, delay=0.0, fail_pushes=0, lost_replies=0):
+        super().__init__()
+        self.delay = delay
+        self.fail_pushes = fail_pushes
+        self.lost_replies = lost_replies
+
+    def reference(self, path='/'):
+        ref = super().reference(path)
+        write = ref.update
+
+        def slow_update(value):
+            records = sum(1 for k in value if k.startswith('history/'))
+            if not records:
+                return write(value)
+            if self.fail_pushes:
+                self.fail_pushes -= 1
+                raise ConnectionError("模擬斷線")
+            time.sleep(self.delay * records)
+            write(value)
+            if self.lost_replies:
+                self.lost_replies -= 1
+                raise TimeoutError("模擬回應逾時")
+        ref.update = slow_update
+        return ref
+
+class TestSupervisor:
+
+    @pytest.fixture
+    def clock(self):
+        return MagicMock(return_value=0.0)
+
+    def _wait(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_restart_with_backoff(self, clock):
+        """失敗後依 1、2 秒退避重啟，正常結束的工作者不會重啟"""
+        calls, release = [], threading.Event()
+
+        def flaky():
+            calls.append(clock())
+            if len(calls) <= 2:
+                raise RuntimeError("boom")
+            release.wait(5)
+
+        sv = Supervisor(clock=clock)
+        worker = sv.spawn('flaky', flaky)
+        done = sv.spawn('done', lambda: None)
+        assert self._wait(lambda: not worker.alive() and not done.alive())
+
+        assert sv.poll() is True
+        assert worker.next_restart == 1.0
+        clock.return_value = 1.0
+        sv.poll()
+        assert self._wait(lambda: len(calls) == 2 and not worker.alive())
+        sv.poll()
+        assert worker.next_restart == 3.0     # 第二次失敗退避 2 秒
+        clock.return_value = 3.0
+        sv.poll()
+        assert self._wait(lambda: len(calls) == 3)
+
+        assert (worker.restarts, done.restarts) == (2, 0)
+        assert sv.report() == {'flaky': {'restarts': 2, 'last_error': 'boom'}}
+        release.set()
+
+    def test_gives_up_and_watches_readers(self, clock):
+        sv = Supervisor(max_restarts=1, clock=clock)
+        reader = _Reader()
+        reader.running = True
+        reader.thread = threading.Thread(target=lambda: None)
+        reader.thread.start()
+        reader.thread.join()
+        sv.watch('gps', reader)
+
+        assert sv.poll() is True                # 第 1 次失敗：排程重啟
+        clock.return_value = 1.0
+        sv.poll()
+        assert sv.workers['gps'].restarts == 1
+        assert sv.poll() is False               # 重啟後仍未恢復：超過上限
+        assert sv.gave_up == 'gps'
+
+        reader.running = False                  # 讀取器主動結束不算失敗
+        assert Supervisor(clock=clock).watch('conc', reader).alive() is True
+
+    def test_stop_drains_queues(self, cfg, tmp_path, monkeypatch):
+        """停止時 GPS 佇列與上傳佇列中的資料全部送到 Firebase 與備份"""
+        monkeypatch.chdir(tmp_path)
+        fake = _SlowDatabase(delay=0.002)
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=_Reader([_record(i) for i in range(200)]), conc=_Reader())
+            thread = threading.Thread(target=process.run)
+            thread.start()
+            self._wait(lambda: len(fake.reference('site/history').get() or {}) > 0)
+            report = process.stop()
+            thread.join(timeout=5)
+
+        assert not thread.is_alive()
+        assert len(fake.reference('site/history').get()) == 200
+        assert report['dropped'] == 0 and report['clean'] is True
+        assert fake.reference('site/status/shutdown').get()['dropped'] == 0
+        rows = next((tmp_path / "backups").glob("site_*.csv")).read_text(encoding='utf-8').strip().splitlines()
+        assert len(rows) == 201
+
+    def test_stop_during_stationary_stretch_uploads_last_position(self, cfg, tmp_path, monkeypatch):
+        """停在靜止路段：死區過濾暫存的最後一筆在停止時補傳，Firebase 保留最後位置"""
+        monkeypatch.chdir(tmp_path)
+        cfg.UPLOAD_FILTER_ENABLED = True
+        cfg.UPLOAD_MIN_DISTANCE_M, cfg.UPLOAD_MIN_CONC_DELTA, cfg.UPLOAD_HEARTBEAT_SEC = 3.0, 1.0, 300.0
+        stationary = [dict(_record(i), lon=121.5) for i in range(30)]
+        fake = _SlowDatabase()
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=_Reader(stationary), conc=_Reader())
+            thread = threading.Thread(target=process.run)
+            thread.start()
+            self._wait(lambda: len(fake.reference('site/history').get() or {}) > 0)
+            report = process.stop()
+            thread.join(timeout=5)
+
+        uploaded = sorted(r['timestamp'] for r in fake.reference('site/history').get().values())
+        assert uploaded == ["2026-01-06 12:00:00", "2026-01-06 12:00:29"]
+        assert report['clean'] is True
+
+    def test_drain_deadline(self, cfg, tmp_path, monkeypatch):
+        """上傳太慢時最多等待 DRAIN_TIMEOUT 秒，未上傳筆數記錄於 status/shutdown"""
+        monkeypatch.chdir(tmp_path)
+        cfg.DRAIN_TIMEOUT = 0.3
+        fake = _SlowDatabase(delay=0.05)
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=_Reader([_record(i) for i in range(200)]), conc=_Reader())
+            process.fb.batch_size = 5
+            thread = threading.Thread(target=process.run)
+            thread.start()
+            self._wait(lambda: len(fake.reference('site/history').get() or {}) > 0)
+            started = time.monotonic()
+            report = process.stop()
+            elapsed = time.monotonic() - started
+            thread.join(timeout=5)
+            uploader = process.supervisor.thread('firebase')
+            uploader.join(timeout=5)    # 期限到時可能仍有一批正在上傳，寫完後才結束
+
+        assert elapsed < 1.5
+        assert report['dropped'] > 0 and report['clean'] is False
+        assert not uploader.is_alive()
+        assert len(fake.reference('site/history').get()) + report['dropped'] == 200
+        assert fake.reference('site/status/shutdown').get()['clean'] is False
+
+    def test_firebase_loop_restarts_after_crash(self, cfg, tmp_path, monkeypatch):
+        """上傳迴圈拋出例外後重新啟動，之後的資料照常上傳"""
+        monkeypatch.chdir(tmp_path)
+        fake = _SlowDatabase(fail_pushes=1)
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=_Reader([_record(i) for i in range(20)]), conc=_Reader())
+            process.supervisor.backoff_base = 0.05
+            process.supervise_interval = 0.02
+            thread = threading.Thread(target=process.run)
+            thread.start()
+            # 失敗的那一筆放回佇列最前面，重新啟動後補送，20 筆全部到達
+            assert self._wait(lambda: len(fake.reference('site/history').get() or {}) == 20)
+            report = process.stop()
+            thread.join(timeout=5)
+
+        assert report['workers'] == {'firebase': {'restarts': 1, 'last_error': '模擬斷線'}}
+        assert fake.reference('site/status/state').get() == 'offline'
+        uploaded = sorted(r['timestamp'] for r in fake.reference('site/history').get().values())
+        assert uploaded == [_record(i)['timestamp'] for i in range(20)]
+
+    def test_retry_after_lost_reply_does_not_duplicate(self, cfg, tmp_path, monkeypatch):
+        """已寫入但回應逾時：重新啟動後以同一 key 重送，history 不會多出重複紀錄"""
+        monkeypatch.chdir(tmp_path)
+        fake = _SlowDatabase(lost_replies=1)
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=_Reader([_record(i) for i in range(20)]), conc=_Reader())
+            process.supervisor.backoff_base = 0.05
+            process.supervise_interval = 0.02
+            thread = threading.Thread(target=process.run)
+            thread.start()
+            assert self._wait(lambda: process.fb.uploaded == 20)
+            report = process.stop()
+            thread.join(timeout=5)
+
+        assert report['workers'] == {'firebase': {'restarts': 1, 'last_error': '模擬回應逾時'}}
+        uploaded = sorted(r['timestamp'] for r in fake.reference('site/history').get().values())
+        assert uploaded == [_record(i)['timestamp'] for i in range(20)]
+
+    def test_merger_error_is_restarted_by_supervisor(self, cfg, tmp_path, monkeypatch):
+        """合併執行緒的例外交給 Supervisor 重新啟動並記錄，之後的資料照常處理"""
+        monkeypatch.chdir(tmp_path)
+        fake = _SlowDatabase()
+        with patch('Procedure.FirebaseManager.db.reference', new=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=_Reader([_record(i) for i in range(20)]), conc=_Reader())
+            process.supervisor.backoff_base = 0.05
+            process.supervise_interval = 0.02
+            emit = process._emit
+            failures = [RuntimeError("合併失敗")]
+
+            def flaky_emit(data):
+                if failures:
+                    raise failures.pop()
+                emit(data)
+            process._emit = flaky_emit
+            thread = threading.Thread(target=process.run)
+            thread.start()
+            assert self._wait(lambda: len(fake.reference('site/history').get() or {}) == 19)
+            report = process.stop()
+            thread.join(timeout=5)
+
+        assert report['workers'] == {'merger': {'restarts': 1, 'last_error': '合併失敗'}}
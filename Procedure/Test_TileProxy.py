@@ -0,0 +1,180 @@
+import pytest
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Procedure.TileProxy import TileCache, TileProxy, lonlat_to_tile, tiles_for_bbox
+
+class _StandInTiles:
+    """本地假圖磚伺服器：回傳內容為 z/x/y 字串 (補足 size 位元組)，並記錄請求"""
+    def __init__(self, size=100):
+        stand_in = self
+        self.size = size
+        self.requests = []
+        self.missing = set()        # 回應 404 的路徑
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.requests.append(self.path)
+                if self.path in stand_in.missing:
+                    self.send_error(404)
+                    return
+                body = self.path.encode().ljust(stand_in.size, b'.')
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _get(proxy, z, x, y):
+    with urllib.request.urlopen(f"http://127.0.0.1:{proxy.port}/{z}/{x}/{y}.png", timeout=5) as resp:
+        return resp.read(), resp.headers['X-Cache']
+
+class TestTileProxy:
+
+    @pytest.fixture
+    def upstream(self):
+        server = _StandInTiles()
+        yield server
+        server.stop()
+
+    @pytest.fixture
+    def proxy(self, upstream, tmp_path):
+        proxy = TileProxy(cache_dir=str(tmp_path / "tiles"), upstream=upstream.url, port=0,
+                          prefetch_zooms=[16], prefetch_margin=1, timeout=1.0)
+        proxy.start()
+        yield proxy
+        proxy.stop()
+
+    def test_tile_math(self):
+        assert lonlat_to_tile(0.0, 0.0, 1) == (1, 1)
+        assert lonlat_to_tile(25.0330, 121.5654, 17) == (109796, 56117)
+        tiles = tiles_for_bbox((25.0330, 121.5654, 25.0330, 121.5654), 17, margin=1)
+        assert len(tiles) == 9 and (17, 109796, 56117) in tiles
+
+    def test_cache_then_serve_offline(self, proxy, upstream):
+        """第一次向上游取得，之後由快取提供；上游停止後已快取的圖磚仍可取得"""
+        body, state = _get(proxy, 16, 54899, 28054)
+        assert (body[:16], state) == (b"/16/54899/28054.", 'MISS')
+        assert _get(proxy, 16, 54899, 28054)[1] == 'HIT'
+        assert len(upstream.requests) == 1
+
+        upstream.stop()
+        assert _get(proxy, 16, 54899, 28054)[1] == 'HIT'
+        started = time.monotonic()
+        with pytest.raises(urllib.error.HTTPError):
+            _get(proxy, 16, 1, 1)
+        assert proxy.is_offline()
+        with pytest.raises(urllib.error.HTTPError):
+            _get(proxy, 16, 1, 2)            # 離線期間不再等待上游逾時
+        assert time.monotonic() - started < 3.0
+
+    def test_lru_eviction_and_reload(self, tmp_path):
+        cache = TileCache(str(tmp_path), max_bytes=250)
+        for y in range(3):
+            cache.put(10, 1, y, b"x" * 100)
+            time.sleep(0.01)
+        assert len(cache) == 2 and (10, 1, 0) not in cache
+        cache.get(10, 1, 1)                  # 最近使用，保留
+        time.sleep(0.01)
+        cache.put(10, 1, 3, b"x" * 100)
+        assert sorted(cache.entries) == [(10, 1, 1), (10, 1, 3)]
+        assert not (tmp_path / "10" / "1" / "2.png").exists()
+
+        reloaded = TileCache(str(tmp_path), max_bytes=150)     # 重新啟動且上限變小
+        assert list(reloaded.entries) == [(10, 1, 3)]
+        assert reloaded.total_bytes == 100
+
+    def _wait(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return condition()
+
+    def test_prefetch_track_area(self, proxy, upstream):
+        """點位進入新區域時預載周圍圖磚，已預載區域內的新點位不會重複觸發"""
+        proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+        assert self._wait(lambda: proxy.counters['prefetched'] == 9 and proxy.covered)
+        assert proxy.covered == {lonlat_to_tile(25.0330, 121.5654, 16)}
+
+        proxy.observe({'lat': 25.0331, 'lon': 121.5655})
+        proxy.observe({'lat': None, 'lon': None})
+        time.sleep(0.2)
+        assert len(upstream.requests) == 9
+        assert _get(proxy, *tiles_for_bbox((25.0330, 121.5654, 25.0330, 121.5654), 16, margin=0)[0])[1] == 'HIT'
+
+    def test_capped_prefetch_starts_at_current_position(self, proxy, upstream):
+        """超過 max_prefetch 時先下載目前位置附近，區域補齊後才標記為已預載"""
+        proxy.max_prefetch = 5
+        with proxy.lock:
+            proxy.segment[(16, 0, 0)] = (25.0, 121.0)       # 較早的軌跡點
+        proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+        current = set(tiles_for_bbox((25.0330, 121.5654, 25.0330, 121.5654), 16, margin=1))
+        assert self._wait(lambda: proxy.counters['prefetched'] == 5)
+        time.sleep(0.1)
+        assert all(t in current for t in proxy.cache.entries)
+        assert not proxy.covered
+
+        proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+        assert self._wait(lambda: lonlat_to_tile(25.0330, 121.5654, 16) in proxy.covered)
+        assert current <= set(proxy.cache.entries)
+
+    def test_upstream_error_is_not_marked_covered(self, proxy, upstream):
+        """上游回應錯誤的圖磚缺漏時不標記為已預載，且在 offline_backoff 內不重試"""
+        x, y = lonlat_to_tile(25.0330, 121.5654, 16)
+        upstream.missing.add(f"/16/{x}/{y}.png")
+        proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+        assert self._wait(lambda: proxy.counters['prefetched'] == 8)
+        time.sleep(0.1)
+        assert not proxy.covered and len(upstream.requests) == 9
+
+        proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+        time.sleep(0.2)
+        assert len(upstream.requests) == 9
+
+    def test_evicted_area_is_prefetched_again(self, upstream, tmp_path):
+        """快取淘汰了已預載區域的圖磚：該區域取消已預載標記，再經過時重新下載"""
+        proxy = TileProxy(cache_dir=str(tmp_path / "tiles"), max_bytes=1000, upstream=upstream.url, port=0,
+                          prefetch_zooms=[16], prefetch_margin=1, timeout=1.0)
+        proxy.start()
+        try:
+            home = lonlat_to_tile(25.0330, 121.5654, 16)
+            proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+            assert self._wait(lambda: home in proxy.covered)
+
+            proxy.observe({'lat': 25.1, 'lon': 121.7})     # 另一個區域的 9 張擠掉先前的圖磚
+            assert self._wait(lambda: lonlat_to_tile(25.1, 121.7, 16) in proxy.covered)
+            assert home not in proxy.covered
+
+            proxy.observe({'lat': 25.0330, 'lon': 121.5654})
+            assert self._wait(lambda: home in proxy.covered)
+            assert len(upstream.requests) == 26      # 仍在快取中的 1 張不重新下載
+        finally:
+            proxy.stop()
+
+    def test_failed_tiles_expire(self, proxy, upstream):
+        """上游回應錯誤的紀錄只保留 offline_backoff 秒內的，不會無限增加"""
+        proxy.offline_backoff = 0.05
+        for y in range(5):
+            upstream.missing.add(f"/16/1/{y}.png")
+            assert proxy.tile(16, 1, y) == (None, 'MISS')
+        assert len(proxy.failed) <= 5
+        time.sleep(0.1)
+        upstream.missing.add("/16/1/9.png")
+        proxy.tile(16, 1, 9)
+        assert list(proxy.failed) == [(16, 1, 9)]
+        assert proxy.stats()['errors'] == 6
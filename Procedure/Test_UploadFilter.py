@@ -0,0 +1,99 @@
+import pytest
+
+from unittest.mock import patch, MagicMock
+from Process import RunProcess
+from Procedure.UploadFilter import DeadbandFilter, distance_m
+
+def _record(i, lat=25.0, lon=121.5, conc=10.0, status="A"):
+    return {"timestamp": f"2026-01-06 12:{i // 60:02d}:{i % 60:02d}", "lat": lat, "lon": lon,
+            "alt": 0, "conc": conc, "conc_unit": "ppm", "status": status}
+
+class TestUploadFilter:
+
+    @pytest.fixture
+    def clock(self):
+        class Clock:
+            now = 0.0
+            def __call__(self):
+                return self.now
+        return Clock()
+
+    @pytest.fixture
+    def dead_band(self, clock):
+        return DeadbandFilter(min_distance_m=3.0, min_conc_delta=1.0, heartbeat_sec=30.0,
+                              thresholds=[50, 100, 150], clock=clock)
+
+    def test_distance(self):
+        # 緯度 0.0001 度約 11 公尺
+        assert 10 < distance_m(25.0, 121.5, 25.0001, 121.5) < 12
+
+    def test_stationary_session_is_compressed(self, dead_band, clock):
+        """站立 10 分鐘、濃度小幅波動：只留心跳，寫入量大幅減少"""
+        sent = []
+        for i in range(600):
+            clock.now = i
+            sent += dead_band.offer(_record(i, lat=25.0 + (i % 3) * 1e-6, conc=10.0 + (i % 5) * 0.1))
+        assert len(sent) == 20
+        assert dead_band.ratio() < 0.05
+        assert dead_band.flush()[0]['timestamp'].endswith("09:59")
+
+    def test_walking_keeps_track_shape(self, dead_band, clock):
+        """每秒移動約 1.1 公尺：約每 3 秒上傳一筆"""
+        sent = []
+        for i in range(60):
+            clock.now = i
+            sent += dead_band.offer(_record(i, lat=25.0 + i * 1e-5))
+        assert 15 <= len(sent) <= 25
+        assert sent[0]['timestamp'].endswith("00:00")
+
+    def test_status_change_and_threshold_always_sent(self, dead_band, clock):
+        """狀態變化與跨越閾值不受死區影響"""
+        dead_band.offer(_record(0, conc=49.5))
+        clock.now = 1
+        assert dead_band.offer(_record(1, conc=49.6)) == []
+        clock.now = 2
+        crossing = dead_band.offer(_record(2, conc=50.1))
+        assert [r['conc'] for r in crossing] == [50.1]
+
+        clock.now = 3
+        lost = dead_band.offer(_record(3, conc=50.1, status="GPS Lost"))
+        assert [r['status'] for r in lost] == ["GPS Lost"]
+
+    def test_heartbeat(self, dead_band, clock):
+        dead_band.offer(_record(0))
+        clock.now = 29
+        assert dead_band.offer(_record(29)) == []
+        clock.now = 30
+        assert len(dead_band.offer(_record(30))) == 1
+
+    def test_thresholds_follow_settings(self, dead_band, clock):
+        dead_band.set_thresholds(['20', None, 40])
+        dead_band.offer(_record(0, conc=19.5))
+        clock.now = 1
+        assert len(dead_band.offer(_record(1, conc=20.2))) == 1
+
+    def test_backup_keeps_full_rate(self, fake_firebase, cfg, tmp_path, monkeypatch):
+        """Firebase 佇列只收到壓縮後的紀錄，本地備份仍保留每一筆"""
+        monkeypatch.chdir(tmp_path)
+        fake = fake_firebase
+        fake.reference('site/settings/thresholds').set({'a': 5, 'b': 100, 'c': 150})
+        cfg.UPLOAD_FILTER_ENABLED = True
+        cfg.UPLOAD_MIN_DISTANCE_M, cfg.UPLOAD_MIN_CONC_DELTA, cfg.UPLOAD_HEARTBEAT_SEC = 3.0, 1.0, 30.0
+
+        with patch('Procedure.FirebaseManager.db.reference', side_effect=fake.reference), \
+             patch('Procedure.FirebaseManager.firebase_admin._apps', {'[DEFAULT]': object()}):
+            process = RunProcess(cfg, gps=MagicMock(), conc=MagicMock())
+            process._watch_thresholds()
+            for i in range(120):
+                process._emit(_record(i, conc=4.8 if i < 100 else 5.2))
+            process.stop()
+
+        uploaded = []
+        while not cfg.SHARED_QUEUE.empty():
+            uploaded.append(cfg.SHARED_QUEUE.get_nowait())
+        uploaded = [r for r in uploaded if r]
+        rows = next((tmp_path / "backups").glob("site_*.csv")).read_text(encoding='utf-8').strip().splitlines()
+        assert len(rows) == 121
+        # 首筆、跨越閾值 5 的那一筆與停止時補上的最後一筆，其餘皆被略過
+        assert [r['timestamp'][-5:] for r in uploaded] == ["00:00", "01:40", "01:59"]
+        assert process.fb.last_activity > 0
@@ -0,0 +1,386 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+OSM_TILES = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+_TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+def lonlat_to_tile(lat, lon, zoom):
+    """經緯度 → 圖磚座標 (Web Mercator / slippy map)"""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_for_bbox(bbox, zoom, margin=1):
+    """bbox = (min_lat, min_lon, max_lat, max_lon)，回傳涵蓋範圍 (外擴 margin 格) 的所有圖磚"""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    x0, y0 = lonlat_to_tile(max_lat, min_lon, zoom)     # 左上
+    x1, y1 = lonlat_to_tile(min_lat, max_lon, zoom)     # 右下
+    n = 2 ** zoom
+    return [(zoom, x, y)
+            for x in range(max(x0 - margin, 0), min(x1 + margin, n - 1) + 1)
+            for y in range(max(y0 - margin, 0), min(y1 + margin, n - 1) + 1)]
+
+class TileCache:
+    """
+    以檔案大小為上限的 LRU 圖磚磁碟快取 ({cache_dir}/{z}/{x}/{y}.png)
+    - 啟動時依檔案修改時間重建 LRU 順序，讀取時更新修改時間
+    - 寫入先寫暫存檔再 rename，中斷不會留下半張圖
+    - on_evict(keys) 於 LRU 淘汰圖磚後呼叫 (不持有快取的 lock)
+    """
+    def __init__(self, cache_dir="tiles", max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # (z, x, y) -> 大小，最舊的在前
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.on_evict = None
+        self._load()
+
+    def _path(self, z, x, y):
+        return os.path.join(self.cache_dir, str(z), str(x), f"{y}.png")
+
+    def _load(self):
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                parts = os.path.relpath(path, self.cache_dir).split(os.sep)
+                if len(parts) != 3:
+                    continue
+                try:
+                    st = os.stat(path)
+                    key = (int(parts[0]), int(parts[1]), int(parts[2][:-4]))
+                except (OSError, ValueError):
+                    continue
+                found.append((st.st_mtime, key, st.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def touch(self, key):
+        """標記為最近使用 (不讀取內容)，回傳是否在快取中"""
+        with self.lock:
+            if key not in self.entries:
+                return False
+            self.entries.move_to_end(key)
+        try:
+            os.utime(self._path(*key))
+        except OSError:
+            pass
+        return True
+
+    def get(self, z, x, y):
+        key = (z, x, y)
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        try:
+            path = self._path(z, x, y)
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+            return None
+
+    def put(self, z, x, y, data):
+        path = self._path(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop((z, x, y), 0)
+            self.entries[(z, x, y)] = len(data)
+            evicted = self._evict()
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
+
+    def _evict(self):
+        evicted = []
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            evicted.append(key)
+            try:
+                os.remove(self._path(*key))
+            except OSError:
+                pass
+        return evicted
+
+class _Handler(BaseHTTPRequestHandler):
+    proxy = None
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/stats':
+            self._respond(200, json.dumps(self.proxy.stats()).encode(), 'application/json')
+            return
+        match = _TILE_PATH.match(path)
+        if not match:
+            self._respond(404, b'Not Found', 'text/plain')
+            return
+        data, source = self.proxy.tile(*(int(v) for v in match.groups()))
+        if data is None:
+            self._respond(404, b'Tile not cached', 'text/plain')
+        else:
+            self._respond(200, data, 'image/png', source)
+
+    def _respond(self, code, body, content_type, cache_state=None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if cache_state:
+            self.send_header('X-Cache', cache_state)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TileProxy:
+    """
+    本機地圖圖磚代理 (GET /{z}/{x}/{y}.png，網頁以 tiles 參數指定)：
+    - 先查 TileCache，沒有才向上游 (預設 OpenStreetMap) 取得並寫入快取
+    - 上游連線失敗時進入離線狀態 offline_backoff 秒，期間只回傳快取內容，不再等待逾時
+    - observe() 接收每筆資料，點位進入尚未預載完成的區域時，於背景下載該點周圍 (外擴 prefetch_margin 格)
+      prefetch_zooms 各層的圖磚；最近一段軌跡依新到舊排序，目前位置最先下載
+    - 區域的圖磚全部取得後才標記為已預載；被 max_prefetch 截斷或上游回應錯誤的區域之後會再補抓
+      (回應錯誤的圖磚在 offline_backoff 秒內不重試)；快取淘汰圖磚時，涵蓋該圖磚的區域取消已預載標記
+    - GET /stats 回傳命中、未命中、預載與快取大小
+    註: 預載會增加上游流量，請遵守圖磚服務的使用規範 (max_prefetch 限制單次最多下載張數)
+    """
+    def __init__(self, cache_dir="tiles", max_bytes=500 * 1024 * 1024, upstream=OSM_TILES,
+                 host="127.0.0.1", port=8090, prefetch_zooms=(15, 16, 17), prefetch_margin=1,
+                 max_prefetch=2000, timeout=5.0, offline_backoff=30.0, user_agent="gps-frontend-tile-proxy/1.0"):
+        self.cache = TileCache(cache_dir, max_bytes)
+        self.upstream = upstream
+        self.host = host
+        self.port = port
+        self.prefetch_zooms = list(prefetch_zooms)
+        self.prefetch_margin = prefetch_margin
+        self.max_prefetch = max_prefetch
+        self.timeout = timeout
+        self.offline_backoff = offline_backoff
+        self.user_agent = user_agent
+        self.offline_until = 0.0
+        self.counters = {'hits': 0, 'misses': 0, 'errors': 0, 'prefetched': 0}     # 由 HTTP 與預載執行緒更新，受 lock 保護
+        self.segment = OrderedDict()    # 待預載的最近軌跡：區域 (最大層級圖磚) -> 最新點位，最新的在後
+        self.max_segment = 256
+        self.covered = set()            # 周圍圖磚已全部取得的區域
+        self.failed = OrderedDict()     # 上游回應錯誤的圖磚 -> 時間 (monotonic)，最舊的在前，只保留 offline_backoff 秒內的
+        self.server = None
+        self.thread = None
+        self.prefetch_thread = None
+        self.prefetch_wake = threading.Event()
+        self.running = False
+        self.lock = threading.Lock()
+        self.cache.on_evict = self._on_evict
+
+    @property
+    def url(self):
+        return f"http://{'localhost' if self.host in ('0.0.0.0', '127.0.0.1') else self.host}:{self.port}/{{z}}/{{x}}/{{y}}.png"
+
+    def start(self):
+        if self.running:
+            return
+        handler = type('TileHandler', (_Handler,), {'proxy': self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.running = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="tile-proxy", daemon=True)
+        self.thread.start()
+        self.prefetch_thread = threading.Thread(target=self._prefetch_loop, name="tile-prefetch", daemon=True)
+        self.prefetch_thread.start()
+        logger.info(f"🗺️ 圖磚代理已啟動: {self.url} (快取 {len(self.cache)} 張)")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.prefetch_wake.set()
+        self.server.shutdown()
+        self.server.server_close()
+        for t in (self.thread, self.prefetch_thread):
+            if t:
+                t.join(timeout=5)
+        logger.info(f"🗺️ 圖磚代理已關閉 ({self._format_stats()})")
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return dict(counters, tiles=len(self.cache), cache_mb=round(self.cache.total_bytes / 1024 / 1024, 2),
+                    offline=self.is_offline())
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def _mark_failed(self, tile):
+        now = time.monotonic()
+        with self.lock:
+            self.failed.pop(tile, None)
+            self.failed[tile] = now
+            while self.failed and now - next(iter(self.failed.values())) >= self.offline_backoff:
+                self.failed.popitem(last=False)
+
+    def _format_stats(self):
+        c = self.stats()
+        return f"命中 {c['hits']} / 未命中 {c['misses']} / 預載 {c['prefetched']} / 失敗 {c['errors']}"
+
+    def is_offline(self):
+        return time.monotonic() < self.offline_until
+
+    def _fetch(self, z, x, y):
+        """向上游取得圖磚並寫入快取；失敗時標記離線並回傳 None"""
+        if self.is_offline():
+            return None
+        url = self.upstream.format(z=z, x=x, y=y, s='a')
+        request = urllib.request.Request(url, headers={'User-Agent': self.user_agent})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                data = resp.read()
+        except urllib.error.HTTPError as e:
+            self._count('errors')
+            self._mark_failed((z, x, y))
+            logger.debug(f"圖磚 {z}/{x}/{y} 上游回應 {e.code}")
+            return None
+        except (urllib.error.URLError, OSError) as e:
+            self._count('errors')
+            self.offline_until = time.monotonic() + self.offline_backoff
+            logger.warning(f"⚠️ 圖磚上游無法連線，{self.offline_backoff:.0f} 秒內只使用快取: {e}")
+            return None
+        with self.lock:
+            self.failed.pop((z, x, y), None)
+        try:
+            self.cache.put(z, x, y, data)
+        except OSError as e:
+            logger.error(f"圖磚快取寫入失敗: {e}")
+        return data
+
+    def tile(self, z, x, y):
+        """回傳 (圖磚內容, 'HIT' | 'MISS')，取不到時內容為 None"""
+        data = self.cache.get(z, x, y)
+        if data is not None:
+            self._count('hits')
+            return data, 'HIT'
+        self._count('misses')
+        return self._fetch(z, x, y), 'MISS'
+
+    def _area(self, lat, lon):
+        """點位周圍 (外擴 margin 格) 在各預載層級的圖磚"""
+        return [t for z in self.prefetch_zooms for t in tiles_for_bbox((lat, lon, lat, lon), z, self.prefetch_margin)]
+
+    def _recently_failed(self, tile):
+        with self.lock:
+            failed_at = self.failed.get(tile)
+        return failed_at is not None and time.monotonic() - failed_at < self.offline_backoff
+
+    def _on_evict(self, tiles):
+        """快取淘汰圖磚：涵蓋這些圖磚的區域 (最大層級 cell 往上對應，誤差 prefetch_margin 格內) 不再視為已預載"""
+        if not self.prefetch_zooms:
+            return
+        top = max(self.prefetch_zooms)
+        margin = self.prefetch_margin
+        evicted = [(top - z, x, y) for z, x, y in tiles if z in self.prefetch_zooms]
+        with self.lock:
+            self.covered = {cell for cell in self.covered
+                            if not any(abs((cell[0] >> d) - x) <= margin and abs((cell[1] >> d) - y) <= margin
+                                       for d, x, y in evicted)}
+
+    def observe(self, record):
+        """接收一筆資料 (由 RunProcess 呼叫)：點位所在區域尚未預載完成時喚醒背景預載"""
+        lat, lon = record.get('lat'), record.get('lon')
+        if lat is None or lon is None or not self.prefetch_zooms:
+            return
+        cell = lonlat_to_tile(lat, lon, max(self.prefetch_zooms))
+        with self.lock:
+            if cell in self.covered:
+                return
+            self.segment.pop(cell, None)
+            self.segment[cell] = (lat, lon)
+            while len(self.segment) > self.max_segment:
+                self.segment.popitem(last=False)
+        self.prefetch_wake.set()
+
+    def prefetch(self, points):
+        """下載各點位周圍尚未快取的圖磚 (最後一個點位優先)，回傳下載張數"""
+        wanted = []
+        seen = set()
+        for lat, lon in reversed(points):
+            for t in self._area(lat, lon):
+                # 已快取的圖磚標記為最近使用，補抓同區域其他圖磚時不會先把它們淘汰
+                if t not in seen and not self.cache.touch(t) and not self._recently_failed(t):
+                    seen.add(t)
+                    wanted.append(t)
+        if len(wanted) > self.max_prefetch:
+            logger.warning(f"⚠️ 預載需要 {len(wanted)} 張圖磚，本次只下載目前位置附近的 {self.max_prefetch} 張")
+            wanted = wanted[:self.max_prefetch]
+        fetched = 0
+        for z, x, y in wanted:
+            if not self.running or self.is_offline():
+                break
+            if self._fetch(z, x, y) is not None:
+                fetched += 1
+        self._count('prefetched', fetched)
+        if fetched:
+            logger.info(f"🗺️ 已預載 {fetched} 張圖磚 (快取 {len(self.cache)} 張)")
+        return fetched
+
+    def _prefetch_loop(self):
+        while self.running:
+            self.prefetch_wake.wait()
+            self.prefetch_wake.clear()
+            if not self.running:
+                break
+            if self.is_offline():
+                continue
+            with self.lock:
+                segment, self.segment = self.segment, OrderedDict()
+            if not segment:
+                continue
+            try:
+                self.prefetch(list(segment.values()))
+            except Exception as e:
+                logger.error(f"❌ 圖磚預載失敗: {e}")
+            # 圖磚全部取得的區域才標記為已預載，其餘放回待預載 (排在之後收到的點位之前)
+            with self.lock:
+                pending = OrderedDict()
+                for cell, (lat, lon) in segment.items():
+                    if all(t in self.cache for t in self._area(lat, lon)):
+                        self.covered.add(cell)
+                    elif cell not in self.segment:
+                        pending[cell] = (lat, lon)
+                pending.update(self.segment)
+                while len(pending) > self.max_segment:
+                    pending.popitem(last=False)
+                self.segment = pending
@@ -0,0 +1,85 @@
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """兩點距離 (公尺)，短距離以等距長方投影近似即可"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6371000.0
+
+class DeadbandFilter:
+    """
+    上傳前的死區 (dead-band) 壓縮：
+    - 與上次上傳的紀錄相比，移動小於 min_distance_m 且濃度變化小於 min_conc_delta 時略過
+    - 狀態改變、濃度跨越閾值、距上次上傳超過 heartbeat_sec 時一律上傳
+    - 資料流結束時 flush() 補上最後一筆被略過的紀錄，保留最後位置
+    offer() 回傳本次應上傳的紀錄清單 (可能為空)；本地備份不經過此過濾
+    """
+    def __init__(self, min_distance_m=3.0, min_conc_delta=1.0, heartbeat_sec=30.0,
+                 thresholds=None, clock=time.monotonic):
+        self.min_distance_m = min_distance_m
+        self.min_conc_delta = min_conc_delta
+        self.heartbeat_sec = heartbeat_sec
+        self.thresholds = sorted(thresholds or [])
+        self.clock = clock
+        self.last_sent = None
+        self.last_sent_time = 0.0
+        self.held = None
+        self.stats = {'received': 0, 'sent': 0, 'suppressed': 0}
+
+    def set_thresholds(self, values):
+        self.thresholds = sorted(float(v) for v in values if v is not None)
+
+    def _level(self, conc):
+        return sum(1 for t in self.thresholds if conc >= t)
+
+    def _is_significant(self, data, now):
+        prev = self.last_sent
+        if prev is None or now - self.last_sent_time >= self.heartbeat_sec:
+            return True
+        if data.get('status') != prev.get('status'):
+            return True
+
+        conc, prev_conc = data.get('conc'), prev.get('conc')
+        if isinstance(conc, (int, float)) and isinstance(prev_conc, (int, float)):
+            if abs(conc - prev_conc) >= self.min_conc_delta:
+                return True
+            if self._level(conc) != self._level(prev_conc):
+                return True
+        elif conc != prev_conc:
+            return True
+
+        coords = (data.get('lat'), data.get('lon'), prev.get('lat'), prev.get('lon'))
+        if any(c is None for c in coords):
+            return coords[:2] != coords[2:]
+        return distance_m(*coords) >= self.min_distance_m
+
+    def offer(self, data):
+        now = self.clock()
+        self.stats['received'] += 1
+        if not self._is_significant(data, now):
+            self.held = data
+            self.stats['suppressed'] += 1
+            return []
+
+        self.held = None
+        self.last_sent = data
+        self.last_sent_time = now
+        self.stats['sent'] += 1
+        return [data]
+
+    def flush(self):
+        """資料流結束時取出最後一筆被略過的紀錄"""
+        held, self.held = self.held, None
+        if held is None:
+            return []
+        self.stats['suppressed'] -= 1
+        self.stats['sent'] += 1
+        return [held]
+
+    def ratio(self):
+        """上傳筆數 / 收到筆數"""
+        return self.stats['sent'] / max(self.stats['received'], 1)
@@ -0,0 +1,30 @@
+import pytest
+import queue
+
+from unittest.mock import MagicMock
+from Procedure.FakeDatabase import FakeDatabase
+
+@pytest.fixture
+def fake_firebase():
+    """每個測試各自一份空的假資料庫"""
+    return FakeDatabase()
+
+@pytest.fixture
+def make_cfg():
+    """產生 RunProcess 用的設定 (選用功能皆關閉)，測試再覆寫需要的屬性"""
+    def make(project_name="site"):
+        cfg = MagicMock()
+        cfg.PROJECT_NAME = project_name
+        cfg.GPS_IP, cfg.GPS_PORT, cfg.CONC_UNIT = "127.0.0.1", 11123, "ppm"
+        cfg.SHARED_QUEUE = queue.Queue(maxsize=10000)
+        cfg.ACQUISITION_MODE = "thread"
+        cfg.UPLOAD_FILTER_ENABLED = cfg.ALERTS_ENABLED = cfg.LOCAL_STORE_ENABLED = False
+        cfg.RECENT_SIZE = 0
+        cfg.SUPERVISOR_MAX_RESTARTS, cfg.SUPERVISOR_BACKOFF_MAX, cfg.DRAIN_TIMEOUT = 5, 30.0, 5.0
+        cfg.LOG_SUMMARY_INTERVAL = 10.0
+        return cfg
+    return make
+
+@pytest.fixture
+def cfg(make_cfg):
+    return make_cfg()
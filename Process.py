@@ -7,41 +7,254 @@ from Procedure.GPSReader import GPSReader
 from Procedure.ConcentrationReader import ConcentrationReader
 from Procedure.FirebaseManager import FirebaseManager
 from Procedure.BackupManager import BackupManager
+from Procedure.SharedRing import ProcessReader
+from Procedure.UploadFilter import DeadbandFilter
+from Procedure.AlertEngine import AlertEngine, DEFAULT_THRESHOLDS
+from Procedure.RecentWindow import RecentWindow
+from Procedure.LocalStore import LocalStore
+from Procedure.Sinks import FirebaseSink, CsvSink, SqliteSink
 
 logger = logging.getLogger(__name__)
 
+def _pending(q):
+    """佇列中尚未處理的資料筆數 (不含結束訊號 None，也不取出資料)"""
+    if not isinstance(q, queue.Queue):
+        return 0
+    with q.mutex:
+        return sum(1 for item in q.queue if item is not None)
+
+class _Worker:
+    """Supervisor 管理的單一工作者；start() 啟動，alive() 判斷是否仍在執行"""
+    def __init__(self, name, start, alive, owns_exit):
+        self.name = name
+        self.start = start
+        self.alive = alive
+        self.owns_exit = owns_exit      # True: 正常結束代表管線結束 (執行緒工作者)
+        self.thread = None
+        self.finished = False
+        self.last_error = None
+        self.restarts = 0
+        self.failures = []              # 最近失敗的時間 (monotonic)
+        self.next_restart = None        # 等待重啟的時間
+
+class Supervisor:
+    """
+    擁有資料管線的所有工作者 (GPS / 濃度讀取器、合併、Firebase 上傳)：
+    - 工作者異常結束時以指數退避重新啟動 (backoff_base * 2^n 秒，最多 backoff_max 秒)
+    - window_sec 內失敗超過 max_restarts 次即放棄，由 RunProcess 停止整條管線
+    - 由 RunProcess 的執行緒定期呼叫 poll()；shutdown() 後不再重啟任何工作者
+    """
+    def __init__(self, max_restarts=5, backoff_base=1.0, backoff_max=30.0, window_sec=300.0, clock=time.monotonic):
+        self.max_restarts = max_restarts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.window_sec = window_sec
+        self.clock = clock
+        self.workers = {}
+        self.stopping = False
+        self.gave_up = None             # 放棄重啟的工作者名稱
+
+    def spawn(self, name, target):
+        """以執行緒執行 target；拋出例外視為失敗，正常返回視為結束"""
+        worker = _Worker(name, None, None, owns_exit=True)
+
+        def body():
+            try:
+                target()
+                worker.finished = True
+            except Exception as e:
+                worker.last_error = str(e)
+                logger.error(f"❌ 工作者 {name} 異常結束: {e}")
+
+        def start():
+            worker.thread = threading.Thread(target=body, name=name, daemon=True)
+            worker.thread.start()
+
+        worker.start = start
+        worker.alive = lambda: worker.thread is not None and worker.thread.is_alive()
+        self.workers[name] = worker
+        start()
+        return worker
+
+    def watch(self, name, reader):
+        """
+        監看自行管理執行緒的讀取器：執行緒已結束但 running 仍為 True 視為失敗
+        (讀取器主動放棄時會先將 running 設為 False；沒有 thread 屬性的讀取器不監看)
+        """
+        worker = _Worker(name, reader.run, None, owns_exit=False)
+
+        def alive():
+            worker.thread = getattr(reader, 'thread', None)
+            return not (reader.running and isinstance(worker.thread, threading.Thread)
+                        and not worker.thread.is_alive())
+
+        worker.alive = alive
+        self.workers[name] = worker
+        return worker
+
+    def finished(self, name):
+        worker = self.workers.get(name)
+        return worker is not None and worker.finished
+
+    def thread(self, name):
+        worker = self.workers.get(name)
+        return worker.thread if worker else None
+
+    def _backoff(self, failures):
+        return min(self.backoff_max, self.backoff_base * (2 ** (failures - 1)))
+
+    def poll(self):
+        """檢查並重啟失敗的工作者；回傳 False 表示已放棄"""
+        if self.stopping or self.gave_up:
+            return self.gave_up is None
+        now = self.clock()
+        for worker in self.workers.values():
+            if worker.next_restart is None:
+                if worker.finished or worker.alive():
+                    continue
+                worker.failures = [t for t in worker.failures if now - t < self.window_sec] + [now]
+                if len(worker.failures) > self.max_restarts:
+                    self.gave_up = worker.name
+                    logger.error(f"❌ 工作者 {worker.name} 在 {self.window_sec:.0f} 秒內失敗 "
+                                 f"{len(worker.failures)} 次，放棄重啟")
+                    return False
+                delay = self._backoff(len(worker.failures))
+                worker.next_restart = now + delay
+                logger.warning(f"⚠️ 工作者 {worker.name} 已停止，{delay:.1f} 秒後重新啟動")
+            elif now >= worker.next_restart:
+                worker.next_restart = None
+                worker.restarts += 1
+                try:
+                    worker.start()
+                    logger.info(f"🔄 工作者 {worker.name} 已重新啟動 (第 {worker.restarts} 次)")
+                except Exception as e:
+                    worker.last_error = str(e)
+                    logger.error(f"❌ 工作者 {worker.name} 重新啟動失敗: {e}")
+        return True
+
+    def shutdown(self):
+        self.stopping = True
+
+    def report(self):
+        return {name: {'restarts': w.restarts, 'last_error': w.last_error}
+                for name, w in self.workers.items() if w.restarts or w.last_error}
+
 class RunProcess:
-    def __init__(self, cfg):
+    def __init__(self, cfg, gps=None, conc=None, transport=None):
+        """
+        gps / conc 可傳入共用讀取器的訂閱 (見 ReaderHub)，未傳入則自行建立
+        transport 可傳入共用的 Firebase 傳輸層 (見 FirebaseTransport)
+        """
         self.cfg = cfg
         self.running = False
 
-        self.gps = GPSReader()
-        self.conc = ConcentrationReader()
+        # process 模式：讀取器在子行程執行，經共享記憶體環狀緩衝傳回
+        if cfg.ACQUISITION_MODE == 'process':
+            gps = gps or ProcessReader('gps', ip=cfg.GPS_IP, port=cfg.GPS_PORT)
+            conc = conc or ProcessReader('conc', unit=cfg.CONC_UNIT)
+
+        self.gps = gps or GPSReader()
+        self.conc = conc or ConcentrationReader()
         self.fb = FirebaseManager(
             key_path=self.cfg.FIREBASE_KEY, 
             db_url=self.cfg.DB_URL
         )
         self.backup = BackupManager(self.cfg.PROJECT_NAME)
 
-        self.is_backup_started = False
+        self.join_timeout = 5.0     # stop() 等待讀取器執行緒結束的上限秒數
+        self.supervise_interval = 0.5
+        self.drain_timeout = self.cfg.DRAIN_TIMEOUT     # stop() 送完佇列剩餘資料的期限秒數
+        self.draining = False
+        self.stopped = False
+        self.stop_report = None
+        self.stop_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.supervisor = Supervisor(
+            max_restarts=self.cfg.SUPERVISOR_MAX_RESTARTS,
+            backoff_max=self.cfg.SUPERVISOR_BACKOFF_MAX
+        )
+        self.supervised = False     # 合併執行緒由 Supervisor 管理時，錯誤直接拋出以便重新啟動
+        self.live_feed = None       # 選用: LiveFeedServer，由 Controller 指定
+        self.tile_proxy = None      # 選用: TileProxy，依軌跡範圍預載圖磚，由 Controller 指定
+
+        # 選用: 上傳前死區壓縮 (閾值與網頁的 settings/thresholds 同步)
+        self.upload_filter = None
+        self.threshold_listener = None
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        if self.cfg.UPLOAD_FILTER_ENABLED:
+            self.upload_filter = DeadbandFilter(
+                min_distance_m=self.cfg.UPLOAD_MIN_DISTANCE_M,
+                min_conc_delta=self.cfg.UPLOAD_MIN_CONC_DELTA,
+                heartbeat_sec=self.cfg.UPLOAD_HEARTBEAT_SEC,
+                thresholds=self.thresholds.values()
+            )
 
-        self.gps.ip = self.cfg.GPS_IP
-        self.gps.port = self.cfg.GPS_PORT  
-        self.gps.gps_queue = self.cfg.GPS_QUEUE
+        if gps is None:
+            self.gps.ip = self.cfg.GPS_IP
+            self.gps.port = self.cfg.GPS_PORT  
+            self.gps.gps_queue = self.cfg.GPS_QUEUE
 
-        self.conc.unit = self.cfg.CONC_UNIT
-        self.conc.conc_queue = self.cfg.CONC_QUEUE 
+        if conc is None:
+            self.conc.unit = self.cfg.CONC_UNIT
+            self.conc.conc_queue = self.cfg.CONC_QUEUE 
 
+        if transport is not None:
+            self.fb.transport = transport
         self.fb.project_name = self.cfg.PROJECT_NAME
+        self.fb.log_interval = self.cfg.LOG_SUMMARY_INTERVAL
         self.fb.data_queue = self.cfg.SHARED_QUEUE 
+        self.fb.supervised = True
+        if self.cfg.RECENT_SIZE:
+            self.fb.recent = RecentWindow(self.cfg.RECENT_SIZE, self.cfg.RECENT_WINDOW_MINUTES)
 
-    def _ensure_backup_active(self):
-        if not self.is_backup_started:
-            try:
-                self.backup.start()
-                self.is_backup_started = True
-            except Exception as e:
-                logger.error(f"啟動備份失敗: {e}")
+        # 選用: 後端閾值警報 (逐筆計算，由上傳迴圈寫入)
+        self.alert_engine = None
+        if self.cfg.ALERTS_ENABLED:
+            self.alert_engine = AlertEngine(
+                self.cfg.PROJECT_NAME, self.fb.transport,
+                flush_interval=self.cfg.ALERTS_FLUSH_INTERVAL
+            )
+            self.fb.alert_engine = self.alert_engine
+
+        # 輸出 sink：每筆資料分送給各 sink，各自有佇列與寫入執行緒，慢的 sink 不會拖累其他 sink
+        self.fb_sink = FirebaseSink(self.fb, self.upload_filter)
+        self.sinks = [self.fb_sink, CsvSink(self.backup)]
+        if self.cfg.LOCAL_STORE_ENABLED:
+            self.sinks.append(SqliteSink(LocalStore(self.cfg.LOCAL_STORE_PATH), self.cfg.PROJECT_NAME))
+        self.sink_stats_interval = 60.0     # 定期記錄各 sink 吞吐量與延遲的間隔秒數
+
+    def _on_thresholds(self, event):
+        """settings/thresholds 變更時更新上傳過濾器與警報的閾值"""
+        try:
+            if event.path == '/':
+                if isinstance(event.data, dict):
+                    self.thresholds.update(event.data)
+            else:
+                self.thresholds[event.path.strip('/')] = event.data
+            if self.upload_filter:
+                self.upload_filter.set_thresholds(self.thresholds.values())
+            if self.alert_engine:
+                self.alert_engine.set_thresholds(self.thresholds)
+        except Exception as e:
+            logger.warning(f"⚠️ 閾值更新失敗: {e}")
+
+    def _watch_thresholds(self):
+        try:
+            ref = self.fb.transport.reference(f'{self.cfg.PROJECT_NAME}/settings/thresholds')
+            self.threshold_listener = ref.listen(self._on_thresholds)
+        except Exception as e:
+            logger.warning(f"⚠️ 無法監聽閾值設定，沿用預設值: {e}")
+
+    def _emit(self, data):
+        """將合併後的一筆資料分送給各 sink (Firebase、本地備份...) 與區網即時伺服器"""
+        if self.alert_engine:
+            self.alert_engine.evaluate(data)     # 以完整資料計算，不受上傳壓縮影響
+        for sink in self.sinks:
+            sink.offer(data)
+        if self.live_feed:
+            self.live_feed.publish(data)
+        if self.tile_proxy:
+            self.tile_proxy.observe(data)
 
     def _queue_merger(self):
         # 1. 濃度緩存
@@ -64,7 +277,8 @@ class RunProcess:
         GPS_GRACE_PERIOD = 2.0 
         last_processed_ts = ""
 
-        while self.running:
+        # 停止時 (draining) 先把已讀到的 GPS 資料處理完再結束
+        while self.running or self.draining:
             try:
                 # --- A. 更新濃度緩存 ---
                 while not self.conc.conc_queue.empty():
@@ -81,7 +295,8 @@ class RunProcess:
                     gps_data = self.gps.gps_queue.get(timeout=0.1)
                     
                     if gps_data is None:
-                        if self.running: self.fb.data_queue.put(None)
+                        self.fb_sink.flush_filter()
+                        if self.running: self.fb.end_stream()
                         break
 
                     # 過濾重複時間戳
@@ -104,15 +319,15 @@ class RunProcess:
                         gps_data['status'] = 'Sensor Timeout'
                         gps_data['conc'] = 0
                     
-                    self.fb.data_queue.put(gps_data)
-                    self._ensure_backup_active()
-                    self.backup.write(gps_data)
+                    self._emit(gps_data)
                     
                     current_time = time.time()
                     last_gps_arrival_time = current_time 
                     last_upload_time = current_time      
 
                 except queue.Empty:
+                    if not self.running:
+                        break
                     current_time = time.time()
                     
                     is_gps_really_lost = (current_time - last_gps_arrival_time > GPS_GRACE_PERIOD)
@@ -141,40 +356,159 @@ class RunProcess:
                         if latest_conc_cache['last_update'] > 0 and time_diff > SENSOR_TIMEOUT_SEC:
                             no_gps_data['status'] = 'All Lost'
 
-                        self.fb.data_queue.put(no_gps_data)
-                        self._ensure_backup_active()
-                        self.backup.write(no_gps_data)
+                        self._emit(no_gps_data)
                         
                         last_upload_time = current_time
 
             except Exception as e:
                 logger.error(f"合併程序錯誤: {e}")
+                if self.supervised:
+                    raise       # 交由 Supervisor 重新啟動 (以退避間隔)，不在迴圈內吞掉例外
                 time.sleep(1)
 
         if self.running:
-            self.fb.data_queue.put(None)
+            self.fb.end_stream()
 
     def stop(self):
-        self.running = False
+        """
+        依相依順序關閉管線，並在 drain_timeout 秒內把已收到的資料送完：
+        讀取器 → 合併 (處理完 GPS 佇列) → 各 sink (寫完各自的佇列)
+        結果寫入 {project}/status/shutdown (含本地 sink 未寫入的筆數)
+        """
+        with self.stop_lock:
+            if self.stopped:
+                return self.stop_report
+            self.stopped = True
+        started = time.monotonic()
+        deadline = started + self.drain_timeout
+        self.supervisor.shutdown()
+        self.wake.set()
+
+        # 1. 讀取器：不再產生新資料
         self.gps.stop()
-        self.conc.stop()    
-        self.fb.stop()
-        if self.is_backup_started:
-            self.backup.stop()
-            self.is_backup_started = False
-   
+        self.conc.stop()
+        for reader in (self.gps, self.conc):
+            self._join(getattr(reader, 'thread', None), time.monotonic() + self.join_timeout)
+
+        # 2. 合併：處理完已讀到的 GPS 資料並分送給各 sink
+        self.draining = True
+        self.running = False
+        self._join(self.supervisor.thread('merger'), deadline)
+        self.draining = False
+        # 停在靜止路段時，過濾器暫存的最後一筆 (最後位置) 也要在 Firebase 送完前補上
+        self.fb_sink.flush_filter()
+
+        # 3. 各 sink：同時寫完各自的佇列後結束 (最多到 deadline)
+        pending = self.fb_sink.pending()
+        for sink in self.sinks:
+            sink.stop(deadline=deadline)
+        for sink in self.sinks:
+            self._join(self.supervisor.thread(sink.name), deadline)
+        for sink in self.sinks:
+            sink.finish(deadline)
+        dropped = self.fb_sink.pending() + _pending(getattr(self.gps, 'gps_queue', None))
+        # 本地 sink (CSV / SQLite) 本次執行中放棄或丟棄的筆數
+        local_dropped = {sink.name: sink.counters['dropped'] for sink in self.sinks
+                         if sink is not self.fb_sink and sink.counters['dropped']}
+        if self.alert_engine:
+            self.alert_engine.close()
+
+        # 4. 其餘資源
+        if self.threshold_listener:
+            try:
+                self.threshold_listener.close()
+            except Exception as e:
+                logger.debug(f"關閉閾值監聽時發生錯誤: {e}")
+            self.threshold_listener = None
+        if self.upload_filter and self.upload_filter.stats['received']:
+            st = self.upload_filter.stats
+            logger.info(f"🗜️ 上傳壓縮: 收到 {st['received']} 筆，上傳 {st['sent']} 筆 "
+                        f"({self.upload_filter.ratio():.0%})，略過 {st['suppressed']} 筆")
+
+        self.stop_report = {
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'pending': pending,
+            'uploaded': max(0, pending - self.fb_sink.pending()),
+            'dropped': dropped,
+            'local_dropped': local_dropped,
+            'clean': dropped == 0 and not local_dropped,
+            'seconds': round(time.monotonic() - started, 3),
+            'workers': self.supervisor.report(),
+            'sinks': {sink.name: sink.stats('shutdown') for sink in self.sinks}
+        }
+        if local_dropped:
+            logger.error("❌ 本地輸出有資料未寫入: " + ", ".join(f"{name} {n} 筆" for name, n in local_dropped.items()))
+        if dropped:
+            kept = "本地備份亦有缺漏" if 'csv' in local_dropped else "已保留於本地備份"
+            logger.warning(f"⚠️ 停止期限 {self.drain_timeout} 秒內未送完，{dropped} 筆未上傳 ({kept})")
+        elif pending:
+            logger.info(f"📤 停止前已上傳佇列剩餘的 {pending} 筆")
+        try:
+            self.fb.transport.reference(f'{self.cfg.PROJECT_NAME}/status/shutdown').set(self.stop_report)
+        except Exception as e:
+            logger.warning(f"⚠️ 停止結果寫入失敗: {e}")
+        return self.stop_report
+
+    def _join(self, worker, deadline):
+        """等待執行緒結束，最多到 deadline (monotonic) 為止"""
+        if worker is None or worker is threading.current_thread() or not worker.is_alive():
+            return
+        worker.join(timeout=max(0.0, deadline - time.monotonic()))
+        if worker.is_alive():
+            logger.warning(f"⚠️ 執行緒 {worker.name} 未在期限內結束")
+
+    def _publish_sink_stats(self):
+        """記錄各 sink 的吞吐量與延遲，並寫入 {project}/status/sinks"""
+        stats = {sink.name: sink.stats('periodic') for sink in self.sinks}
+        logger.info("📊 輸出: " + " | ".join(
+            f"{name} {st['rate']:.1f} 筆/秒, 待寫 {st['pending']}, 延遲 {st['lag_sec']:.1f}s, 丟棄 {st['dropped']}"
+            for name, st in stats.items()))
+        try:
+            self.fb.transport.reference(f'{self.cfg.PROJECT_NAME}/status/sinks').set(stats)
+        except Exception as e:
+            logger.warning(f"⚠️ 輸出統計寫入失敗: {e}")
+
+    def _report_failure(self):
+        name = self.supervisor.gave_up
+        try:
+            self.fb.transport.reference(f'{self.cfg.PROJECT_NAME}/status').update({
+                'state': 'error',
+                'message': f'{name} 連續失敗，已停止'
+            })
+        except Exception as e:
+            logger.error(f"狀態更新失敗: {e}")
+
     def run(self):
         self.running = True
         logger.info("---程式開始---")
 
         self.gps.run()      
         self.conc.run()
+        if self.alert_engine:
+            self.alert_engine.load()
+        if self.upload_filter or self.alert_engine:
+            self._watch_thresholds()
 
-        merger_thread = threading.Thread(target=self._queue_merger, daemon=True)
-        merger_thread.start()
+        sv = self.supervisor
+        sv.watch('gps', self.gps)
+        sv.watch('conc', self.conc)
+        self.supervised = True
+        sv.spawn('merger', self._queue_merger)
+        for sink in self.sinks:
+            sv.spawn(sink.name, sink.run)
 
+        next_stats = time.monotonic() + self.sink_stats_interval
         try:
-            self.fb.run()
+            while self.running:
+                if sv.finished('firebase'):     # 上傳迴圈結束 (逾時或停止)
+                    break
+                if not sv.poll():
+                    self._report_failure()
+                    break
+                if time.monotonic() >= next_stats:
+                    self._publish_sink_stats()
+                    next_stats = time.monotonic() + self.sink_stats_interval
+                self.wake.wait(self.supervise_interval)
         finally:
-            self.stop()   
-            self.running = False
\ No newline at end of file
+            self.stop()
+            self.running = False
@@ -0,0 +1,211 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+from unittest.mock import patch
+from Procedure.FakeDatabase import FakeDatabase     # 測試用假資料庫
+from Procedure.ResourceMonitor import resource_snapshot, resource_delta, format_delta
+
+logger = logging.getLogger("SoakTest")
+
+def _nmea(body):
+    checksum = 0
+    for ch in body:
+        checksum ^= ord(ch)
+    return f"${body}*{checksum:02X}\r\n"
+
+class NMEAStandIn:
+    """本地假 GPS (GPS2IP 替身)：每個連線每 interval 秒送出一筆 RMC"""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(64)
+        self.port = self.server.getsockname()[1]
+        self.running = False
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def _serve_client(self, conn):
+        line = _nmea("GPRMC,120000.00,A,2502.3970,N,12130.4640,E,0.1,0.0,060126,,,A").encode()
+        try:
+            while self.running:
+                conn.sendall(line)
+                time.sleep(self.interval)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        try:
+            self.server.close()
+        except OSError:
+            pass
+
+class SoakHarness:
+    """
+    反覆執行 start_process / stop_process 與 _perform_project_switch，檢查資源是否持續成長：
+    - Firebase 以 FakeDatabase 取代，GPS 以本地 NMEAStandIn 取代，不需網路
+    - 暖機後取基準快照，之後每 sample_every 個循環記錄執行緒、FD 與記憶體
+    - 回傳每循環延遲統計與資源變化，assert_bounded() 檢查是否在上限內
+    """
+    def __init__(self, cycles=1000, switch_every=25, sample_every=50, warmup=5, workdir=None):
+        self.cycles = cycles
+        self.switch_every = switch_every
+        self.sample_every = sample_every
+        self.warmup = warmup
+        self.workdir = workdir or tempfile.mkdtemp(prefix="soak_")
+        self.fake = FakeDatabase()
+        self.gps = NMEAStandIn()
+        self.projects = ["soak_a", "soak_b"]
+        self.controller = None
+
+    def _write_config(self):
+        path = os.path.join(self.workdir, "config.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "firebase": {"db_id": "soak", "api_key": "", "key_path": "", "db_url": ""},
+                "gps": {"ip": "127.0.0.1", "port": self.gps.port},
+                "conc": {"unit": "ppm"},
+                "settings": {"project_name": self.projects[0], "is_push": False, "map_url": ""},
+                "recovery": {"enabled": False},
+                "recent": {"size": 16}
+            }, f, indent=2)
+        return path
+
+    def _wait_connected(self, before, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.gps.connections > before:
+                return True
+            time.sleep(0.005)
+        return False
+
+    def _cycle(self, index):
+        ctrl = self.controller
+        start = time.perf_counter()
+        if self.switch_every and index % self.switch_every == self.switch_every - 1:
+            target = self.projects[(self.projects.index(ctrl.cfg.PROJECT_NAME) + 1) % len(self.projects)]
+            before = self.gps.connections
+            ctrl.start_process()
+            self._wait_connected(before)
+            ctrl._perform_project_switch({'project_name': target})
+            kind = 'switch'
+        else:
+            before = self.gps.connections
+            ctrl.start_process()
+            if not self._wait_connected(before):
+                logger.warning(f"⚠️ 第 {index} 次循環 GPS 未連線")
+            ctrl.stop_process()
+            kind = 'start_stop'
+        # 假資料庫的 history 會隨循環累積，定期清掉以免誤判為洩漏
+        for name in self.projects:
+            self.fake.reference(f'{name}/history').delete()
+        return kind, time.perf_counter() - start
+
+    def run(self):
+        from Controller import SystemController
+        from Procedure.LogPipeline import stop_logging
+
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        cwd = os.getcwd()
+        self.gps.start()
+        latencies = {'start_stop': [], 'switch': []}
+        samples = []
+        try:
+            os.chdir(self.workdir)
+            config_path = self._write_config()
+            with patch('Procedure.FirebaseTransport.db.reference', new=self.fake.reference), \
+                 patch('firebase_admin._apps', {'[DEFAULT]': object()}):
+                self.controller = SystemController(config_path)
+                self.controller.switch_settle_sec = 0
+                logging.getLogger().setLevel(logging.WARNING)     # 循環中的 INFO 會淹沒輸出
+                logger.setLevel(logging.INFO)
+                self.controller._setup_listeners()
+
+                for i in range(self.warmup):
+                    self._cycle(i)
+                baseline = resource_snapshot()
+                for i in range(self.cycles):
+                    kind, seconds = self._cycle(i)
+                    latencies[kind].append(seconds)
+                    if (i + 1) % self.sample_every == 0 or i + 1 == self.cycles:
+                        delta = resource_delta(baseline, resource_snapshot())
+                        samples.append(dict(delta, cycle=i + 1))
+                        logger.info(f"🔁 {i + 1}/{self.cycles}: {format_delta(delta)}")
+
+                if self.controller.process:
+                    self.controller.stop_process()
+                self.controller._cleanup_listeners()
+                self.controller._stop_archiver()
+                stop_logging(self.controller.log_listener)
+        finally:
+            os.chdir(cwd)
+            self.gps.stop()
+            root.handlers[:] = saved_handlers
+            root.setLevel(saved_level)
+
+        return {'cycles': self.cycles, 'samples': samples,
+                'latency': {k: self._stats(v) for k, v in latencies.items() if v},
+                'listeners': len(self.fake.listeners)}
+
+    @staticmethod
+    def _stats(values):
+        ordered = sorted(values)
+        return {'count': len(values), 'mean': statistics.mean(values),
+                'p50': ordered[len(ordered) // 2], 'p95': ordered[int(len(ordered) * 0.95) - 1 if len(ordered) > 1 else 0],
+                'max': ordered[-1]}
+
+    @staticmethod
+    def assert_bounded(report, max_threads=3, max_fds=10, max_rss_mb=50.0, max_listeners=2):
+        """檢查最後一次取樣的資源成長是否在上限內 (None 表示平台不支援該項目)"""
+        last = report['samples'][-1]
+        assert last['threads'] <= max_threads, f"執行緒增加 {last['threads']}"
+        assert last['fds'] is None or last['fds'] <= max_fds, f"FD 增加 {last['fds']}"
+        assert last['rss_mb'] is None or last['rss_mb'] <= max_rss_mb, f"記憶體增加 {last['rss_mb']:.1f} MB"
+        assert report['listeners'] <= max_listeners, f"殘留監聽器 {report['listeners']}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="啟停與專案切換的長時間壓力 / 洩漏測試")
+    parser.add_argument("--cycles", type=int, default=2000, help="循環次數")
+    parser.add_argument("--switch-every", type=int, default=25, help="每幾次循環做一次專案切換 (0 表示不切換)")
+    parser.add_argument("--sample-every", type=int, default=100, help="每幾次循環取樣一次資源")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s', datefmt='%y/%m/%d %H:%M:%S')
+
+    harness = SoakHarness(cycles=args.cycles, switch_every=args.switch_every, sample_every=args.sample_every)
+    report = harness.run()
+    for kind, st in report['latency'].items():
+        print(f"{kind:>10}: {st['count']} 次 | 平均 {st['mean'] * 1000:.0f} ms | p50 {st['p50'] * 1000:.0f} ms | "
+              f"p95 {st['p95'] * 1000:.0f} ms | 最大 {st['max'] * 1000:.0f} ms")
+    print(f"資源變化: {format_delta(report['samples'][-1])} | 監聽器 {report['listeners']}")
+    SoakHarness.assert_bounded(report)
+    print("✅ 資源維持在上限內")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
-import { initializeApp } from "https://www.gstatic.com/firebasejs/10.7.1/firebase-app.js";
-import { getDatabase, ref, onValue, onChildAdded, set, get, update } from "https://www.gstatic.com/firebasejs/10.7.1/firebase-database.js";
-import { Chart, registerables } from 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/+esm';
-import zoomPlugin from 'https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1/+esm';
-
-Chart.register(...registerables, zoomPlugin);
+// 第三方函式庫 (固定版本)：一般模式由 CDN 載入；區網即時模式改由後端 /vendor/ 提供 (後端會快取)，離線也能開啟
+const VENDOR_CDN = {
+    'leaflet.css': 'https://unpkg.com/leaflet@1.9.4/dist/leaflet.css',
+    'leaflet.js': 'https://unpkg.com/leaflet@1.9.4/dist/leaflet.js',
+    'hammer.min.js': 'https://cdn.jsdelivr.net/npm/hammerjs@2.0.8/hammer.min.js',
+    'chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+    'chartjs-plugin-zoom.min.js': 'https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js'
+};
+const FIREBASE_SDK = 'https://www.gstatic.com/firebasejs/10.7.1';
+
+// Firebase 於執行時動態載入 (離線時載入失敗不影響區網即時資料)
+let ref, onValue, onChildAdded, onChildChanged, set, get, update;
 
 const Config = (() => {
     const urlParams = new URLSearchParams(window.location.search);
@@ -20,15 +26,58 @@ const Config = (() => {
         dbRootPath: projectPath, 
         gpsIp: "", gpsPort: "", concUnit: "",
         dbURL: urlParams.get('db') || null,
+        liveFeedURL: urlParams.get('live') || null,
+        tileURL: urlParams.get('tiles') || 'https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
         ZOOM_LEVEL: 17, 
         COLORS: { GREEN: '#28a745', YELLOW: '#ffc107', ORANGE: '#fd7e14', RED: '#dc3545' }
     };
 })();
 
+function vendorURL(name) {
+    if (!Config.liveFeedURL) return VENDOR_CDN[name];
+    return new URL(`/vendor/${name}`, new URL(Config.liveFeedURL, window.location.href)).href;
+}
+
+function loadScript(name) {
+    return new Promise((resolve, reject) => {
+        const el = document.createElement('script');
+        el.src = vendorURL(name);
+        el.onload = resolve;
+        el.onerror = () => reject(new Error(`無法載入 ${name}`));
+        document.head.appendChild(el);
+    });
+}
+
+async function loadVendors() {
+    const css = document.createElement('link');
+    css.rel = 'stylesheet';
+    css.href = vendorURL('leaflet.css');
+    document.head.prepend(css);
+    await Promise.all([
+        loadScript('leaflet.js'),
+        loadScript('hammer.min.js').then(() => loadScript('chart.umd.js')).then(() => loadScript('chartjs-plugin-zoom.min.js'))
+    ]);
+    if (window.ChartZoom) Chart.register(window.ChartZoom);
+}
+
+async function connectFirebase() {
+    try {
+        const [{ initializeApp }, sdk] = await Promise.all([
+            import(`${FIREBASE_SDK}/firebase-app.js`), import(`${FIREBASE_SDK}/firebase-database.js`)
+        ]);
+        ({ ref, onValue, onChildAdded, onChildChanged, set, get, update } = sdk);
+        const firebaseConfig = { apiKey: Config.apiKey, authDomain: `${Config.firebaseProjectId}.firebaseapp.com`, databaseURL: Config.dbURL || `https://${Config.firebaseProjectId}-default-rtdb.asia-southeast1.firebasedatabase.app`, projectId: Config.firebaseProjectId };
+        return sdk.getDatabase(initializeApp(firebaseConfig));
+    } catch (err) {
+        console.warn("⚠️ 無法載入 Firebase，僅使用區網即時資料", err);
+        return null;
+    }
+}
+
 class MapManager {
     constructor() {
         this.map = L.map('map').setView([25.0330, 121.5654], Config.ZOOM_LEVEL);
-        L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        L.tileLayer(Config.tileURL, {
             attribution: '© OpenStreetMap contributors'
         }).addTo(this.map);
         this.marker = L.marker([0, 0], { 
@@ -377,11 +426,17 @@ class UIManager {
         }
     }
 
+    requireDb() {
+        if (this.db) return true;
+        alert("⚠️ 目前無法連線 Firebase (離線模式)，此功能暫停使用");
+        return false;
+    }
+
     triggerUploadProcess() { const input = document.createElement('input'); input.type = 'file'; input.accept = '.csv'; input.style.display = 'none'; input.onchange = (e) => { const file = e.target.files[0]; if (file) this.parseAndUploadCSV(file); }; document.body.appendChild(input); input.click(); document.body.removeChild(input); }
-    parseAndUploadCSV(file) { const btn = this.els.btnUpload; const originalText = btn.innerText; btn.disabled = true; btn.innerText = "上傳中..."; let projectName = file.name.replace(/\.csv$/i, "").trim(); if (!projectName) { alert("❌ 檔名無效"); btn.disabled = false; btn.innerText = originalText; return; } const reader = new FileReader(); reader.onload = (e) => { try { const text = e.target.result; const lines = text.split(/\r?\n/); if (lines.length < 2) throw new Error("CSV 為空"); const uploadData = {}; let count = 0; let lastRecord = null; for (let i = 1; i < lines.length; i++) { const line = lines[i].trim(); if (!line) continue; const cols = line.split(','); if (cols.length < 4) continue; const record = { timestamp: cols[0].trim(), lat: parseFloat(cols[1]), lon: parseFloat(cols[2]), conc: parseFloat(cols[3]), conc_unit: cols[4] ? cols[4].trim() : "", status: cols[5] ? cols[5].trim() : "" }; if (!isNaN(record.lat) && !isNaN(record.lon)) { const key = `record_${Date.now()}_${i}`; uploadData[key] = record; lastRecord = record; count++; } } if (count === 0) throw new Error("無有效數據"); const updates = {}; updates[`${projectName}/history`] = uploadData; if (lastRecord) updates[`${projectName}/latest`] = lastRecord; update(ref(this.db), updates).then(() => { const isDiff = (projectName !== Config.dbRootPath); if (isDiff) { alert(`✅ 上傳成功，切換至: ${projectName}`); this.setInterfaceMode('switching', "切換中", "gray", "offline"); set(ref(this.db, `${Config.dbRootPath}/control/config_update`), { project_name: projectName }); const url = new URL(window.location.href); url.searchParams.set('path', projectName); localStorage.setItem('should_fit_bounds', 'true'); window.location.href = url.toString(); } else { localStorage.setItem('should_fit_bounds', 'true'); alert("✅ 上傳成功"); location.reload(); } }).catch(err => { alert("上傳失敗: " + err.message); btn.disabled = false; btn.innerText = originalText; }); } catch (err) { alert("解析失敗: " + err.message); btn.disabled = false; btn.innerText = originalText; } }; reader.readAsText(file); }
-    async downloadHistoryAsCSV() { const btn = this.els.btnDownload; const originalText = btn.innerText; btn.disabled = true; btn.innerText = "下載中..."; try { const snapshot = await get(ref(this.db, `${Config.dbRootPath}/history`)); if (!snapshot.exists()) { alert("❌ 無歷史資料"); return; } const data = snapshot.val(); let csvContent = "\uFEFFtimestamp,lat,lon,conc,conc_unit,status\n"; Object.values(data).forEach(row => { const t = row.timestamp || ""; const lat = row.lat || ""; const lon = row.lon || ""; const conc = row.conc || 0; const unit = row.conc_unit || Config.concUnit; const st = row.status || ""; csvContent += `${t},${lat},${lon},${conc},${unit},${st}\n`; }); const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' }); const url = URL.createObjectURL(blob); const link = document.createElement("a"); link.href = url; link.download = `${Config.dbRootPath}.csv`; link.click(); URL.revokeObjectURL(url); } catch (error) { console.error(error); alert("下載失敗"); } finally { btn.disabled = false; btn.innerText = originalText; } }
-    saveBackendSettings() { const p = this.els.backendInputs.project.value.trim(); const i = this.els.backendInputs.ip.value.trim(); const pt = this.els.backendInputs.port.value.trim(); const u = this.els.backendInputs.unit.value.trim(); const updateData = {}; if (p) updateData.project_name = p; if (i) updateData.gps_ip = i; if (pt) updateData.gps_port = pt; if (u) updateData.conc_unit = u; if (Object.keys(updateData).length === 0) { alert("⚠️ 未輸入變更"); return; } const btn = this.els.btnSaveBackend; const originalText = btn.innerText; btn.disabled = true; const isProjectChanged = (updateData.project_name && updateData.project_name !== Config.dbRootPath); if (isProjectChanged) { btn.innerText = "切換中..."; this.setInterfaceMode('switching', "切換中", "gray", "offline"); } else { btn.innerText = "更新中..."; } set(ref(this.db, `${Config.dbRootPath}/control/config_update`), updateData).then(() => { if (isProjectChanged) { const url = new URL(window.location.href); url.searchParams.set('path', updateData.project_name); localStorage.setItem('is_switching', 'true'); window.location.href = url.toString(); } else { btn.innerText = "✅ 已更新"; setTimeout(() => { this.els.modal.classList.add('hidden'); btn.disabled = false; btn.innerText = originalText; }, 800); } }).catch((err) => { alert("更新失敗: " + err); btn.disabled = false; btn.innerText = originalText; if (isProjectChanged) this.setInterfaceMode('idle', "更新失敗", "red", "timeout"); }); }
-    toggleRecordingCommand() { set(ref(this.db, `${Config.dbRootPath}/control/command`), this.isRecording ? "stop" : "start"); }
+    parseAndUploadCSV(file) { if (!this.requireDb()) return; const btn = this.els.btnUpload; const originalText = btn.innerText; btn.disabled = true; btn.innerText = "上傳中..."; let projectName = file.name.replace(/\.csv$/i, "").trim(); if (!projectName) { alert("❌ 檔名無效"); btn.disabled = false; btn.innerText = originalText; return; } const reader = new FileReader(); reader.onload = (e) => { try { const text = e.target.result; const lines = text.split(/\r?\n/); if (lines.length < 2) throw new Error("CSV 為空"); const uploadData = {}; let count = 0; let lastRecord = null; for (let i = 1; i < lines.length; i++) { const line = lines[i].trim(); if (!line) continue; const cols = line.split(','); if (cols.length < 4) continue; const record = { timestamp: cols[0].trim(), lat: parseFloat(cols[1]), lon: parseFloat(cols[2]), conc: parseFloat(cols[3]), conc_unit: cols[4] ? cols[4].trim() : "", status: cols[5] ? cols[5].trim() : "" }; if (!isNaN(record.lat) && !isNaN(record.lon)) { const key = `record_${Date.now()}_${i}`; uploadData[key] = record; lastRecord = record; count++; } } if (count === 0) throw new Error("無有效數據"); const updates = {}; updates[`${projectName}/history`] = uploadData; if (lastRecord) updates[`${projectName}/latest`] = lastRecord; updates[`${projectName}/recent`] = null; update(ref(this.db), updates).then(() => { const isDiff = (projectName !== Config.dbRootPath); if (isDiff) { alert(`✅ 上傳成功，切換至: ${projectName}`); this.setInterfaceMode('switching', "切換中", "gray", "offline"); set(ref(this.db, `${Config.dbRootPath}/control/config_update`), { project_name: projectName }); const url = new URL(window.location.href); url.searchParams.set('path', projectName); localStorage.setItem('should_fit_bounds', 'true'); window.location.href = url.toString(); } else { localStorage.setItem('should_fit_bounds', 'true'); alert("✅ 上傳成功"); location.reload(); } }).catch(err => { alert("上傳失敗: " + err.message); btn.disabled = false; btn.innerText = originalText; }); } catch (err) { alert("解析失敗: " + err.message); btn.disabled = false; btn.innerText = originalText; } }; reader.readAsText(file); }
+    async downloadHistoryAsCSV() { if (!this.requireDb()) return; const btn = this.els.btnDownload; const originalText = btn.innerText; btn.disabled = true; btn.innerText = "下載中..."; try { const snapshot = await get(ref(this.db, `${Config.dbRootPath}/history`)); if (!snapshot.exists()) { alert("❌ 無歷史資料"); return; } const data = snapshot.val(); let csvContent = "\uFEFFtimestamp,lat,lon,conc,conc_unit,status\n"; Object.values(data).forEach(row => { const t = row.timestamp || ""; const lat = row.lat || ""; const lon = row.lon || ""; const conc = row.conc || 0; const unit = row.conc_unit || Config.concUnit; const st = row.status || ""; csvContent += `${t},${lat},${lon},${conc},${unit},${st}\n`; }); const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' }); const url = URL.createObjectURL(blob); const link = document.createElement("a"); link.href = url; link.download = `${Config.dbRootPath}.csv`; link.click(); URL.revokeObjectURL(url); } catch (error) { console.error(error); alert("下載失敗"); } finally { btn.disabled = false; btn.innerText = originalText; } }
+    saveBackendSettings() { if (!this.requireDb()) return; const p = this.els.backendInputs.project.value.trim(); const i = this.els.backendInputs.ip.value.trim(); const pt = this.els.backendInputs.port.value.trim(); const u = this.els.backendInputs.unit.value.trim(); const updateData = {}; if (p) updateData.project_name = p; if (i) updateData.gps_ip = i; if (pt) updateData.gps_port = pt; if (u) updateData.conc_unit = u; if (Object.keys(updateData).length === 0) { alert("⚠️ 未輸入變更"); return; } const btn = this.els.btnSaveBackend; const originalText = btn.innerText; btn.disabled = true; const isProjectChanged = (updateData.project_name && updateData.project_name !== Config.dbRootPath); if (isProjectChanged) { btn.innerText = "切換中..."; this.setInterfaceMode('switching', "切換中", "gray", "offline"); } else { btn.innerText = "更新中..."; } set(ref(this.db, `${Config.dbRootPath}/control/config_update`), updateData).then(() => { if (isProjectChanged) { const url = new URL(window.location.href); url.searchParams.set('path', updateData.project_name); localStorage.setItem('is_switching', 'true'); window.location.href = url.toString(); } else { btn.innerText = "✅ 已更新"; setTimeout(() => { this.els.modal.classList.add('hidden'); btn.disabled = false; btn.innerText = originalText; }, 800); } }).catch((err) => { alert("更新失敗: " + err); btn.disabled = false; btn.innerText = originalText; if (isProjectChanged) this.setInterfaceMode('idle', "更新失敗", "red", "timeout"); }); }
+    toggleRecordingCommand() { if (!this.requireDb()) return; set(ref(this.db, `${Config.dbRootPath}/control/command`), this.isRecording ? "stop" : "start"); }
     startClock() { setInterval(() => this.els.time.innerText = new Date().toLocaleTimeString('zh-TW', { hour12: false }), 1000); }
     getColor(value) { if (value < this.thresholds.a) return Config.COLORS.GREEN; if (value < this.thresholds.b) return Config.COLORS.YELLOW; if (value < this.thresholds.c) return Config.COLORS.ORANGE; return Config.COLORS.RED; }
     
@@ -421,6 +476,14 @@ class UIManager {
             return; // 驗證失敗，不存檔
         }
 
+        // 離線模式：只套用於本頁
+        if (!this.db) {
+            this.thresholds = { a: valA, b: valB, c: valC };
+            this.updateThresholdDisplay();
+            this.mapManager.refreshColors(this.getColor.bind(this));
+            return;
+        }
+
         // 驗證成功，寫入 Firebase
         set(ref(this.db, `${Config.dbRootPath}/settings/thresholds`), { a: valA, b: valB, c: valC })
             .then(() => {
@@ -440,41 +503,119 @@ class UIManager {
 }
 
 async function main() {
-    const firebaseConfig = { apiKey: Config.apiKey, authDomain: `${Config.firebaseProjectId}.firebaseapp.com`, databaseURL: Config.dbURL || `https://${Config.firebaseProjectId}-default-rtdb.asia-southeast1.firebasedatabase.app`, projectId: Config.firebaseProjectId };
-    const app = initializeApp(firebaseConfig);
-    const db = getDatabase(app);
+    try {
+        await loadVendors();
+    } catch (err) {
+        alert(`❌ ${err.message}`);
+        return;
+    }
     const mapManager = new MapManager();
-    const uiManager = new UIManager(mapManager, db);
+    const uiManager = new UIManager(mapManager, null);
     let backendState = 'offline';
     let lastGpsData = null;
     let lastValidPosition = null; 
 
+    const autoCenterBox = document.getElementById('autoCenter');
+    if (autoCenterBox) { 
+        autoCenterBox.addEventListener('change', (e) => { 
+            if (e.target.checked) {
+                if (lastGpsData && lastGpsData.lat != null) {
+                    mapManager.updateCurrentPosition(lastGpsData.lat, lastGpsData.lon, true);
+                    mapManager.map.setZoom(Config.ZOOM_LEVEL);
+                } else if (lastValidPosition) {
+                    mapManager.updateCurrentPosition(lastValidPosition.lat, lastValidPosition.lon, true);
+                    mapManager.map.setZoom(Config.ZOOM_LEVEL);
+                }
+            }
+        }); 
+    }
+
+    // 區網即時模式：先連上後端 SSE，再載入後端的既有軌跡 (兩者都不經過 Firebase，離線也能顯示)
+    if (Config.liveFeedURL) {
+        const liveRecords = [];
+        let queued = [];        // 既有軌跡載入完成前收到的即時資料
+        let lastTrackTs = null;
+        const showRecord = (data, realtime) => {
+            liveRecords.push(data);
+            if (data.lat != null && data.lon != null) lastValidPosition = { lat: data.lat, lon: data.lon };
+            mapManager.addHistoryPoint(data, uiManager.getColor.bind(uiManager));
+            if (realtime) {
+                lastGpsData = data;
+                mapManager.updateCurrentPosition(data.lat, data.lon, autoCenterBox.checked);
+                uiManager.updateRealtimeData(data);
+            }
+        };
+        const isNew = (data) => !lastTrackTs || !data.timestamp || data.timestamp > lastTrackTs;
+
+        const source = new EventSource(Config.liveFeedURL);
+        source.onopen = () => { if (!uiManager.db) uiManager.setInterfaceMode('offline', "區網即時模式 (未連線 Firebase)", '#28a745', 'active'); };
+        source.onmessage = (e) => {
+            const data = JSON.parse(e.data);
+            if (queued) { queued.push(data); return; }
+            if (!isNew(data)) return;
+            showRecord(data, true);
+            uiManager.updateChart(liveRecords);
+        };
+
+        const trackURL = new URL('/track', new URL(Config.liveFeedURL, window.location.href));
+        const track = await fetch(trackURL).then(r => r.ok ? r.json() : []).catch(() => []);
+        track.forEach(d => showRecord(d, false));
+        if (track.length) lastTrackTs = track[track.length - 1].timestamp;
+        const pending = queued;
+        queued = null;
+        pending.filter(isNew).forEach(d => showRecord(d, true));
+        uiManager.updateChart(liveRecords);
+        if (lastValidPosition) mapManager.updateCurrentPosition(lastValidPosition.lat, lastValidPosition.lon, autoCenterBox.checked);
+    }
+
+    const db = await connectFirebase();
+    if (!db) {
+        if (!Config.liveFeedURL) uiManager.setInterfaceMode('offline', "無法連線 Firebase", 'gray', 'offline');
+        return;
+    }
+    uiManager.db = db;
+
     onValue(ref(db, `${Config.dbRootPath}/settings/current_config`), (snapshot) => { if (snapshot.val()) uiManager.syncConfigFromBackend(snapshot.val()); });
     onValue(ref(db, `${Config.dbRootPath}/settings/thresholds`), (snapshot) => { uiManager.syncThresholdsFromBackend(snapshot.val()); });
     
-    // 監聽歷史數據
-    onValue(ref(db, `${Config.dbRootPath}/history`), (snapshot) => { 
-        if(snapshot.exists()) {
-            const data = snapshot.val();
-            uiManager.updateChart(data);
+    // 監聽歷史數據：後端有維護 recent 環狀區時圖表與地圖軌跡都只訂閱最近 N 筆 (資料量固定)，否則退回整個 history
+    // (區網即時模式的圖表與軌跡已由 SSE 與 /track 提供)
+    if (!Config.liveFeedURL) {
+        const recentMeta = await get(ref(db, `${Config.dbRootPath}/recent/meta`)).then(s => s.val()).catch(() => null);
+        const chartPath = recentMeta ? 'recent/slots' : 'history';
+        const windowMs = (recentMeta && recentMeta.window_minutes) ? recentMeta.window_minutes * 60000 : null;
+
+        onValue(ref(db, `${Config.dbRootPath}/${chartPath}`), (snapshot) => { 
+            if(snapshot.exists()) {
+                let sorted = Object.values(snapshot.val()).filter(d => d && d.timestamp).sort((a, b) => a.timestamp.localeCompare(b.timestamp));
+                if (windowMs && sorted.length) {
+                    const cutoff = Date.parse(sorted[sorted.length - 1].timestamp.replace(' ', 'T')) - windowMs;
+                    sorted = sorted.filter(d => Date.parse(d.timestamp.replace(' ', 'T')) >= cutoff);
+                }
+                uiManager.updateChart(sorted);
             
-            const sorted = Object.values(data).sort((a, b) => a.timestamp.localeCompare(b.timestamp));
-            for (let i = sorted.length - 1; i >= 0; i--) {
-                if (sorted[i].lat != null && sorted[i].lon != null) {
-                    lastValidPosition = { lat: sorted[i].lat, lon: sorted[i].lon };
-                    break;
+                for (let i = sorted.length - 1; i >= 0; i--) {
+                    if (sorted[i].lat != null && sorted[i].lon != null) {
+                        lastValidPosition = { lat: sorted[i].lat, lon: sorted[i].lon };
+                        break;
+                    }
                 }
-            }
 
-            if (localStorage.getItem('should_fit_bounds') === 'true') { 
-                if (lastValidPosition) {
-                    mapManager.updateCurrentPosition(lastValidPosition.lat, lastValidPosition.lon, true);
-                    mapManager.map.setZoom(Config.ZOOM_LEVEL);
+                if (localStorage.getItem('should_fit_bounds') === 'true') { 
+                    if (lastValidPosition) {
+                        mapManager.updateCurrentPosition(lastValidPosition.lat, lastValidPosition.lon, true);
+                        mapManager.map.setZoom(Config.ZOOM_LEVEL);
+                    }
+                    localStorage.removeItem('should_fit_bounds'); 
                 }
-                localStorage.removeItem('should_fit_bounds'); 
             }
-        }
-    });
+        });
+
+        // 地圖軌跡：recent 的格子原地覆寫，新資料以 child_changed 送達 (填滿前為 child_added)
+        const addPoint = (snapshot) => { if (snapshot.val()) mapManager.addHistoryPoint(snapshot.val(), uiManager.getColor.bind(uiManager)); };
+        onChildAdded(ref(db, `${Config.dbRootPath}/${chartPath}`), addPoint);
+        if (recentMeta) onChildChanged(ref(db, `${Config.dbRootPath}/${chartPath}`), addPoint);
+    }
 
     onValue(ref(db, `${Config.dbRootPath}/status`), (snapshot) => {
         const data = snapshot.val();
@@ -514,7 +655,7 @@ async function main() {
 
     onValue(ref(db, `${Config.dbRootPath}/latest`), (snapshot) => {
         const data = snapshot.val();
-        if (data) {
+        if (data && !Config.liveFeedURL) {
             lastGpsData = data;
             
             if (data.lat != null && data.lon != null) {
@@ -528,23 +669,6 @@ async function main() {
             }
         }
     });
-
-    onChildAdded(ref(db, `${Config.dbRootPath}/history`), (snapshot) => { if (snapshot.val()) mapManager.addHistoryPoint(snapshot.val(), uiManager.getColor.bind(uiManager)); });
-    
-    const autoCenterBox = document.getElementById('autoCenter');
-    if (autoCenterBox) { 
-        autoCenterBox.addEventListener('change', (e) => { 
-            if (e.target.checked) {
-                if (lastGpsData && lastGpsData.lat != null) {
-                    mapManager.updateCurrentPosition(lastGpsData.lat, lastGpsData.lon, true);
-                    mapManager.map.setZoom(Config.ZOOM_LEVEL);
-                } else if (lastValidPosition) {
-                    mapManager.updateCurrentPosition(lastValidPosition.lat, lastValidPosition.lon, true);
-                    mapManager.map.setZoom(Config.ZOOM_LEVEL);
-                }
-            }
-        }); 
-    }
 }
 
 main();
\ No newline at end of file